@@ -0,0 +1,222 @@
+# analysis_engine.py
+from collections import deque
+from itertools import islice
+from typing import Dict, Any
+import numpy as np
+from sample_buffer import SampleView
+
+COMBO_BREAK_MIN_COMBO = 20  # Ignore breaks of small combos
+HP_DROP_THRESHOLD = 0.1  # Significant HP drop between samples
+SPIKE_WINDOW = 5  # Recorded samples before/after a point compared for spikes
+SPIKE_THRESHOLD = 5.0  # 5% accuracy drop
+
+# Stamped into saved plays; bump when a formula below changes so
+# reanalyze.py knows which plays are stale
+#   2: samples are recorded adaptively (sampler.py), so accuracy_trend and
+#      difficulty_spikes count recorded samples, not fixed time intervals
+ANALYSIS_VERSION = 2
+
+# What the derived stats of a saved play were computed from. Live values see
+# every raw sample; the stored samples may have been decimated (sample_buffer)
+SOURCE_LIVE = "live"  # OnlineStats during play, stamina from the stored samples
+SOURCE_SAMPLES = "samples"  # analyze() over the stored samples
+
+
+def analyze(samples: SampleView) -> Dict[str, Any]:
+    """Compute all derived MapStats fields from the sample columns"""
+    n = len(samples)
+    if n == 0:
+        return {}
+
+    accuracy = np.asarray(samples.accuracy, dtype=np.float64)
+    combo = np.asarray(samples.combo, dtype=np.int64)
+    hp = np.asarray(samples.hp, dtype=np.float64)
+    unstable_rate = np.asarray(samples.unstable_rate, dtype=np.float64)
+
+    avg_accuracy = float(accuracy.mean())
+    deviation = accuracy - avg_accuracy
+    variance = float(np.dot(deviation, deviation) / n)
+
+    return {
+        "avg_accuracy": avg_accuracy,
+        "accuracy_variance": variance,
+        "combo_breaks": count_combo_breaks(combo),
+        "hp_drops": count_hp_drops(hp),
+        "peak_combo": int(combo.max()),
+        "consistency_score": consistency_score(variance),
+        "accuracy_trend": accuracy_trend(accuracy, deviation),
+        "stamina_score": stamina_score(accuracy),
+        "reaction_time_avg": average_reaction_time(unstable_rate),
+        "difficulty_spikes": count_difficulty_spikes(accuracy),
+    }
+
+
+def consistency_score(variance: float) -> float:
+    """Lower variance = higher consistency"""
+    return max(0, 100 - (variance * 10))
+
+
+def count_combo_breaks(combo: np.ndarray) -> int:
+    """Count drops in combo, ignoring small combos"""
+    previous = np.empty_like(combo)
+    previous[0] = 0
+    previous[1:] = combo[:-1]
+    return int(np.count_nonzero((combo < previous) & (previous > COMBO_BREAK_MIN_COMBO)))
+
+
+def count_hp_drops(hp: np.ndarray) -> int:
+    """Count significant HP drops between consecutive samples"""
+    previous = np.empty_like(hp)
+    previous[0] = 1.0
+    previous[1:] = hp[:-1]
+    return int(np.count_nonzero(hp < previous - HP_DROP_THRESHOLD))
+
+
+def accuracy_trend(accuracy: np.ndarray, deviation: np.ndarray = None) -> float:
+    """Slope of a linear regression of accuracy over the sample index.
+
+    Samples are not evenly spaced: misses and breaks are recorded as they
+    happen and steady stretches sparsely, so this is accuracy change per
+    recorded sample and busy sections weigh more than their duration.
+    """
+    n = len(accuracy)
+    if n < 2:
+        return 0.0
+    if deviation is None:
+        deviation = accuracy - accuracy.mean()
+
+    # Sum of squared index deviations has a closed form
+    x = np.arange(n, dtype=np.float64) - (n - 1) / 2
+    denominator = n * (n * n - 1) / 12
+    return float(np.dot(x, deviation) / denominator)
+
+
+def stamina_score(accuracy: np.ndarray) -> float:
+    """Percentage of first-quarter accuracy maintained in the last quarter"""
+    n = len(accuracy)
+    if n < 10:
+        return 100.0
+
+    first_avg = float(accuracy[:n // 4].mean())
+    last_avg = float(accuracy[n * 3 // 4:].mean())
+
+    stamina = (last_avg / first_avg) * 100 if first_avg > 0 else 100.0
+    return min(100.0, max(0.0, stamina))
+
+
+def average_reaction_time(unstable_rate: np.ndarray) -> float:
+    """Average of the non-zero unstable rate samples"""
+    valid = unstable_rate[unstable_rate > 0]
+    if not len(valid):
+        return 0.0
+    return float(valid.mean())
+
+
+def count_difficulty_spikes(accuracy: np.ndarray) -> int:
+    """Count points where the next window averages well below the previous one.
+
+    Windows are SPIKE_WINDOW recorded samples, so they span less time where
+    events were recorded than in steady stretches.
+    """
+    n = len(accuracy)
+    w = SPIKE_WINDOW
+    if n < 2 * w + 1:
+        return 0
+
+    # Window sums from one cumulative sum: before = [i-w, i), after = [i, i+w)
+    cumulative = np.concatenate(([0.0], np.cumsum(accuracy)))
+    i = np.arange(w, n - w)
+    before = cumulative[i] - cumulative[i - w]
+    after = cumulative[i + w] - cumulative[i]
+    return int(np.count_nonzero((before - after) / w > SPIKE_THRESHOLD))
+
+
+class OnlineStats:
+    """Running versions of the analyze() metrics, updated in O(1) per sample.
+
+    Uses Welford's algorithm for the accuracy mean/variance and a running
+    co-moment for the regression slope, so values can be shown live during
+    play and read directly when the map finishes.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+        # Regression of accuracy over the sample index
+        self._mean_x = 0.0
+        self._m2_x = 0.0
+        self._c_xy = 0.0
+
+        self.combo_breaks = 0
+        self.hp_drops = 0
+        self.peak_combo = 0
+        self.difficulty_spikes = 0
+        self._last_combo = 0
+        self._last_hp = 1.0
+        self._ur_sum = 0.0
+        self._ur_count = 0
+
+        # Last 2*w+1 accuracies: a point is only judged once a full window follows it
+        self._window = deque(maxlen=2 * SPIKE_WINDOW + 1)
+
+    def add(self, combo: int, accuracy: float, hp: float, unstable_rate: float = 0.0):
+        """Fold one sample into the running statistics"""
+        self.count += 1
+        n = self.count
+
+        delta = accuracy - self.mean
+        self.mean += delta / n
+        self._m2 += delta * (accuracy - self.mean)
+
+        dx = (n - 1) - self._mean_x
+        self._mean_x += dx / n
+        self._m2_x += dx * ((n - 1) - self._mean_x)
+        self._c_xy += dx * (accuracy - self.mean)
+
+        if combo < self._last_combo and self._last_combo > COMBO_BREAK_MIN_COMBO:
+            self.combo_breaks += 1
+        if hp < self._last_hp - HP_DROP_THRESHOLD:
+            self.hp_drops += 1
+        self._last_combo = combo
+        self._last_hp = hp
+        if combo > self.peak_combo:
+            self.peak_combo = combo
+
+        if unstable_rate > 0:
+            self._ur_sum += unstable_rate
+            self._ur_count += 1
+
+        window = self._window
+        window.append(accuracy)
+        if len(window) == window.maxlen:
+            before = sum(islice(window, 0, SPIKE_WINDOW))
+            after = sum(islice(window, SPIKE_WINDOW, 2 * SPIKE_WINDOW))
+            if (before - after) / SPIKE_WINDOW > SPIKE_THRESHOLD:
+                self.difficulty_spikes += 1
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def trend(self) -> float:
+        return self._c_xy / self._m2_x if self.count >= 2 and self._m2_x else 0.0
+
+    def results(self) -> Dict[str, Any]:
+        """The analyze() fields that do not need the full sample history"""
+        if not self.count:
+            return {}
+        variance = self.variance
+        return {
+            "avg_accuracy": self.mean,
+            "accuracy_variance": variance,
+            "combo_breaks": self.combo_breaks,
+            "hp_drops": self.hp_drops,
+            "peak_combo": self.peak_combo,
+            "consistency_score": consistency_score(variance),
+            "accuracy_trend": self.trend,
+            "reaction_time_avg": self._ur_sum / self._ur_count if self._ur_count else 0.0,
+            "difficulty_spikes": self.difficulty_spikes,
+        }
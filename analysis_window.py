@@ -1,14 +1,320 @@
+import base64
+import threading
+from typing import Callable, Dict, List, Optional
 import customtkinter as ctk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
+import config
+from figure_renderer import FigurePool, get_renderer, render_png
 from stats_tracker import MapStats
+from timeline import PyramidLine
 import tkinter as tk
 
+FIGURE_SIZE = (12, 8)  # inches
+FIGURE_DPI = 100
+ZOOM_STEP = 1.25  # Time range factor per mouse wheel step
+MIN_TIME_SPAN = 0.5  # Seconds, the closest the time plots zoom in
+MAX_IDLE_FIGURES = 2  # Closed windows' figures kept for reuse
+RESULT_POLL_MS = 15  # How often the Tk thread looks for a finished render while one is pending
+
+
+class PerformanceFigure:
+    """The 2x2 performance figure, built once and redrawn in place for each play.
+
+    A plain Figure drawn with Agg (no Tk or pyplot involved), so it is safe
+    to build and update on the renderer thread.
+    """
+
+    def __init__(self):
+        fig = Figure(figsize=FIGURE_SIZE, dpi=FIGURE_DPI)
+        FigureCanvasAgg(fig)
+        (ax1, ax2), (ax3, ax4) = fig.subplots(2, 2)
+        fig.patch.set_facecolor('#212121')
+
+        # Time plots zoom and pan together
+        ax2.sharex(ax1)
+        ax3.sharex(ax1)
+
+        # Accuracy over time
+        ax1_line, = ax1.plot([], [], color='#1f77b4', linewidth=2)
+        ax1.set_title('Accuracy Over Time', color='white', fontsize=12)
+        ax1.set_xlabel('Time (s)', color='white')
+        ax1.set_ylabel('Accuracy (%)', color='white')
+
+        # Combo over time
+        ax2_line, = ax2.plot([], [], color='#ff7f0e', linewidth=2)
+        ax2.set_title('Combo Over Time', color='white', fontsize=12)
+        ax2.set_xlabel('Time (s)', color='white')
+        ax2.set_ylabel('Combo', color='white')
+
+        # HP over time
+        ax3_line, = ax3.plot([], [], color='#2ca02c', linewidth=2)
+        ax3.set_title('HP Over Time', color='white', fontsize=12)
+        ax3.set_xlabel('Time (s)', color='white')
+        ax3.set_ylabel('HP', color='white')
+
+        for ax in (ax1, ax2, ax3):
+            ax.grid(True, alpha=0.3)
+            ax.set_facecolor('#2b2b2b')
+            ax.tick_params(colors='white')
+
+        # Accuracy distribution
+        ax4.set_title('Accuracy Distribution', color='white', fontsize=12)
+        ax4.set_xlabel('Accuracy (%)', color='white')
+        ax4.set_ylabel('Frequency', color='white')
+        ax4.set_facecolor('#2b2b2b')
+        ax4.tick_params(colors='white')
+
+        self.figure = fig
+        self.time_axes = (ax1, ax2, ax3)
+        self.hist_axes = ax4
+        self.accuracy_line = PyramidLine(ax1, ax1_line)
+        self.combo_line = PyramidLine(ax2, ax2_line)
+        self.hp_line = PyramidLine(ax3, ax3_line)
+
+    def update(self, map_stats: MapStats):
+        """Replace the plotted play"""
+        # Columnar sample views, plotted without copying
+        samples = map_stats.data_points
+        self.accuracy_line.set_data(samples.timestamp, samples.accuracy)
+        self.combo_line.set_data(samples.timestamp, samples.combo)
+        self.hp_line.set_data(samples.timestamp, samples.hp)
+
+        self._clear_histogram()
+        self.hist_axes.hist(samples.accuracy, bins=20, color='#d62728', alpha=0.7, edgecolor='white')
+        self.hist_axes.relim()
+        self.hist_axes.autoscale_view()
+
+        self.figure.tight_layout()
+
+    def clear(self):
+        """Drop the plotted play so an idle figure holds no sample data"""
+        empty = np.empty(0)
+        for line in (self.accuracy_line, self.combo_line, self.hp_line):
+            line.set_data(empty, empty)
+        self._clear_histogram()
+
+    def _clear_histogram(self):
+        # Removing the containers also removes their bars
+        for container in list(self.hist_axes.containers):
+            container.remove()
+
+
+# Figures are only touched on the renderer thread, windows return theirs on close
+_figure_pool = FigurePool(PerformanceFigure, max_idle=MAX_IDLE_FIGURES)
+
+
+def build_performance_figure(map_stats: MapStats) -> Figure:
+    """Create the 2x2 performance figure for a play"""
+    performance_figure = PerformanceFigure()
+    performance_figure.update(map_stats)
+    return performance_figure.figure
+
+
+def prewarm():
+    """Build and draw a pooled figure on the renderer, so the first analysis opens warm"""
+    def warm_up():
+        performance_figure = _figure_pool.acquire()
+        render_png(performance_figure.figure)  # Also loads fonts and text layout caches
+        _figure_pool.release(performance_figure)
+
+    get_renderer().job().submit(warm_up)
+
+
+def figure_counts() -> Dict[str, int]:
+    """Performance figures in use by windows and idle in the pool"""
+    return {"live": _figure_pool.live, "idle": _figure_pool.idle}
+
+
+class PerformanceGraphView:
+    """Performance graphs rendered on the background renderer and shown as an image.
+
+    The mouse wheel zooms the time plots around the cursor, dragging pans
+    them and a double click resets the view; every change is redrawn off
+    the Tk thread, the latest request winning. The renderer leaves each
+    result in a locked slot and the Tk thread polls for it while a render
+    is pending, so the renderer thread never calls into Tk.
+    """
+
+    def __init__(self, master, map_stats: MapStats):
+        self.map_stats = map_stats
+        self._job = get_renderer().job()
+
+        self._closed = False
+
+        # Latest (request, result) from the renderer, taken by the Tk thread
+        self._result = None
+        self._result_lock = threading.Lock()
+
+        # Renderer thread only
+        self._figure: Optional[PerformanceFigure] = None
+        self._full_xlim = None
+
+        # Tk thread only
+        self._photo = None
+        self._axes_boxes = []
+        self._xlim = None
+        self._full_range = None
+        self._drag = None
+        self._requested = 0
+        self._received = 0
+        self._polling = False
+
+        width = FIGURE_SIZE[0] * FIGURE_DPI
+        height = FIGURE_SIZE[1] * FIGURE_DPI
+        self.frame = tk.Frame(master, width=width, height=height, bg='#212121')
+        self.frame.pack_propagate(False)
+        self.label = tk.Label(
+            self.frame, text="Rendering graphs...", bg='#212121', fg='white', font=("Segoe UI", 14)
+        )
+        self.label.pack(fill="both", expand=True)
+
+        self.label.bind("<MouseWheel>", self._on_wheel)
+        self.label.bind("<Button-4>", self._on_wheel)
+        self.label.bind("<Button-5>", self._on_wheel)
+        self.label.bind("<ButtonPress-1>", self._on_press)
+        self.label.bind("<B1-Motion>", self._on_drag)
+        self.label.bind("<ButtonRelease-1>", self._on_release)
+        self.label.bind("<Double-Button-1>", self._on_reset)
+        self.frame.bind("<Destroy>", lambda event: self.close())
+
+        self.request_render()
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def request_render(self, xlim=None):
+        """Redraw with the given time range (None for the whole play) in the background"""
+        if self._closed:
+            return
+        self._requested += 1
+        request = self._requested
+        self._job.submit(lambda: self._render(xlim, request))
+        if not self._polling:
+            self._polling = True
+            self.label.after(RESULT_POLL_MS, self._poll_result)
+
+    def close(self):
+        """Hand the figure back to the pool; replaces any render still queued"""
+        if not self._closed:
+            self._closed = True
+            self._job.submit(self._release)
+
+    def _release(self):
+        # Runs on the renderer thread
+        if self._figure is not None:
+            _figure_pool.release(self._figure)
+            self._figure = None
+
+    def _render(self, xlim, request):
+        # Runs on the renderer thread
+        result = None
+        try:
+            result = self._draw(xlim)
+        finally:
+            # Also after a failed render, so the Tk side stops waiting for it
+            with self._result_lock:
+                self._result = (request, result)
+
+    def _draw(self, xlim):
+        if self._figure is None:
+            self._figure = _figure_pool.acquire()
+            self._figure.update(self.map_stats)
+            self._full_xlim = tuple(self._figure.time_axes[0].get_xlim())
+
+        time_axes = self._figure.time_axes
+        time_axes[0].set_xlim(*(xlim or self._full_xlim))  # Shared x, the others follow
+        image = base64.b64encode(render_png(self._figure.figure))
+
+        # Axes positions in image pixels (origin top left) for mapping mouse events
+        height = self._figure.figure.bbox.height
+        boxes = []
+        for ax in time_axes:
+            bbox = ax.get_window_extent()
+            boxes.append((bbox.x0, height - bbox.y1, bbox.x1, height - bbox.y0))
+
+        return image, boxes, tuple(time_axes[0].get_xlim()), self._full_xlim
+
+    def _poll_result(self):
+        # Runs on the Tk thread until the latest requested render has arrived
+        with self._result_lock:
+            item, self._result = self._result, None
+        if item is not None:
+            self._received, result = item
+            if result is not None:
+                self._show(*result)
+
+        if self._closed or self._received >= self._requested:
+            self._polling = False
+            return
+        try:
+            self.label.after(RESULT_POLL_MS, self._poll_result)
+        except tk.TclError:
+            self._polling = False  # Window closed
+
+    def _show(self, image, boxes, xlim, full_xlim):
+        try:
+            self._photo = tk.PhotoImage(data=image)
+            self.label.configure(image=self._photo, text="")
+        except tk.TclError:
+            return  # Window closed
+        self._axes_boxes = boxes
+        self._full_range = full_xlim
+        if self._xlim is None:
+            self._xlim = xlim
+
+    def _axes_at(self, x, y):
+        for box in self._axes_boxes:
+            if box[0] <= x <= box[2] and box[1] <= y <= box[3]:
+                return box
+        return None
+
+    def _set_xlim(self, x_min, x_max):
+        full_min, full_max = self._full_range
+        span = min(max(x_max - x_min, MIN_TIME_SPAN), full_max - full_min)
+        x_min = min(max(x_min, full_min), full_max - span)
+        self._xlim = (x_min, x_min + span)
+        self.request_render(self._xlim)
+
+    def _on_wheel(self, event):
+        box = self._axes_at(event.x, event.y)
+        if box is None or self._xlim is None:
+            return None
+
+        zoom_in = event.delta > 0 if event.delta else event.num == 4
+        factor = 1 / ZOOM_STEP if zoom_in else ZOOM_STEP
+        x_min, x_max = self._xlim
+        center = x_min + (event.x - box[0]) / (box[2] - box[0]) * (x_max - x_min)
+        self._set_xlim(center - (center - x_min) * factor, center + (x_max - center) * factor)
+        return "break"  # Don't also scroll the window
+
+    def _on_press(self, event):
+        box = self._axes_at(event.x, event.y)
+        if box is not None and self._xlim is not None:
+            self._drag = (event.x, self._xlim, box[2] - box[0])
+
+    def _on_drag(self, event):
+        if self._drag is None:
+            return
+        start_x, (x_min, x_max), width = self._drag
+        shift = (start_x - event.x) / width * (x_max - x_min)
+        self._set_xlim(x_min + shift, x_max + shift)
+
+    def _on_release(self, event):
+        self._drag = None
+
+    def _on_reset(self, event):
+        if self._full_range is not None:
+            self._set_xlim(*self._full_range)
+
 
 class AnalysisWindow:
-    def __init__(self, map_stats: MapStats):
+    def __init__(self, map_stats: MapStats, on_close: Optional[Callable[["AnalysisWindow"], None]] = None):
         self.map_stats = map_stats
+        self.on_close = on_close
+        self.graph_view = None
+        self.closed = False
         self.setup_window()
         self.create_analysis()
 
@@ -17,6 +323,7 @@ class AnalysisWindow:
         self.window.title(f"Analysis: {self.map_stats.map_name}")
         self.window.geometry("1200x800")
         self.window.attributes("-topmost", True)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
 
         # Create scrollable frame
         self.scroll_frame = ctk.CTkScrollableFrame(self.window)
@@ -66,6 +373,13 @@ class AnalysisWindow:
             ("HP Drops", str(self.map_stats.hp_drops)),
             ("Consistency Score", f"{self.map_stats.consistency_score:.1f}/100")
         ]
+        if self.map_stats.hit_error_count:
+            stats += [
+                ("Unstable Rate", f"{self.map_stats.unstable_rate:.1f}"),
+                ("Avg Hit Error", f"{self.map_stats.hit_error_mean:+.1f}ms"),
+                ("Early Hits", str(self.map_stats.early_hits)),
+                ("Late Hits", str(self.map_stats.late_hits)),
+            ]
 
         for i, (label, value) in enumerate(stats):
             row = i // 4
@@ -84,57 +398,13 @@ class AnalysisWindow:
 
         ctk.CTkLabel(graph_frame, text="Performance Graphs", font=("Segoe UI", 18, "bold")).pack(pady=(10, 5))
 
-        # Create matplotlib figure
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(12, 8))
-        fig.patch.set_facecolor('#212121')
-
-        # Extract data
-        timestamps = [dp.timestamp for dp in self.map_stats.data_points]
-        accuracies = [dp.accuracy for dp in self.map_stats.data_points]
-        combos = [dp.combo for dp in self.map_stats.data_points]
-        hps = [dp.hp for dp in self.map_stats.data_points]
-
-        # Accuracy over time
-        ax1.plot(timestamps, accuracies, color='#1f77b4', linewidth=2)
-        ax1.set_title('Accuracy Over Time', color='white', fontsize=12)
-        ax1.set_xlabel('Time (s)', color='white')
-        ax1.set_ylabel('Accuracy (%)', color='white')
-        ax1.grid(True, alpha=0.3)
-        ax1.set_facecolor('#2b2b2b')
-        ax1.tick_params(colors='white')
-
-        # Combo over time
-        ax2.plot(timestamps, combos, color='#ff7f0e', linewidth=2)
-        ax2.set_title('Combo Over Time', color='white', fontsize=12)
-        ax2.set_xlabel('Time (s)', color='white')
-        ax2.set_ylabel('Combo', color='white')
-        ax2.grid(True, alpha=0.3)
-        ax2.set_facecolor('#2b2b2b')
-        ax2.tick_params(colors='white')
+        ctk.CTkLabel(
+            graph_frame, text="Scroll to zoom, drag to pan, double-click to reset", font=("Segoe UI", 11)
+        ).pack()
 
-        # HP over time
-        ax3.plot(timestamps, hps, color='#2ca02c', linewidth=2)
-        ax3.set_title('HP Over Time', color='white', fontsize=12)
-        ax3.set_xlabel('Time (s)', color='white')
-        ax3.set_ylabel('HP', color='white')
-        ax3.grid(True, alpha=0.3)
-        ax3.set_facecolor('#2b2b2b')
-        ax3.tick_params(colors='white')
-
-        # Accuracy distribution
-        ax4.hist(accuracies, bins=20, color='#d62728', alpha=0.7, edgecolor='white')
-        ax4.set_title('Accuracy Distribution', color='white', fontsize=12)
-        ax4.set_xlabel('Accuracy (%)', color='white')
-        ax4.set_ylabel('Frequency', color='white')
-        ax4.set_facecolor('#2b2b2b')
-        ax4.tick_params(colors='white')
-
-        plt.tight_layout()
-
-        # Embed in tkinter
-        canvas = FigureCanvasTkAgg(fig, master=graph_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(padx=10, pady=10)
+        # Drawn in the background, the window opens with a placeholder
+        self.graph_view = PerformanceGraphView(graph_frame, self.map_stats)
+        self.graph_view.pack(padx=10, pady=10)
 
     def create_detailed_analysis(self):
         analysis_frame = ctk.CTkFrame(self.scroll_frame)
@@ -193,4 +463,83 @@ class AnalysisWindow:
             insights.append(
                 f"{self.map_stats.hp_drops} significant HP drops detected. Consider easier difficulties to build consistency.")
 
-        return insights
\ No newline at end of file
+        # Personal bests across sessions
+        history = self.personal_best_insight()
+        if history:
+            insights.append(history)
+
+        return insights
+
+    def personal_best_insight(self) -> Optional[str]:
+        """How this play compares with every indexed play of the difficulty and mods"""
+        if not config._config.save_stats:
+            return None
+        try:
+            from play_index import get_play_index
+            aggregate = get_play_index().aggregate_for(self.map_stats)
+        except Exception as e:
+            print(f"Error reading personal bests: {e}")
+            return None
+        if aggregate is None or aggregate.play_count <= 1:
+            return "First recorded play of this difficulty with these mods."
+
+        text = f"{aggregate.play_count} plays of this difficulty with these mods. "
+        if aggregate.best_accuracy_time == self.map_stats.start_time:
+            text += f"New personal best! {aggregate.best_accuracy:.2f}%"
+            if aggregate.previous_best_accuracy:
+                text += f" beats your previous best of {aggregate.previous_best_accuracy:.2f}%"
+            text += "."
+        else:
+            text += (f"Personal best is {aggregate.best_accuracy:.2f}% "
+                     f"({aggregate.best_accuracy - self.map_stats.final_accuracy:.2f}% away), "
+                     f"recent average {aggregate.accuracy_mean:.2f}%.")
+        if self.map_stats.max_combo >= aggregate.best_combo:
+            text += f" {aggregate.best_combo}x is your best combo on it."
+        if aggregate.consistency_trend >= 1:
+            text += " Consistency is improving across sessions."
+        elif aggregate.consistency_trend <= -1:
+            text += " Consistency has been slipping across sessions."
+        return text
+
+    def close(self):
+        """Destroy the window and hand its figure back to the pool"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.graph_view is not None:
+            self.graph_view.close()
+        try:
+            self.window.destroy()
+        except Exception as e:
+            print(f"Error closing analysis window: {e}")
+        if self.on_close:
+            self.on_close(self)
+
+
+class AnalysisWindowManager:
+    """Keeps at most max_analysis_windows analysis windows open, closing the oldest first"""
+
+    def __init__(self, max_windows: Optional[int] = None):
+        self.max_windows = max_windows
+        self.windows: List[AnalysisWindow] = []
+
+    def open(self, map_stats: MapStats) -> AnalysisWindow:
+        limit = max(1, self.max_windows or config._config.max_analysis_windows)
+        while len(self.windows) >= limit:
+            self.windows[0].close()
+
+        window = AnalysisWindow(map_stats, on_close=self._on_window_closed)
+        self.windows.append(window)
+        return window
+
+    def close_all(self):
+        for window in list(self.windows):
+            window.close()
+
+    def _on_window_closed(self, window: AnalysisWindow):
+        if window in self.windows:
+            self.windows.remove(window)
+
+    def memory_summary(self) -> str:
+        counts = figure_counts()
+        return f"Windows {len(self.windows)}, Figures {counts['live']}+{counts['idle']} idle"
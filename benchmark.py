@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the ingest -> stats -> render pipeline
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json     Compare against an earlier run
+
+Metrics ending in _per_sec are better when higher, all others when lower.
+Exits with status 1 when a metric regresses past --tolerance.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import matplotlib
+matplotlib.use("Agg")  # Headless rendering, must happen before pyplot is imported
+
+import numpy as np
+import config
+from frame_decoder import JSON_BACKEND
+from memory_reader import MemoryReader
+from stats_tracker import StatsTracker
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PAYLOAD_VARIANTS = 256
+
+
+def synthetic_payload(index: int, state: str = "play") -> str:
+    """A Tosu-like payload of realistic size (~4-5 KB)"""
+    misses = index // 400
+    combo = index % 400
+    payload = {
+        "settings": {"showInterface": True, "folders": {"game": "C:/osu!", "skin": "skins/default"}},
+        "menu": {
+            "state": {"number": 2, "name": state},
+            "bm": {
+                "metadata": {"title": "Benchmark Map", "artist": "Benchmark Artist",
+                             "difficulty": "Marathon", "mapper": "bench"},
+                "stats": {"AR": 9.3, "CS": 4.0, "OD": 8.5, "HP": 5.0, "SR": 6.12, "BPM": {"min": 180, "max": 200},
+                          "maxCombo": 2400},
+                "path": {"full": "x" * 120, "folder": "y" * 80, "file": "z" * 60, "bg": "bg.jpg"},
+            },
+            "mods": {"num": 0, "str": "NM"},
+            "pp": {str(acc): 300 + acc for acc in range(90, 101)},
+        },
+        "gameplay": {
+            "name": "benchmark",
+            "score": index * 1234,
+            "accuracy": 100.0 - misses * 0.5 - random.random(),
+            "combo": {"current": combo, "max": max(combo, 399 if misses else combo)},
+            "hp": {"normal": 0.5 + random.random() / 2, "smooth": 0.5 + random.random() / 2},
+            "hits": {"300": index, "100": index // 20, "50": index // 100, "0": misses,
+                     "geki": 0, "katu": 0, "sliderBreaks": 0, "grade": {"current": "S", "maxThisPlay": "S"},
+                     "unstableRate": 110.5,
+                     "hitErrorArray": [random.randint(-40, 40) for _ in range(150)]},
+            "pp": {"current": 200, "fc": 300},
+            "keyOverlay": {key: {"isPressed": False, "count": index} for key in ("k1", "k2", "m1", "m2")},
+        },
+        "resultsScreen": {"name": "", "score": 0, "maxCombo": 0, "mods": {"num": 0, "str": ""}},
+    }
+    return json.dumps(payload)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def bench_ingest(rate: float, duration: float):
+    """Decode + update_data at a target frame rate (0 = as fast as possible)"""
+    reader = MemoryReader(autostart=False)
+    messages = [synthetic_payload(i) for i in range(PAYLOAD_VARIANTS)]
+    reader.update_data(reader.decoder.decode(synthetic_payload(0, state="menu")))
+
+    interval = 1.0 / rate if rate > 0 else 0.0
+    frames = 0
+    busy = 0.0
+    worst = 0.0
+    start = time.perf_counter()
+    next_frame = start
+
+    while time.perf_counter() - start < duration:
+        if interval:
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_frame += interval
+
+        t0 = time.perf_counter()
+        reader.update_data(reader.decoder.decode(messages[frames % PAYLOAD_VARIANTS]))
+        elapsed = time.perf_counter() - t0
+
+        busy += elapsed
+        worst = max(worst, elapsed)
+        frames += 1
+
+    wall = time.perf_counter() - start
+    return {
+        "frames_per_sec": frames / wall,
+        "frame_avg_us": busy / frames * 1e6,
+        "frame_max_us": worst * 1e6,
+        "busy_fraction": busy / wall,
+        "decode_avg_us": reader.decoder.stats.avg_us,
+    }
+
+
+def bench_stats(samples: int):
+    """add_data_point and finish_map over a play of the given length"""
+    tracker = StatsTracker()
+    tracker.start_tracking({"title": "Benchmark Map", "artist": "Benchmark Artist", "difficulty": "Marathon"})
+    tracker.session_start_time -= 600  # Pretend the play was long enough to be kept
+
+    rng = np.random.default_rng(0)
+    accuracy = (97 + rng.normal(0, 1.5, samples)).tolist()
+    hp = rng.uniform(0.3, 1.0, samples).tolist()
+    unstable_rate = rng.uniform(80, 140, samples).tolist()
+
+    start = time.perf_counter()
+    for i in range(samples):
+        tracker.add_data_point(i % 500, accuracy[i], hp[i], i // 500, unstable_rate[i])
+    append_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    map_stats = tracker.finish_map(samples % 500, accuracy[-1], hp[-1], samples // 500)
+    finish_time = time.perf_counter() - start
+
+    return {
+        "append_us": append_time / samples * 1e6,
+        "finish_ms": finish_time * 1000,
+        "stored_samples": len(map_stats.data_points),
+    }, map_stats
+
+
+def bench_render(map_stats, repeat: int = 3):
+    """Build and draw the analysis figure with the Agg backend"""
+    from analysis_window import build_performance_figure
+
+    build_times = []
+    draw_times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fig = build_performance_figure(map_stats)
+        t1 = time.perf_counter()
+        fig.canvas.draw()
+        t2 = time.perf_counter()
+        build_times.append(t1 - t0)
+        draw_times.append(t2 - t1)
+
+    return {
+        "figure_ms": min(build_times) * 1000,
+        "draw_ms": min(draw_times) * 1000,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against baseline"""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or old == 0:
+                continue
+            if metric == "stored_samples" or metric == "busy_fraction":
+                continue
+
+            change = (value - old) / abs(old)
+            higher_is_better = metric.endswith("_per_sec")
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            marker = "❌" if regressed else "  "
+            print(f"{marker} {name}.{metric}: {old:.3f} -> {value:.3f} ({change:+.1%})")
+            if regressed:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def parse_list(value, cast):
+    return [cast(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="osu! Performance Tracker benchmarks")
+    parser.add_argument("--rates", default="0,60,240",
+                        help="comma-separated ingest frame rates in Hz, 0 = unthrottled (default: 0,60,240)")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per ingest run (default: 2)")
+    parser.add_argument("--samples", default="1000,10000,100000",
+                        help="comma-separated play lengths in samples (default: 1000,10000,100000)")
+    parser.add_argument("--no-render", action="store_true", help="skip the figure benchmarks")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a previous JSON result file")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed relative regression before failing (default: 0.15)")
+    args = parser.parse_args()
+
+    # Keep the benchmark self-contained
+    config._config.save_stats = False
+    config._config.debug_mode = False
+
+    results = {}
+    for rate in parse_list(args.rates, float):
+        name = f"ingest_{int(rate)}hz" if rate > 0 else "ingest_max"
+        results[name] = bench_ingest(rate, args.duration)
+        print(f"{name}: {results[name]['frames_per_sec']:.0f} frames/s, "
+              f"{results[name]['frame_avg_us']:.1f}us/frame")
+
+    for samples in parse_list(args.samples, int):
+        stats, map_stats = bench_stats(samples)
+        results[f"stats_{samples}"] = stats
+        print(f"stats_{samples}: append {stats['append_us']:.2f}us, finish {stats['finish_ms']:.2f}ms")
+
+        if not args.no_render:
+            results[f"render_{samples}"] = bench_render(map_stats)
+            print(f"render_{samples}: figure {results[f'render_{samples}']['figure_ms']:.1f}ms, "
+                  f"draw {results[f'render_{samples}']['draw_ms']:.1f}ms")
+
+    results["process"] = {"peak_rss_mb": peak_rss_mb()}
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "matplotlib": matplotlib.__version__,
+            "json_backend": JSON_BACKEND,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get("results", {}), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
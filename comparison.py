@@ -0,0 +1,357 @@
+# comparison.py
+"""
+Multi-play comparison over the play index.
+
+A ComparisonQuery selects plays (a beatmap, a difficulty, the last N days...)
+and how to group them. Only the needed columns are read from the index,
+every group is aggregated at once with numpy (mean/best/percentiles), and
+results are cached by query until the index changes. Charts are drawn on an
+Agg Figure one page of groups at a time, so thousands of plays render as
+fast as a page of bars and nothing blocks on a GUI event loop.
+
+Usage:
+    python comparison.py [--beatmap "Artist - Title"] [--difficulty D] [--mods HD] [--days N]
+                         [--group-by map|beatmap|mods|day|week|play] [--page N] [--out chart.png]
+"""
+
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+GROUP_BY = ("map", "beatmap", "mods", "day", "week", "play")
+PAGE_SIZE = 25  # Bars per chart page
+PLAY_BINS = 50  # group_by="play" bins consecutive plays past this many
+CACHE_SIZE = 32
+SINCE_BUCKET = 3600  # Seconds; resolution of the "last N days" cutoff
+FIGURE_SIZE = (12, 5)
+
+_COLUMNS = ("beatmap", "difficulty", "mods", "start_time", "final_accuracy", "max_combo", "total_misses")
+_ARRAY_FIELDS = ("plays", "accuracy_mean", "accuracy_best", "accuracy_p25", "accuracy_median",
+                 "accuracy_p75", "combo_mean", "combo_best", "misses_mean", "last_played")
+
+
+@dataclass(frozen=True, slots=True)
+class ComparisonQuery:
+    """Which plays to compare and how to group them; also the cache key"""
+    beatmap: Optional[str] = None
+    difficulty: Optional[str] = None
+    mods: Optional[str] = None
+    days: Optional[float] = None  # Only plays from the last N days
+    limit: Optional[int] = None  # Only the newest N plays
+    group_by: str = "map"
+
+
+@dataclass(slots=True)
+class ComparisonResult:
+    """Per-group aggregates, one array element per group in display order"""
+    group_by: str
+    labels: List[str]
+    plays: np.ndarray
+    accuracy_mean: np.ndarray
+    accuracy_best: np.ndarray
+    accuracy_p25: np.ndarray
+    accuracy_median: np.ndarray
+    accuracy_p75: np.ndarray
+    combo_mean: np.ndarray
+    combo_best: np.ndarray
+    misses_mean: np.ndarray
+    last_played: np.ndarray
+    total_plays: int
+
+    def __len__(self):
+        return len(self.labels)
+
+    def page_count(self, page_size: int = PAGE_SIZE) -> int:
+        return max(1, -(-len(self.labels) // page_size))
+
+    def page(self, number: int, page_size: int = PAGE_SIZE) -> "ComparisonResult":
+        """The groups on one page (0-based)"""
+        window = slice(number * page_size, (number + 1) * page_size)
+        return ComparisonResult(
+            self.group_by, self.labels[window],
+            *(getattr(self, name)[window] for name in _ARRAY_FIELDS),
+            total_plays=self.total_plays,
+        )
+
+
+def _group_percentile(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Linear-interpolated percentile of every group in values sorted by group, then value"""
+    position = starts + q * (counts - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, starts + counts - 1)
+    fraction = position - lower
+    return sorted_values[lower] * (1 - fraction) + sorted_values[upper] * fraction
+
+
+def _day_labels(ordinals: np.ndarray, fmt: str) -> List[str]:
+    return [date.fromordinal(int(day)).strftime(fmt) for day in ordinals]
+
+
+def _group_keys(group_by: str, columns, start_time: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """Group index of every play (ordered so sorting by it gives the display order) and group labels"""
+    beatmap, difficulty, mods = columns[0], columns[1], columns[2]
+
+    if group_by in ("day", "week"):
+        # Local calendar date of each play, with the UTC offset in effect at that
+        # time (not today's, which is an hour off across DST); weeks start on Monday
+        dates = [datetime.fromtimestamp(t).date() for t in start_time.tolist()]
+        if group_by == "week":
+            days = np.array([d.toordinal() - d.weekday() for d in dates], dtype=np.int64)
+        else:
+            days = np.array([d.toordinal() for d in dates], dtype=np.int64)
+        unique, inverse = np.unique(days, return_inverse=True)
+        return inverse, _day_labels(unique, "%Y-%m-%d" if group_by == "day" else "week of %Y-%m-%d")
+
+    if group_by == "play":
+        # Plays arrive oldest first; past PLAY_BINS consecutive plays share a bin
+        count = len(start_time)
+        if count <= PLAY_BINS:
+            labels = [f"{time.strftime('%m-%d %H:%M', time.localtime(t))} {name[:20]}"
+                      for t, name in zip(start_time, beatmap)]
+            return np.arange(count), labels
+        inverse = np.arange(count) * PLAY_BINS // count
+        edges = np.searchsorted(inverse, np.arange(PLAY_BINS))
+        lasts = np.append(edges[1:], count) - 1
+        labels = [f"{time.strftime('%m-%d', time.localtime(start_time[first]))}.."
+                  f"{time.strftime('%m-%d', time.localtime(start_time[last]))}"
+                  for first, last in zip(edges, lasts)]
+        return inverse, labels
+
+    if group_by == "beatmap":
+        keys = list(beatmap)
+    elif group_by == "mods":
+        keys = [m or "NM" for m in mods]
+    else:
+        keys = [f"{b} [{d}]{' +' + m if m else ''}" for b, d, m in zip(beatmap, difficulty, mods)]
+    unique, inverse = np.unique(np.array(keys, dtype=object), return_inverse=True)
+    return inverse, list(unique)
+
+
+def aggregate(group_by: str, columns: Sequence[Sequence]) -> ComparisonResult:
+    """Aggregate play columns (in _COLUMNS order, oldest play first) per group"""
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+
+    start_time = np.asarray(columns[3], dtype=np.float64)
+    accuracy = np.asarray(columns[4], dtype=np.float64)
+    combo = np.asarray(columns[5], dtype=np.float64)
+    misses = np.asarray(columns[6], dtype=np.float64)
+    if not len(start_time):
+        empty = np.zeros(0)
+        return ComparisonResult(group_by, [], *([empty] * len(_ARRAY_FIELDS)), total_plays=0)
+
+    inverse, labels = _group_keys(group_by, columns, start_time)
+    groups = len(labels)
+
+    plays = np.bincount(inverse, minlength=groups)
+    accuracy_best = np.full(groups, -np.inf)
+    np.maximum.at(accuracy_best, inverse, accuracy)
+    combo_best = np.zeros(groups)
+    np.maximum.at(combo_best, inverse, combo)
+    last_played = np.zeros(groups)
+    np.maximum.at(last_played, inverse, start_time)
+
+    # Sorted by group then accuracy, each group's values are one contiguous run
+    order = np.lexsort((accuracy, inverse))
+    sorted_accuracy = accuracy[order]
+    starts = np.cumsum(plays) - plays
+
+    result = ComparisonResult(
+        group_by=group_by,
+        labels=labels,
+        plays=plays,
+        accuracy_mean=np.bincount(inverse, accuracy, groups) / plays,
+        accuracy_best=accuracy_best,
+        accuracy_p25=_group_percentile(sorted_accuracy, starts, plays, 0.25),
+        accuracy_median=_group_percentile(sorted_accuracy, starts, plays, 0.5),
+        accuracy_p75=_group_percentile(sorted_accuracy, starts, plays, 0.75),
+        combo_mean=np.bincount(inverse, combo, groups) / plays,
+        combo_best=combo_best,
+        misses_mean=np.bincount(inverse, misses, groups) / plays,
+        last_played=last_played,
+        total_plays=len(start_time),
+    )
+
+    if group_by in ("map", "beatmap", "mods"):
+        # Most recently played first; time groups stay chronological
+        display = np.argsort(-last_played, kind="stable")
+        result.labels = [labels[i] for i in display]
+        for name in _ARRAY_FIELDS:
+            setattr(result, name, getattr(result, name)[display])
+    return result
+
+
+def aggregate_plays(plays, group_by: str = "play") -> ComparisonResult:
+    """Aggregate MapStats or PlaySummary objects directly, without the index"""
+    plays = sorted(plays, key=lambda p: p.start_time)
+    columns = [
+        [getattr(p, "beatmap", None) or f"{p.artist} - {p.map_name}" for p in plays],
+        [p.difficulty for p in plays],
+        [getattr(p, "mods", "") or "" for p in plays],
+        [p.start_time for p in plays],
+        [p.final_accuracy for p in plays],
+        [p.max_combo for p in plays],
+        [p.total_misses for p in plays],
+    ]
+    return aggregate(group_by, columns)
+
+
+def build_comparison_figure(result: ComparisonResult, page: int = 0, page_size: int = PAGE_SIZE):
+    """Accuracy and combo bars of one page of groups on an Agg Figure (no pyplot, never blocks)"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    shown = result.page(page, page_size)
+    fig = Figure(figsize=FIGURE_SIZE)
+    FigureCanvasAgg(fig)
+    fig.patch.set_facecolor('#212121')
+    ax1, ax2 = fig.subplots(1, 2)
+    x = np.arange(len(shown))
+    labels = [f"{label[:20]}..." if len(label) > 20 else label for label in shown.labels]
+
+    # Accuracy: mean bars, interquartile whiskers and the best play
+    ax1.bar(x, shown.accuracy_mean, color='#1f77b4', alpha=0.7, label='Mean')
+    ax1.errorbar(x, shown.accuracy_median,
+                 yerr=[shown.accuracy_median - shown.accuracy_p25, shown.accuracy_p75 - shown.accuracy_median],
+                 fmt='none', ecolor='white', alpha=0.6, capsize=3, label='25-75%')
+    ax1.scatter(x, shown.accuracy_best, color='#2ca02c', marker='_', s=120, zorder=3, label='Best')
+    ax1.set_title('Accuracy Comparison', color='white', fontsize=14)
+    ax1.set_ylabel('Accuracy (%)', color='white')
+    if len(shown):
+        low = float(np.min(shown.accuracy_p25))
+        ax1.set_ylim(max(0.0, low - 5), 100.5)
+
+    # Max combo: mean bars and the best play
+    ax2.bar(x, shown.combo_mean, color='#ff7f0e', alpha=0.7, label='Mean')
+    ax2.scatter(x, shown.combo_best, color='#2ca02c', marker='_', s=120, zorder=3, label='Best')
+    ax2.set_title('Max Combo Comparison', color='white', fontsize=14)
+    ax2.set_ylabel('Max Combo', color='white')
+
+    for ax in (ax1, ax2):
+        ax.set_xticks(x)
+        ax.set_xticklabels(labels, rotation=45, ha='right', color='white', fontsize=8)
+        ax.set_facecolor('#2b2b2b')
+        ax.tick_params(colors='white')
+        ax.grid(True, alpha=0.3, axis='y')
+        ax.legend(loc='lower right', fontsize=8)
+
+    pages = result.page_count(page_size)
+    fig.suptitle(f"{result.total_plays} plays in {len(result)} groups by {result.group_by}"
+                 + (f" - page {page + 1}/{pages}" if pages > 1 else ""), color='white')
+    fig.tight_layout()
+    return fig
+
+
+class ComparisonEngine:
+    """Runs comparison queries against the play index, caching results by query"""
+
+    def __init__(self, index=None, cache_size: int = CACHE_SIZE):
+        self._index = index
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, ComparisonResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._render_job = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            from play_index import get_play_index
+            self._index = get_play_index()
+        return self._index
+
+    def compare(self, query: ComparisonQuery) -> ComparisonResult:
+        """Aggregated groups for a query, from the cache while the index is unchanged"""
+        since = None
+        if query.days:
+            # Relative windows move with time: the cutoff is rounded down to the hour
+            # and is part of the cache key, so a cached "last N days" expires hourly
+            since = time.time() // SINCE_BUCKET * SINCE_BUCKET - query.days * 86400
+        key = (query, since, self.index.revision())
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                return result
+
+        rows = self.index.rows(_COLUMNS, query.beatmap, query.difficulty, query.mods, since=since,
+                               limit=query.limit, newest_first=query.limit is not None)
+        if query.limit is not None:
+            rows.reverse()  # The newest N, but oldest first like the rest
+        result = aggregate(query.group_by, list(zip(*rows)) if rows else [[] for _ in _COLUMNS])
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def figure(self, query: ComparisonQuery, page: int = 0, page_size: int = PAGE_SIZE):
+        return build_comparison_figure(self.compare(query), page, page_size)
+
+    def render_async(self, query: ComparisonQuery, callback, page: int = 0, page_size: int = PAGE_SIZE):
+        """Aggregate and render on the figure renderer thread, then callback(png_bytes).
+
+        Requests still waiting are replaced, so flipping through pages renders
+        only the last one. The callback runs on the renderer thread and must
+        not call into Tk (not even widget.after): leave the bytes in a queue
+        or locked slot and pick them up from an after() poll on the Tk thread,
+        as analysis_window.PerformanceGraphView does.
+        """
+        from figure_renderer import get_renderer, render_png
+
+        if self._render_job is None:
+            self._render_job = get_renderer().job()
+
+        def work():
+            callback(render_png(self.figure(query, page, page_size)))
+
+        self._render_job.submit(work)
+
+
+_engine: Optional[ComparisonEngine] = None
+
+
+def get_engine() -> ComparisonEngine:
+    """The process-wide engine, sharing its cache between callers"""
+    global _engine
+    if _engine is None:
+        _engine = ComparisonEngine()
+    return _engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare plays from the play index")
+    parser.add_argument("--beatmap", help='exact "Artist - Title"')
+    parser.add_argument("--difficulty")
+    parser.add_argument("--mods")
+    parser.add_argument("--days", type=float, help="only plays from the last N days")
+    parser.add_argument("--limit", type=int, help="only the newest N plays")
+    parser.add_argument("--group-by", choices=GROUP_BY, default="map")
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--out", default="comparison.png", help="chart image to write")
+    args = parser.parse_args()
+
+    import config
+    config.get_config()
+
+    engine = get_engine()
+    query = ComparisonQuery(args.beatmap, args.difficulty, args.mods, args.days, args.limit, args.group_by)
+    start = time.perf_counter()
+    result = engine.compare(query)
+    aggregated = time.perf_counter()
+    fig = build_comparison_figure(result, args.page - 1)
+    fig.savefig(args.out, facecolor=fig.get_facecolor())
+    done = time.perf_counter()
+
+    print(f"{result.total_plays} play(s) in {len(result)} group(s), page {args.page}/{result.page_count()}")
+    print(f"Aggregated in {(aggregated - start) * 1000:.1f}ms, rendered in {(done - aggregated) * 1000:.1f}ms "
+          f"to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
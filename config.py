@@ -1,30 +1,48 @@
 # config.py
 import json
 import os
+import threading
 from dataclasses import dataclass, asdict
 from typing import Optional
 
-# Legacy constants for backwards compatibility
-HOTKEY = 'f8'
-RECONNECT_DELAY = 5
-WEBSOCKET_URI = "ws://localhost:24050/ws"
-SAMPLE_INTERVAL = 100
-REFRESH_RATE = 30  # Reduced from 60 to improve performance
-MIN_PLAY_DURATION = 10
+# Legacy constants for backwards compatibility (HOTKEY, RECONNECT_DELAY,
+# WEBSOCKET_URI, SAMPLE_INTERVAL, REFRESH_RATE, MIN_PLAY_DURATION) are set by
+# load_config; like _config they load config.json on first access.
+_LEGACY_CONSTANTS = {
+    "HOTKEY": "hotkey",
+    "RECONNECT_DELAY": "reconnect_delay",
+    "WEBSOCKET_URI": "websocket_uri",
+    "SAMPLE_INTERVAL": "sample_interval",
+    "REFRESH_RATE": "refresh_rate",
+    "MIN_PLAY_DURATION": "min_play_duration",
+}
+_load_lock = threading.RLock()
 
 @dataclass
 class Config:
     refresh_rate: int = 30  # Reduced default
     hotkey: str = "f8"
     websocket_uri: str = "ws://localhost:24050/ws"
+    use_precise_stream: bool = False  # Second connection for hit errors and key counts
+    precise_websocket_uri: str = "ws://localhost:24050/websocket/v2/precise"
     reconnect_delay: int = 5
-    sample_interval: int = 100
+    sample_interval: int = 100  # Minimum ms between samples, except on misses, combo breaks and HP drops
+    sample_max_interval: int = 1000  # A sample at least this often (ms), even when nothing changes
+    accuracy_deadband: float = 0.05  # Accuracy changes (percentage points) smaller than this are not sampled
+    sample_hp_drop: float = 0.1  # HP drop since the last sample that is always recorded
     min_play_duration: int = 10
     max_data_points: int = 5000  # Reduced from 10000
     auto_show_analysis: bool = True
+    max_analysis_windows: int = 3  # Oldest analysis window is closed past this
     save_stats: bool = True
     stats_directory: str = "play_stats"
-    debug_mode: bool = False  # New debug option
+    compress_stats: bool = True  # zlib-compress sample columns in saved play files
+    debug_mode: bool = False  # Debug label, metrics and a per-session profile in stats_directory/profiles
+    profile_interval: int = 10  # ms between stack samples while profiling
+    profile_allocations: bool = True  # Track allocations with tracemalloc while profiling (slower)
+    metrics_enabled: bool = False  # Serve per-stage timings for Prometheus on metrics_port
+    metrics_port: int = 9464
+    prewarm_analysis: bool = False  # Load the plotting stack in the background after startup
 
 
 def load_config(config_path: str = "config.json") -> Config:
@@ -71,9 +89,24 @@ def create_default_config():
     return config
 
 
-# Initialize config on import
-try:
-    _config = load_config()
-except Exception as e:
-    print(f"Failed to load config, creating default: {e}")
-    _config = create_default_config()
\ No newline at end of file
+def get_config() -> Config:
+    """The application config, loaded from config.json on first use"""
+    with _load_lock:
+        if "_config" not in globals():
+            try:
+                config = load_config()
+            except Exception as e:
+                print(f"Failed to load config, creating default: {e}")
+                config = create_default_config()
+            # Later reads of config._config are plain attribute lookups
+            globals()["_config"] = config
+        return globals()["_config"]
+
+
+def __getattr__(name):
+    # Deferred until first access, so importing config doesn't touch the disk
+    if name == "_config":
+        return get_config()
+    if name in _LEGACY_CONSTANTS:
+        return getattr(get_config(), _LEGACY_CONSTANTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
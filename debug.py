@@ -2,14 +2,22 @@
 """
 Debug script to test Tosu websocket connection and data format
 Run this script to see what data Tosu is actually sending
+
+Usage:
+    python debug.py                           Inspect live Tosu data
+    python debug.py record play.tosurec       Record a session to a file
+    python debug.py replay play.tosurec       Replay it as a local Tosu stand-in
 """
 
+import argparse
 import asyncio
 import websockets
 import json
 import sys
+import config
+import replay
 
-WEBSOCKET_URI = "ws://localhost:24050/ws"
+WEBSOCKET_URI = config.WEBSOCKET_URI
 
 
 async def debug_tosu():
@@ -117,13 +125,46 @@ async def debug_tosu():
     return True
 
 
+def parse_speed(value):
+    """Replay speed: a multiplier like 1, 2 or 0.5, or 'max'"""
+    if value.lower() == "max":
+        return 0.0
+    speed = float(value.lower().rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Tosu debug tool")
+    subparsers = parser.add_subparsers(dest="command")
+
+    record_parser = subparsers.add_parser("record", help="record a Tosu session to a file")
+    record_parser.add_argument("file")
+    record_parser.add_argument("--duration", type=float, default=0.0,
+                               help="stop after this many seconds (default: until Ctrl+C)")
+
+    replay_parser = subparsers.add_parser("replay", help=f"replay a recording on {WEBSOCKET_URI}")
+    replay_parser.add_argument("file")
+    replay_parser.add_argument("--speed", type=parse_speed, default=1.0,
+                               help="replay speed multiplier, or 'max' (default: 1)")
+    replay_parser.add_argument("--loop", action="store_true", help="restart the recording when it ends")
+
+    args = parser.parse_args()
+
     print("🚀 Tosu Debug Tool")
-    print("This tool will help identify issues with the Tosu connection")
-    print()
 
     try:
-        asyncio.run(debug_tosu())
+        if args.command == "record":
+            print(f"📼 Recording {WEBSOCKET_URI} to {args.file} (Press Ctrl+C to stop)")
+            frames = asyncio.run(replay.record(WEBSOCKET_URI, args.file, args.duration))
+            print(f"✅ Recorded {frames} frames")
+        elif args.command == "replay":
+            asyncio.run(replay.serve_recording(args.file, WEBSOCKET_URI, args.speed, args.loop))
+        else:
+            print("This tool will help identify issues with the Tosu connection")
+            print()
+            asyncio.run(debug_tosu())
     except KeyboardInterrupt:
         print("\n🛑 Stopped by user")
     except Exception as e:
@@ -0,0 +1,129 @@
+# figure_renderer.py
+import io
+import queue
+import threading
+from typing import Any, Callable, List, Optional
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+def render_png(fig: Figure) -> bytes:
+    """Draw a figure with the Agg backend into PNG bytes"""
+    if not isinstance(fig.canvas, FigureCanvasAgg):
+        FigureCanvasAgg(fig)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=fig.dpi, facecolor=fig.get_facecolor())
+    return buffer.getvalue()
+
+
+class RenderJob:
+    """Coalescing render request: only the latest submitted work runs.
+
+    Submitting again while the job is still queued replaces its work, so a
+    burst of zoom or pan steps costs a single render.
+    """
+
+    def __init__(self, renderer: "FigureRenderer"):
+        self.renderer = renderer
+        self._lock = threading.Lock()
+        self._work: Optional[Callable[[], None]] = None
+
+    def submit(self, work: Callable[[], None]):
+        with self._lock:
+            queued = self._work is not None
+            self._work = work
+        if not queued:
+            self.renderer._queue.put(self)
+
+    def _take(self) -> Optional[Callable[[], None]]:
+        with self._lock:
+            work, self._work = self._work, None
+        return work
+
+
+class FigureRenderer:
+    """Builds and draws matplotlib figures on a background thread.
+
+    Figures are plain matplotlib.figure.Figure objects drawn with Agg, never
+    pyplot, so nothing here touches Tk. Work functions must not either: they
+    leave their results where the Tk thread polls for them.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="FigureRenderer", daemon=True)
+        self.thread.start()
+
+    def job(self) -> RenderJob:
+        return RenderJob(self)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            work = job._take()
+            if work is None:
+                continue
+            try:
+                work()
+            except Exception as e:
+                print(f"Error rendering figure: {e}")
+                import traceback
+                traceback.print_exc()
+
+    def stop(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self.thread.join(timeout=timeout)
+
+
+class FigurePool:
+    """Reusable figure objects, so a long session doesn't build one per play.
+
+    Items come from factory() and must have clear(); at most max_idle
+    released items are kept. Only use from the renderer thread.
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_idle: int = 2):
+        self.factory = factory
+        self.max_idle = max_idle
+        self._idle: List[Any] = []
+        self.live = 0
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def acquire(self):
+        item = self._idle.pop() if self._idle else self.factory()
+        self.live += 1
+        return item
+
+    def release(self, item):
+        self.live -= 1
+        item.clear()
+        if len(self._idle) < self.max_idle:
+            self._idle.append(item)
+
+
+_renderer: Optional[FigureRenderer] = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer() -> FigureRenderer:
+    """The shared renderer, started on first use"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = FigureRenderer()
+        return _renderer
+
+
+def stop_renderer(timeout: float = 5.0):
+    """Stop the shared renderer if it was started"""
+    global _renderer
+    with _renderer_lock:
+        renderer, _renderer = _renderer, None
+    if renderer is not None:
+        renderer.stop(timeout)
@@ -0,0 +1,60 @@
+# finalizer.py
+import queue
+import threading
+from typing import Callable, Optional
+from stats_tracker import StatsTracker, PendingPlay, MapStats
+
+MAX_PENDING_PLAYS = 4  # Plays waiting to be analysed before new ones are dropped
+
+
+class MapFinalizer:
+    """Analyses and saves finished plays on a background thread.
+
+    The websocket thread only queues the PendingPlay, so frame ingestion
+    never waits for statistics or file writes during a map transition.
+    """
+
+    def __init__(self, stats_tracker: StatsTracker,
+                 on_complete: Optional[Callable[[MapStats], None]] = None,
+                 max_pending: int = MAX_PENDING_PLAYS):
+        self.stats_tracker = stats_tracker
+        self.on_complete = on_complete
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name="MapFinalizer", daemon=True)
+        self.thread.start()
+
+    def submit(self, pending: PendingPlay) -> bool:
+        """Queue a play for finalization without blocking; False if it had to be dropped"""
+        try:
+            self._queue.put_nowait(pending)
+            return True
+        except queue.Full:
+            print(f"⚠️ Finalization queue full, dropping play: {pending.map_info.get('title', 'Unknown')}")
+            return False
+
+    def _run(self):
+        while True:
+            pending = self._queue.get()
+            if pending is None:
+                return
+
+            try:
+                map_stats = self.stats_tracker.finalize(pending)
+                print(f"Map stats generated for: {map_stats.map_name}")
+                if self.on_complete:
+                    self.on_complete(map_stats)
+            except Exception as e:
+                print(f"Error finalizing map: {e}")
+                import traceback
+                traceback.print_exc()
+
+    def stop(self, timeout: float = 5.0):
+        """Finish the queued plays, then stop the worker"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("Warning: Finalization queue did not drain")
+            return
+        self.thread.join(timeout=timeout)
+        if self.thread.is_alive():
+            print("Warning: Finalizer did not stop cleanly")
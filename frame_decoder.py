@@ -0,0 +1,217 @@
+# frame_decoder.py
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Callable, List
+from metrics import NULL_HISTOGRAM
+
+# Use a faster JSON backend when one is installed
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+_EMPTY: Dict[str, Any] = {}
+_UNKNOWN_MAP_INFO = {
+    "title": "Unknown",
+    "artist": "Unknown",
+    "difficulty": "Unknown",
+    "mapper": "Unknown"
+}
+
+
+@dataclass(slots=True)
+class GameFrame:
+    """The fields of a Tosu payload the tracker actually uses"""
+    combo: int = 0
+    max_combo: Optional[int] = None  # None when the payload has no max combo
+    accuracy: float = 100.0
+    hp: float = 1.0
+    misses: int = 0
+    unstable_rate: float = 0.0
+    hit_errors: Optional[List[float]] = None  # Tosu's hitErrorArray for the whole attempt, not copied
+    state: str = "menu"
+    map_info: Optional[Dict[str, str]] = None  # None when the payload has no beatmap
+
+
+@dataclass(slots=True)
+class PreciseFrame:
+    """A message from Tosu's precise stream (/websocket/v2/precise)"""
+    time_ms: float = 0.0
+    hit_errors: Optional[List[float]] = None  # Whole attempt, not copied
+    key_counts: Optional[Dict[str, int]] = None  # k1, k2, m1, m2 press counts
+
+
+@dataclass(slots=True)
+class DecodeStats:
+    frames: int = 0
+    errors: int = 0
+    total_bytes: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+    @property
+    def avg_us(self) -> float:
+        return self.total_ns / self.frames / 1000 if self.frames else 0.0
+
+    def summary(self) -> str:
+        return (f"decode[{JSON_BACKEND}]: {self.frames} frames, avg {self.avg_us:.1f}us, "
+                f"max {self.max_ns / 1000:.1f}us, {self.errors} errors")
+
+
+def extract_frame(data: Any) -> GameFrame:
+    """Pull the gameplay, menu.state and menu.bm fields out of a decoded payload"""
+    if not isinstance(data, dict):
+        raise ValueError(f"Invalid data type received: {type(data)}")
+
+    frame = GameFrame()
+
+    gameplay = data.get("gameplay")
+    if isinstance(gameplay, dict):
+        combo = gameplay.get("combo")
+        if isinstance(combo, dict):
+            frame.combo = combo.get("current", 0) or 0
+            frame.max_combo = combo.get("max", 0) or 0
+        elif isinstance(combo, int):
+            frame.combo = combo
+
+        frame.accuracy = gameplay.get("accuracy", 100.0) or 100.0
+
+        hp = gameplay.get("hp")
+        if isinstance(hp, dict):
+            frame.hp = hp.get("smooth", 1.0) or 1.0
+        elif isinstance(hp, (int, float)):
+            frame.hp = hp
+
+        frame.unstable_rate = gameplay.get("unstable_rate", 0.0) or 0.0
+
+        hits = gameplay.get("hits")
+        if isinstance(hits, dict):
+            frame.misses = hits.get("0", 0) or 0
+            hit_errors = hits.get("hitErrorArray")
+            if isinstance(hit_errors, list):
+                frame.hit_errors = hit_errors
+            if not frame.unstable_rate:
+                frame.unstable_rate = hits.get("unstableRate", 0.0) or 0.0
+
+    menu = data.get("menu")
+    if isinstance(menu, dict):
+        state = menu.get("state")
+        if isinstance(state, dict):
+            frame.state = state.get("name", "menu") or "menu"
+
+        bm = menu.get("bm")
+        if isinstance(bm, dict):
+            metadata = bm.get("metadata", _EMPTY)
+            if isinstance(metadata, dict):
+                frame.map_info = {
+                    key: metadata.get(key, "Unknown") or "Unknown" for key in _UNKNOWN_MAP_INFO
+                }
+            else:
+                print(f"⚠️ Invalid metadata type: {type(metadata)}")
+                frame.map_info = _UNKNOWN_MAP_INFO.copy()
+
+            # Selected mods, so plays can be told apart per mod combination
+            mods = menu.get("mods")
+            if isinstance(mods, dict):
+                frame.map_info["mods"] = mods.get("str", "") or ""
+
+    return frame
+
+
+def extract_precise_frame(data: Any) -> PreciseFrame:
+    """Pull the hit errors and key counts out of a decoded precise payload"""
+    if not isinstance(data, dict):
+        raise ValueError(f"Invalid data type received: {type(data)}")
+
+    frame = PreciseFrame(time_ms=data.get("currentTime", 0.0) or 0.0)
+
+    hit_errors = data.get("hitErrors")
+    if isinstance(hit_errors, list):
+        frame.hit_errors = hit_errors
+
+    keys = data.get("keys")
+    if isinstance(keys, dict):
+        frame.key_counts = {
+            name: key.get("count", 0) or 0 for name, key in keys.items() if isinstance(key, dict)
+        }
+
+    return frame
+
+
+# Event-bearing fields of a general payload, found without decoding the JSON
+_PEEK_STATE = re.compile(r'"state":\s*\{[^{}]*?"name":\s*"([^"]*)"')
+_PEEK_COMBO = re.compile(r'"combo":\s*\{[^{}]*?"current":\s*(\d+)')
+_PEEK_MISSES = re.compile(r'"hits":\s*\{[^{}]*?"0":\s*(\d+)')
+
+
+class EventPeek:
+    """Tells apart skipped general frames that carry an event.
+
+    A state change, a combo reset or a new miss makes a frame worth
+    decoding even when a newer frame is already waiting; everything else
+    in it is superseded by the newer frame.
+    """
+
+    def __init__(self):
+        self.state: Optional[str] = None
+        self.combo: Optional[int] = None
+        self.misses: Optional[int] = None
+
+    def is_event(self, message) -> bool:
+        """Peek at a raw message and remember its values for the next comparison"""
+        if isinstance(message, (bytes, bytearray)):
+            message = message.decode("utf-8", "replace")
+
+        match = _PEEK_STATE.search(message)
+        state = match.group(1) if match else self.state
+        match = _PEEK_COMBO.search(message)
+        combo = int(match.group(1)) if match else self.combo
+        match = _PEEK_MISSES.search(message)
+        misses = int(match.group(1)) if match else self.misses
+
+        event = (
+            state != self.state
+            or (combo is not None and self.combo is not None and combo < self.combo)
+            or (misses is not None and self.misses is not None and misses > self.misses)
+        )
+        self.state, self.combo, self.misses = state, combo, misses
+        return event
+
+    def observe(self, frame: GameFrame):
+        """Remember the values of a fully decoded frame"""
+        self.state = frame.state
+        self.combo = frame.combo
+        self.misses = frame.misses
+
+
+class FrameDecoder:
+    """Decodes raw Tosu messages into frames (GameFrames by default) and times the work"""
+
+    def __init__(self, extract: Callable[[Any], Any] = extract_frame, timer=NULL_HISTOGRAM):
+        self.extract = extract
+        self.timer = timer  # metrics histogram
+        self.stats = DecodeStats()
+
+    def decode(self, message):
+        start = time.perf_counter_ns()
+        try:
+            frame = self.extract(_loads(message))
+        except ValueError:
+            # Also covers JSON errors, both backends raise ValueError subclasses
+            self.stats.errors += 1
+            raise
+        elapsed = time.perf_counter_ns() - start
+
+        self.timer.observe_ns(elapsed)
+        stats = self.stats
+        stats.frames += 1
+        stats.total_bytes += len(message)
+        stats.total_ns += elapsed
+        if elapsed > stats.max_ns:
+            stats.max_ns = elapsed
+        return frame
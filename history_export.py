@@ -0,0 +1,145 @@
+# history_export.py
+"""
+Streaming export of the full play history.
+
+Plays are read lazily from stats_directory, a few at a time (in parallel
+when --workers > 1), and written out row by row, so memory use stays flat
+no matter how many plays there are.
+
+Usage:
+    python history_export.py history.csv
+    python history_export.py samples.ndjson --samples --workers 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import config
+import play_format
+from play_index import list_play_files, read_play_summary
+from sample_buffer import SAMPLE_FIELDS
+
+SUMMARY_FIELDS = [
+    'map_name', 'artist', 'difficulty', 'mods', 'final_accuracy',
+    'avg_accuracy', 'max_combo', 'total_misses', 'play_duration',
+    'combo_breaks', 'hp_drops', 'consistency_score', 'accuracy_trend',
+    'stamina_score', 'difficulty_spikes', 'timestamp'
+]
+SAMPLE_ROW_FIELDS = ['play', 'map_name', 'difficulty', 'mods', *SAMPLE_FIELDS]
+
+
+def _load(path: str, with_samples: bool) -> Tuple[str, Dict[str, Any], Any]:
+    if not with_samples:
+        return path, read_play_summary(path), None
+    map_stats = play_format.load_play(path)
+    return path, play_format.map_stats_summary(map_stats), map_stats.data_points
+
+
+def iter_plays(paths: List[str], with_samples: bool = False,
+               workers: int = 1) -> Iterator[Tuple[str, Dict[str, Any], Any]]:
+    """Yield (path, summary, samples) in order, keeping at most a few plays in memory"""
+    if workers <= 1:
+        for path in paths:
+            try:
+                yield _load(path, with_samples)
+            except Exception as e:
+                print(f"Error reading {path}: {e}", file=sys.stderr)
+        return
+
+    # Bounded read-ahead: never more than 2 * workers plays loaded at once
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        remaining = iter(paths)
+        for path in remaining:
+            in_flight.append((path, executor.submit(_load, path, with_samples)))
+            if len(in_flight) >= workers * 2:
+                break
+
+        while in_flight:
+            path, future = in_flight.popleft()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                in_flight.append((next_path, executor.submit(_load, next_path, with_samples)))
+            try:
+                yield future.result()
+            except Exception as e:
+                print(f"Error reading {path}: {e}", file=sys.stderr)
+
+
+def summary_record(summary: Dict[str, Any]) -> Dict[str, Any]:
+    record = {name: summary.get(name, "") for name in SUMMARY_FIELDS if name != 'timestamp'}
+    record['timestamp'] = datetime.fromtimestamp(summary.get('start_time', 0)).isoformat()
+    return record
+
+
+def iter_sample_records(path: str, summary: Dict[str, Any], samples) -> Iterator[Dict[str, Any]]:
+    play = os.path.basename(path)
+    columns = [getattr(samples, name).tolist() for name in SAMPLE_FIELDS]
+    prefix = {
+        'play': play,
+        'map_name': summary.get('map_name', ''),
+        'difficulty': summary.get('difficulty', ''),
+        'mods': summary.get('mods', ''),
+    }
+    for row in zip(*columns):
+        record = dict(prefix)
+        record.update(zip(SAMPLE_FIELDS, row))
+        yield record
+
+
+def export_history(output: str, stats_dir: Optional[str] = None, fmt: Optional[str] = None,
+                   samples: bool = False, workers: int = 1) -> int:
+    """Stream every saved play to output as CSV or NDJSON, returning the number of plays"""
+    stats_dir = stats_dir or config._config.stats_directory
+    fmt = fmt or ("ndjson" if output.endswith((".ndjson", ".jsonl")) else "csv")
+    fieldnames = SAMPLE_ROW_FIELDS if samples else SUMMARY_FIELDS
+
+    paths = list_play_files(stats_dir) if os.path.isdir(stats_dir) else []
+    plays = 0
+
+    with open(output, 'w', newline='', encoding='utf-8') as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            def write(record):
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+
+        for path, summary, play_samples in iter_plays(paths, samples, workers):
+            if samples:
+                for record in iter_sample_records(path, summary, play_samples):
+                    write(record)
+            else:
+                write(summary_record(summary))
+            plays += 1
+            if plays % 1000 == 0:
+                print(f"Exported {plays}/{len(paths)} plays")
+
+    return plays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the full play history")
+    parser.add_argument("output", help="output file (.csv, or .ndjson/.jsonl for NDJSON)")
+    parser.add_argument("--directory", default=None, help="stats directory (default: stats_directory from config)")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default=None,
+                        help="output format (default: from the file extension)")
+    parser.add_argument("--samples", action="store_true", help="write every sample instead of one row per play")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="parallel file readers (default: up to 4)")
+    args = parser.parse_args()
+
+    plays = export_history(args.output, args.directory, args.format, args.samples, args.workers)
+    print(f"Exported {plays} play(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
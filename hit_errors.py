@@ -0,0 +1,100 @@
+# hit_errors.py
+import math
+from collections import deque
+from typing import Any, Dict, List, Sequence
+
+HIT_ERROR_BIN_MS = 2  # Histogram bin width
+HIT_ERROR_RANGE_MS = 200  # Histogram covers -range..+range, outliers land in the outer bins
+RECENT_HITS = 30  # Hits drawn on the live hit-error bar
+
+
+class HitErrorTracker:
+    """Running hit-error statistics of a play, fed from Tosu's hit error array.
+
+    Only the part of the array not seen yet is consumed on each frame, and
+    every hit costs O(1): a fixed-bin histogram, Welford's running mean and
+    variance, early/late counts and a short deque for the live bar.
+    Errors are in ms, negative means early.
+    """
+
+    def __init__(self, bin_ms: int = HIT_ERROR_BIN_MS, range_ms: int = HIT_ERROR_RANGE_MS,
+                 recent: int = RECENT_HITS):
+        self.bin_ms = bin_ms
+        self.range_ms = range_ms
+        self.recent_size = recent
+        self.reset()
+
+    def reset(self):
+        """Forget all hits"""
+        self.histogram: List[int] = [0] * (2 * self.range_ms // self.bin_ms)
+        self.recent = deque(maxlen=self.recent_size)
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.early = 0
+        self.late = 0
+        self._consumed = 0
+        self._summary: Dict[str, Any] = {}
+        self._summary_count = -1
+
+    def consume(self, errors: Sequence[float]) -> int:
+        """Add the hits of errors not consumed yet, returning how many were new"""
+        if len(errors) < self._consumed:
+            # Array started over (retry), the old hits belonged to another attempt
+            self.reset()
+        # Index from the first new hit, so the consumed prefix is never walked again
+        start = self._consumed
+        for i in range(start, len(errors)):
+            self.add(errors[i])
+        self._consumed = len(errors)
+        return self._consumed - start
+
+    def add(self, error: float):
+        self.count += 1
+        delta = error - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (error - self.mean)
+
+        if error < 0:
+            self.early += 1
+        elif error > 0:
+            self.late += 1
+
+        index = int((error + self.range_ms) // self.bin_ms)
+        self.histogram[min(max(index, 0), len(self.histogram) - 1)] += 1
+        self.recent.append(error)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def unstable_rate(self) -> float:
+        """osu!'s unstable rate: 10x the standard deviation of the hit errors"""
+        return 10 * math.sqrt(self.variance)
+
+    def summary(self) -> Dict[str, Any]:
+        """Live values for the overlay; the same dict until a new hit arrives"""
+        if self._summary_count != self.count:
+            self._summary_count = self.count
+            self._summary = {
+                "count": self.count,
+                "mean": self.mean,
+                "unstable_rate": self.unstable_rate,
+                "early": self.early,
+                "late": self.late,
+                "recent": tuple(self.recent),
+            } if self.count else {}
+        return self._summary
+
+    def results(self) -> Dict[str, Any]:
+        """The MapStats hit error fields"""
+        return {
+            "hit_error_count": self.count,
+            "hit_error_mean": self.mean,
+            "unstable_rate": self.unstable_rate,
+            "early_hits": self.early,
+            "late_hits": self.late,
+            "hit_error_bin_ms": self.bin_ms,
+            "hit_error_histogram": list(self.histogram) if self.count else [],
+        }
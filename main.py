@@ -1,10 +1,44 @@
 # main.py
-from memory_reader import MemoryReader
-from overlay import Overlay
-from input_handler import start_hotkey_listener
-import config
+import time
+
+_PROCESS_START = time.perf_counter()
+
+import argparse
 import signal
 import sys
+from contextlib import contextmanager
+import config
+
+
+class StartupProfile:
+    """Per-phase wall-clock timings of startup, printed with --startup-profile"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.phases = []
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def mark(self, name: str):
+        """Print a milestone measured from process start"""
+        if self.enabled:
+            print(f"[startup] {name} at {(time.perf_counter() - _PROCESS_START) * 1000:.1f}ms")
+
+    def report(self):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        print("[startup] Phase timings:")
+        for name, elapsed in self.phases:
+            print(f"[startup]   {name:<28} {elapsed * 1000:8.1f}ms")
+        self.mark("overlay shown")
 
 
 def signal_handler(sig, frame):
@@ -13,18 +47,50 @@ def signal_handler(sig, frame):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="osu! Performance Tracker")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print per-phase import and init times")
+    args = parser.parse_args()
+    profile = StartupProfile(args.startup_profile)
+
     # Handle Ctrl+C gracefully
     signal.signal(signal.SIGINT, signal_handler)
 
+    with profile.phase("load config"):
+        config.get_config()
+
+    # debug_mode profiles the whole session
+    from profiler import start_session_profiler
+    session_profiler = start_session_profiler()
+
     print("Starting osu! Performance Tracker...")
     print(f"Press {config.HOTKEY.upper()} to toggle overlay visibility")
     print("Analysis windows will automatically appear after completing maps!")
 
-    memory_reader = MemoryReader()
-    overlay = Overlay(memory_reader)
+    # Open the Tosu socket first, the plotting stack waits for the first analysis
+    with profile.phase("import memory_reader"):
+        from memory_reader import MemoryReader
+    with profile.phase("start memory reader"):
+        memory_reader = MemoryReader()
+
+    if profile.enabled:
+        def on_update(dirty):
+            if "connected" in dirty and memory_reader.get_snapshot().connected:
+                profile.mark("websocket connected")
+        memory_reader.add_listener(on_update)
+
+    with profile.phase("import overlay"):
+        from overlay import Overlay
+    with profile.phase("create overlay"):
+        overlay = Overlay(memory_reader)
 
     # Start hotkey listener
-    listener = start_hotkey_listener(overlay.toggle_visibility)
+    with profile.phase("start hotkey listener"):
+        from input_handler import start_hotkey_listener
+        listener = start_hotkey_listener(overlay.toggle_visibility)
+
+    if profile.enabled:
+        overlay.root.after(0, profile.report)
 
     try:
         overlay.run()
@@ -33,7 +99,9 @@ def main():
     finally:
         if listener:
             listener.stop()
+        if session_profiler:
+            session_profiler.stop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,15 +1,49 @@
 # memory_reader.py
 import asyncio
 import threading
-import websockets
-import json
 import time
+from dataclasses import dataclass, field, fields
+from typing import Dict, Any, Callable, List, Set
 import config
+from finalizer import MapFinalizer
+from metrics import get_metrics
+from frame_decoder import FrameDecoder, GameFrame, PreciseFrame, extract_frame, extract_precise_frame
+from sampler import AdaptiveSampler
 from stats_tracker import StatsTracker
+from streams import ConflatingStream, ReconnectPolicy, StreamConnection
+
+DECODE_REPORT_INTERVAL = 30  # Seconds between decode timing reports in debug mode
+PRECISE_RECONNECT_DELAY = 0.5  # First retry of the precise stream, backing off to RECONNECT_DELAY
+
+
+@dataclass(frozen=True, slots=True)
+class FrameSnapshot:
+    """Immutable view of the reader state, published once per processed frame.
+
+    Readers get a consistent set of values from a single attribute read and
+    can compare seq to skip work when nothing new has arrived. The dicts are
+    never mutated after publication.
+    """
+    seq: int = 0
+    combo: int = 0
+    max_combo: int = 0
+    accuracy: float = 100.0
+    hp: float = 1.0
+    misses: int = 0
+    connected: bool = False
+    game_state: str = "menu"
+    map_info: Dict[str, str] = field(default_factory=dict)
+    live_stats: Dict[str, Any] = field(default_factory=dict)
+    hit_errors: Dict[str, Any] = field(default_factory=dict)
+    key_counts: Dict[str, int] = field(default_factory=dict)
+
+
+# Snapshot fields reported as dirty to listeners when their value changes
+SNAPSHOT_FIELDS = tuple(f.name for f in fields(FrameSnapshot) if f.name != "seq")
 
 
 class MemoryReader:
-    def __init__(self):
+    def __init__(self, autostart=True):
         # Initialize all attributes first to prevent AttributeError
         self.combo = 0
         self.max_combo = 0
@@ -19,24 +53,60 @@ class MemoryReader:
         self.connected = False
         self.game_state = "menu"  # menu, playing, results
         self.map_info = {}
+        self.key_counts = {}
+        self.precise_active = False  # Hit errors come from the precise stream while it delivers
 
         # Stats tracking
         self.stats_tracker = StatsTracker()
-        self.last_sample_time = 0
+        self.sampler = AdaptiveSampler()
         self.was_playing = False
 
+        # Per-stage timings (no-ops unless metrics or debug mode are on)
+        self.metrics = get_metrics()
+        self.update_timer = self.metrics.histogram(
+            "osutracker_update_data_ms", "Time to apply a decoded frame")
+        self.append_timer = self.metrics.histogram(
+            "osutracker_sample_append_ms", "Time to store a sample")
+        self.publish_timer = self.metrics.histogram(
+            "osutracker_snapshot_publish_ms", "Time to publish a snapshot and notify listeners")
+
+        # Selective payload decoding
+        self.decoder = FrameDecoder(timer=self.metrics.histogram(
+            "osutracker_decode_ms", "JSON decode and field extraction time", stream="general"))
+        self.precise_decoder = FrameDecoder(extract_precise_frame, timer=self.metrics.histogram(
+            "osutracker_decode_ms", "JSON decode and field extraction time", stream="precise"))
+        self._last_decode_report = time.monotonic()
+
         # Threading and async setup - initialize these early
         self._data_lock = threading.RLock()
         self._shutdown_event = threading.Event()
 
+        # Latest published state, replaced (never mutated) by the websocket thread
+        self._snapshot = FrameSnapshot()
+        self._listeners: List[Callable[[Set[str]], None]] = []
+
+        # (sequence, MapStats) of the last finished play, replaced by the finalizer thread
+        self._latest_map_stats = (0, None)
+        self._map_stats_taken = 0
+
+        # Analysis and saving of finished plays happen off the websocket thread
+        self.finalizer = MapFinalizer(self.stats_tracker, self._on_map_finalized)
+
         # Initialize loop and thread attributes
         self.loop = None
         self.thread = None
+        self.streams: List[StreamConnection] = []
+
+        # Benchmarks and tools drive update_data directly without a connection
+        if not autostart:
+            return
 
         # Now safely start the async components
         try:
+            self.streams = self._create_streams()
+            self._register_stream_metrics()
             self.loop = asyncio.new_event_loop()
-            self.thread = threading.Thread(target=self._start_loop, daemon=True)
+            self.thread = threading.Thread(target=self._start_loop, name="MemoryReader", daemon=True)
             self.thread.start()
         except Exception as e:
             print(f"Failed to initialize MemoryReader: {e}")
@@ -47,134 +117,90 @@ class MemoryReader:
     def _start_loop(self):
         try:
             asyncio.set_event_loop(self.loop)
-            self.loop.run_until_complete(self.connect_with_retry())
+            self.loop.run_until_complete(self._run_streams())
         except Exception as e:
             print(f"Error in async loop: {e}")
 
-    async def connect_with_retry(self):
-        while not self._shutdown_event.is_set():
-            try:
-                await self.connect()
-            except Exception as e:
-                print(f"Connection failed: {e}. Retrying in {config.RECONNECT_DELAY} seconds...")
-                self.connected = False
-                # Use asyncio.sleep with timeout to allow shutdown
-                try:
-                    await asyncio.wait_for(
-                        asyncio.sleep(config.RECONNECT_DELAY),
-                        timeout=1.0
-                    )
-                except asyncio.TimeoutError:
-                    # Check shutdown more frequently
-                    continue
+    async def _run_streams(self):
+        await asyncio.gather(*(stream.run() for stream in self.streams))
+
+    def _create_streams(self):
+        """The general stream, plus the precise stream when enabled"""
+        streams = [ConflatingStream(
+            "general", config.WEBSOCKET_URI, self.decoder, self._on_general_frame,
+            ReconnectPolicy(config.RECONNECT_DELAY, config.RECONNECT_DELAY),
+            self._shutdown_event, self._set_connected
+        )]
+        if config._config.use_precise_stream:
+            streams.append(StreamConnection(
+                "precise", config._config.precise_websocket_uri, self.precise_decoder,
+                self._on_precise_frame, ReconnectPolicy(PRECISE_RECONNECT_DELAY, config.RECONNECT_DELAY),
+                self._shutdown_event, self._set_precise_connected
+            ))
+        return streams
+
+    def _register_stream_metrics(self):
+        """Stream counters, read from StreamStats when scraped"""
+        counters = (
+            ("osutracker_frames_total", "Frames received", "messages"),
+            ("osutracker_frames_dropped_total", "Frames skipped by conflation without decoding", "dropped"),
+            ("osutracker_frames_coalesced_total", "Backlogs of several frames handled as one", "coalesced"),
+            ("osutracker_frames_overflowed_total", "Frames lost to a full backlog", "overflowed"),
+            ("osutracker_frame_errors_total", "Frames that failed to decode", "errors"),
+            ("osutracker_reconnects_total", "Connections lost", "disconnects"),
+        )
+        for stream in self.streams:
+            for name, help_text, attribute in counters:
+                self.metrics.counter(name, help_text, lambda s=stream.stats, a=attribute: getattr(s, a),
+                                     stream=stream.name)
+
+    def _on_general_frame(self, frame):
+        self.update_data(frame)
+        self._report_decode_stats()
+
+    def _on_precise_frame(self, frame: PreciseFrame):
+        """Hit errors and key counts from the precise stream, at its own (higher) rate"""
+        with self._data_lock:
+            self.precise_active = True
+            if self.game_state == "play":
+                self.stats_tracker.add_hit_errors(frame.hit_errors)
+            if frame.key_counts is not None:
+                self.key_counts = frame.key_counts
+            dirty = self._publish_snapshot()
+        self._notify(dirty)
+
+    def _set_precise_connected(self, connected):
+        if not connected:
+            # Hit errors come from the general payload again
+            with self._data_lock:
+                self.precise_active = False
 
-    async def connect(self):
-        try:
-            async with websockets.connect(
-                    config.WEBSOCKET_URI,
-                    ping_interval=20,
-                    ping_timeout=10
-            ) as websocket:
-                print("Connected to Tosu!")
-                self.connected = True
-
-                while not self._shutdown_event.is_set():
-                    try:
-                        message = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                        data = json.loads(message)
-                        self.update_data(data)
-                    except asyncio.TimeoutError:
-                        # Send ping to check connection
-                        try:
-                            await websocket.ping()
-                        except Exception:
-                            # Connection likely lost
-                            break
-                    except websockets.exceptions.ConnectionClosed:
-                        print("Connection closed by server")
-                        break
-                    except json.JSONDecodeError as e:
-                        print(f"Invalid JSON received: {e}")
-                        continue
-                    except Exception as e:
-                        print(f"Unexpected error in connect: {e}")
-                        break
-
-        except ConnectionRefusedError:
-            print("Tosu is not running or not accessible")
-            raise
-        except Exception as e:
-            print(f"Websocket error: {e}")
-            self.connected = False
-            raise
+    def update_data(self, frame):
+        """Apply a decoded frame (or a raw Tosu payload dict) to the current state"""
+        start = time.perf_counter_ns()
+        self._apply_frame(frame)
+        self.update_timer.observe_ns(time.perf_counter_ns() - start)
+
+    def _apply_frame(self, frame):
+        if not isinstance(frame, GameFrame):
+            try:
+                frame = extract_frame(frame)
+            except ValueError as e:
+                print(f"⚠️ {e}")
+                return
 
-    def update_data(self, data):
-        """Update data with better error handling and data validation"""
         try:
             with self._data_lock:
-                # Validate that data is a dictionary
-                if not isinstance(data, dict):
-                    print(f"⚠️ Invalid data type received: {type(data)}")
-                    return
-
-                # Extract gameplay data safely
-                gameplay = data.get("gameplay", {})
-                if not isinstance(gameplay, dict):
-                    gameplay = {}
-
-                menu = data.get("menu", {})
-                if not isinstance(menu, dict):
-                    menu = {}
-
-                state = menu.get("state", {})
-                if not isinstance(state, dict):
-                    state = {}
-
-                # Update game stats with validation
-                combo_data = gameplay.get("combo", {})
-                if isinstance(combo_data, dict):
-                    self.combo = combo_data.get("current", 0) or 0
-                    self.max_combo = combo_data.get("max", 0) or 0
-                else:
-                    self.combo = combo_data if isinstance(combo_data, int) else 0
-
-                self.accuracy = gameplay.get("accuracy", 100.0) or 100.0
-
-                hp_data = gameplay.get("hp", {})
-                if isinstance(hp_data, dict):
-                    self.hp = hp_data.get("smooth", 1.0) or 1.0
-                else:
-                    self.hp = hp_data if isinstance(hp_data, (int, float)) else 1.0
-
-                hits_data = gameplay.get("hits", {})
-                if isinstance(hits_data, dict):
-                    self.misses = hits_data.get("0", 0) or 0
-                else:
-                    self.misses = 0
-
-                # Get game state
-                new_state = state.get("name", "menu") or "menu"
-
-                # Handle map info
-                if "bm" in menu and isinstance(menu["bm"], dict):
-                    bm = menu["bm"]
-                    metadata = bm.get("metadata", {})
-
-                    if isinstance(metadata, dict):
-                        self.map_info = {
-                            "title": metadata.get("title", "Unknown") or "Unknown",
-                            "artist": metadata.get("artist", "Unknown") or "Unknown",
-                            "difficulty": metadata.get("difficulty", "Unknown") or "Unknown",
-                            "mapper": metadata.get("mapper", "Unknown") or "Unknown"
-                        }
-                    else:
-                        print(f"⚠️ Invalid metadata type: {type(metadata)}")
-                        self.map_info = {
-                            "title": "Unknown",
-                            "artist": "Unknown",
-                            "difficulty": "Unknown",
-                            "mapper": "Unknown"
-                        }
+                self.combo = frame.combo
+                if frame.max_combo is not None:
+                    self.max_combo = frame.max_combo
+                self.accuracy = frame.accuracy
+                self.hp = frame.hp
+                self.misses = frame.misses
+                new_state = frame.state
+
+                if frame.map_info is not None:
+                    self.map_info = frame.map_info
 
                 # Handle state changes
                 if new_state != self.game_state:
@@ -182,21 +208,47 @@ class MemoryReader:
                     self._handle_state_change(self.game_state, new_state)
                     self.game_state = new_state
 
-                # Sample data during play
+                # Sample data during play: events always, steady stretches sparsely
                 if self.game_state == "play" and self.stats_tracker.is_playing:
-                    current_time = time.time() * 1000
-                    if current_time - self.last_sample_time >= config.SAMPLE_INTERVAL:
-                        unstable_rate = gameplay.get("unstable_rate", 0.0) or 0.0
+                    # Every frame, so hit errors are never missed
+                    if not self.precise_active:
+                        self.stats_tracker.add_hit_errors(frame.hit_errors)
+                    if self.sampler.check(time.time() * 1000, self.combo, self.accuracy, self.hp, self.misses):
+                        hit_errors = self.stats_tracker.hit_errors
+                        unstable_rate = hit_errors.unstable_rate if hit_errors.count else frame.unstable_rate
+                        append_start = time.perf_counter_ns()
                         self.stats_tracker.add_data_point(
                             self.combo, self.accuracy, self.hp, self.misses, unstable_rate
                         )
-                        self.last_sample_time = current_time
+                        self.append_timer.observe_ns(time.perf_counter_ns() - append_start)
+
+                dirty = self._publish_snapshot()
+            # Listeners run outside the lock
+            self._notify(dirty)
 
         except Exception as e:
             print(f"Error in update_data: {e}")
             import traceback
             traceback.print_exc()
 
+    def _report_decode_stats(self):
+        """Print decode timing periodically when debugging"""
+        if not config._config.debug_mode:
+            return
+        now = time.monotonic()
+        if now - self._last_decode_report >= DECODE_REPORT_INTERVAL:
+            self._last_decode_report = now
+            print(self.decoder.stats.summary())
+            if config._config.use_precise_stream:
+                print(f"precise {self.precise_decoder.stats.summary()}")
+            for stream in self.streams:
+                print(stream.stats.summary(stream.name))
+            print(self.sampler.stats.summary())
+
+    def get_stream_stats(self):
+        """StreamStats of each connection by stream name"""
+        return {stream.name: stream.stats for stream in self.streams}
+
     def _handle_state_change(self, old_state, new_state):
         """Handle game state changes for tracking"""
         try:
@@ -204,51 +256,107 @@ class MemoryReader:
                 # Started playing
                 print(f"Started playing: {self.map_info}")
                 self.stats_tracker.start_tracking(self.map_info)
+                self.sampler.reset()
                 self.was_playing = True
             elif old_state == "play" and new_state in ["results", "menu"]:
                 # Finished playing
                 if self.was_playing:
-                    print("Finished playing, calculating stats...")
-                    map_stats = self.stats_tracker.finish_map(
+                    pending = self.stats_tracker.end_play(
                         self.combo, self.accuracy, self.hp, self.misses
                     )
-                    if map_stats:
-                        print(f"Map stats generated for: {map_stats.map_name}")
-                        self.latest_map_stats = map_stats
+                    if pending:
+                        print("Finished playing, calculating stats...")
+                        self.finalizer.submit(pending)
                     self.was_playing = False
         except Exception as e:
             print(f"Error in state change handling: {e}")
 
-    def get_combo(self):
+    def _on_map_finalized(self, map_stats):
+        """Called on the finalizer thread once a play's stats are ready"""
+        # Published like the snapshot: one reference assignment, no lock
+        self._latest_map_stats = (self._latest_map_stats[0] + 1, map_stats)
+        self._notify({"map_stats"})
+
+    def _set_connected(self, connected):
+        dirty = set()
         with self._data_lock:
-            return self.combo
+            if self.connected != connected:
+                self.connected = connected
+                dirty = self._publish_snapshot()
+        self._notify(dirty)
+
+    def _publish_snapshot(self) -> Set[str]:
+        """Publish the current state and return the changed fields.
+
+        Must be called with _data_lock held; the caller notifies listeners
+        with the result after releasing it.
+        """
+        start = time.perf_counter_ns()
+        previous = self._snapshot
+        snapshot = FrameSnapshot(
+            seq=previous.seq + 1,
+            combo=self.combo,
+            max_combo=self.max_combo,
+            accuracy=self.accuracy,
+            hp=self.hp,
+            misses=self.misses,
+            connected=self.connected,
+            game_state=self.game_state,
+            map_info=self.map_info,
+            live_stats=self.stats_tracker.get_live_stats(),
+            hit_errors=self.stats_tracker.get_hit_error_summary(),
+            key_counts=self.key_counts
+        )
+        # A single reference assignment, so readers never see a torn mix of frames
+        self._snapshot = snapshot
+
+        dirty = {name for name in SNAPSHOT_FIELDS if getattr(snapshot, name) != getattr(previous, name)}
+        self.publish_timer.observe_ns(time.perf_counter_ns() - start)
+        return dirty
+
+    def add_listener(self, callback):
+        """Register callback(dirty_fields) to be called on the websocket thread when state changes.
+
+        Callbacks must be cheap and thread-safe; UI code should only schedule work.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, dirty):
+        if not dirty:
+            return
+        for callback in self._listeners:
+            try:
+                callback(dirty)
+            except Exception as e:
+                print(f"Error in update listener: {e}")
+
+    def get_snapshot(self):
+        """Latest published state, lock-free"""
+        return self._snapshot
+
+    def get_combo(self):
+        return self._snapshot.combo
 
     def get_max_combo(self):
-        with self._data_lock:
-            return self.max_combo
+        return self._snapshot.max_combo
 
     def get_accuracy(self):
-        with self._data_lock:
-            return self.accuracy
+        return self._snapshot.accuracy
 
     def get_misses(self):
-        with self._data_lock:
-            return self.misses
+        return self._snapshot.misses
 
     def get_hp(self):
-        with self._data_lock:
-            return self.hp
+        return self._snapshot.hp
 
     def is_connected(self):
-        return self.connected
+        return self._snapshot.connected
 
     def get_game_state(self):
-        with self._data_lock:
-            return self.game_state
+        return self._snapshot.game_state
 
     def get_map_info(self):
-        with self._data_lock:
-            return self.map_info.copy()
+        return self._snapshot.map_info.copy()
 
     def shutdown(self):
         """Graceful shutdown"""
@@ -274,10 +382,13 @@ class MemoryReader:
             except Exception as e:
                 print(f"Error joining thread: {e}")
 
+        # Let queued plays finish saving
+        self.finalizer.stop()
+
     def get_latest_map_stats(self):
-        """Get and clear the latest completed map stats"""
-        if hasattr(self, 'latest_map_stats'):
-            stats = self.latest_map_stats
-            delattr(self, 'latest_map_stats')
-            return stats
-        return None
\ No newline at end of file
+        """The latest completed map stats if not returned before, lock-free (call from one thread)"""
+        seq, stats = self._latest_map_stats
+        if seq == self._map_stats_taken:
+            return None
+        self._map_stats_taken = seq
+        return stats
\ No newline at end of file
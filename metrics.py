@@ -0,0 +1,208 @@
+# metrics.py
+"""
+Per-stage latency histograms and counters.
+
+Stages time themselves with time.perf_counter_ns() and observe into
+fixed-bucket histograms. With metrics_enabled and debug_mode both off every
+histogram is a shared no-op, so the only cost left is the timer call.
+
+With metrics_enabled on, a local HTTP endpoint serves everything in the
+Prometheus text format at http://127.0.0.1:<metrics_port>/metrics.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+import config
+
+# Upper bounds in milliseconds, an implicit +Inf bucket follows
+LATENCY_BUCKETS_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Fixed-bucket latency histogram in milliseconds"""
+    __slots__ = ("name", "labels", "bounds", "counts", "count", "sum")
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...] = (),
+                 bounds: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.name = name
+        self.labels = labels
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+
+    def observe_ns(self, elapsed_ns: int):
+        self.observe(elapsed_ns / 1e6)
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf when past the last bound)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_format_labels(self.labels, le)} {self.count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels)} {self.sum}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels)} {self.count}")
+        return lines
+
+
+class NullHistogram:
+    """Stands in for every histogram while metrics are off"""
+    __slots__ = ()
+    count = 0
+    avg = 0.0
+
+    def observe(self, value_ms: float):
+        pass
+
+    def observe_ns(self, elapsed_ns: int):
+        pass
+
+    def quantile(self, q: float) -> float:
+        return 0.0
+
+
+NULL_HISTOGRAM = NullHistogram()
+
+
+class Metrics:
+    """Registry of histograms and read-on-demand counters"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Callable[[], float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def histogram(self, name: str, help_text: str, **labels: str):
+        """The histogram for name and labels (a no-op one when disabled)"""
+        if not self.enabled:
+            return NULL_HISTOGRAM
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(name, key[1])
+                self._help[name] = ("histogram", help_text)
+            return histogram
+
+    def counter(self, name: str, help_text: str, read: Callable[[], float], **labels: str):
+        """Register a counter whose value is read from read() at scrape time, so counting costs nothing"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] = read
+            self._help[name] = ("counter", help_text)
+
+    def render_prometheus(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = list(self._histograms.values())
+            counters = list(self._counters.items())
+            help_texts = dict(self._help)
+
+        lines = []
+        written = set()
+
+        def header(name):
+            if name not in written:
+                written.add(name)
+                kind, help_text = help_texts[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for histogram in sorted(histograms, key=lambda h: (h.name, h.labels)):
+            header(histogram.name)
+            lines.extend(histogram.render())
+        for (name, labels), read in sorted(counters, key=lambda item: item[0]):
+            header(name)
+            try:
+                value = read()
+            except Exception:
+                continue
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_server(self, port: int, host: str = "127.0.0.1"):
+        """Serve /metrics on a daemon thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # No line per scrape
+
+        try:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"⚠️ Could not start metrics endpoint on port {port}: {e}")
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True).start()
+        print(f"Metrics at http://{host}:{port}/metrics")
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """The process-wide registry; recording is on with metrics_enabled or debug_mode"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            cfg = config._config
+            _metrics = Metrics(enabled=cfg.metrics_enabled or cfg.debug_mode)
+            if cfg.metrics_enabled:
+                _metrics.start_server(cfg.metrics_port)
+        return _metrics
@@ -1,26 +1,52 @@
 # overlay.py
 import customtkinter as ctk
 import config
-from analysis_window import AnalysisWindow
+from hit_errors import RECENT_HITS
+from memory_reader import SNAPSHOT_FIELDS
+import sys
 import threading
 import time
+from utils import current_rss_mb, peak_rss_mb
+
+MEMORY_REFRESH_INTERVAL = 1.0  # Seconds between memory readings in debug mode
+IDLE_POLL_MS = 200  # Poll interval while nothing changes; REFRESH_RATE applies while changes arrive
+PREWARM_DELAY_MS = 2000  # Let the overlay settle before loading the plotting stack
+HIT_BAR_WIDTH = 300
+HIT_BAR_HEIGHT = 24
+HIT_BAR_RANGE_MS = 100  # Hit errors shown on each side of the center line
 
 
 class Overlay:
     def __init__(self, memory_reader):
         self.memory_reader = memory_reader
         self.visible = True
-        self.last_update_data = {}
         self.update_counter = 0
         self.last_map_stats = None
         self.last_update_time = 0
 
+        # Dirty fields pushed from the websocket thread, drained by the Tk-side poll
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._label_text = {}
+
+        # Created with the first analysis, matplotlib is only imported then
+        self._analysis_windows = None
+        self._analysis_lock = threading.Lock()
+        self._memory_text = ""
+        self._memory_time = 0.0
+
+        # Per-stage timings, shown on the debug label
+        self.metrics = memory_reader.metrics
+        self._labels_timer = self.metrics.histogram(
+            "osutracker_update_labels_ms", "Time to update the overlay labels")
+        self._frames_seen = 0
+
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("dark-blue")
 
         self.root = ctk.CTk()
         self.root.title("osu! Performance Tracker")
-        self.root.geometry("500x450+300+300")
+        self.root.geometry("500x550+300+300")
         self.root.resizable(True, True)
         self.root.minsize(350, 300)
         self.root.attributes("-topmost", True)
@@ -29,6 +55,7 @@ class Overlay:
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         self.setup_ui()
+        self.memory_reader.add_listener(self._on_reader_update)
 
     def setup_ui(self):
         self.frame = ctk.CTkFrame(self.root)
@@ -78,6 +105,34 @@ class Overlay:
         self.hp_label = ctk.CTkLabel(self.frame, text="HP: 1.00", font=("Segoe UI", 18))
         self.hp_label.pack(anchor="w", pady=5)
 
+        # Running analysis of the current play
+        self.live_label = ctk.CTkLabel(
+            self.frame,
+            text="Live: -",
+            font=("Segoe UI", 12),
+            text_color="gray"
+        )
+        self.live_label.pack(anchor="w", pady=2)
+
+        # Live hit errors
+        self.hit_error_label = ctk.CTkLabel(
+            self.frame,
+            text="Hit Error: -",
+            font=("Segoe UI", 12),
+            text_color="gray"
+        )
+        self.hit_error_label.pack(anchor="w", pady=2)
+        self.setup_hit_error_bar()
+
+        # Key press counts (precise stream)
+        self.keys_label = ctk.CTkLabel(
+            self.frame,
+            text="Keys: -",
+            font=("Segoe UI", 12),
+            text_color="gray"
+        )
+        self.keys_label.pack(anchor="w", pady=2)
+
         # Analysis button
         self.analysis_button = ctk.CTkButton(
             self.frame,
@@ -105,70 +160,156 @@ class Overlay:
         )
         self.help_label.pack(anchor="w", pady=(10, 0))
 
-    def update_display(self):
-        current_time = time.time()
+    def setup_hit_error_bar(self):
+        """Canvas items for the live hit-error bar, created once and only moved afterwards"""
+        self.hit_bar = ctk.CTkCanvas(
+            self.frame, width=HIT_BAR_WIDTH, height=HIT_BAR_HEIGHT, bg="#2b2b2b", highlightthickness=0
+        )
+        self.hit_bar.pack(anchor="w", pady=2)
+
+        center = HIT_BAR_WIDTH / 2
+        self.hit_bar.create_line(center, 0, center, HIT_BAR_HEIGHT, fill="gray", width=1)
+
+        # One tick per recent hit, the newest first and brightest
+        self.hit_ticks = []
+        for age in range(RECENT_HITS):
+            level = int(255 - 175 * age / max(1, RECENT_HITS - 1))
+            color = f"#{level // 2:02x}{level:02x}{level:02x}"
+            self.hit_ticks.append(self.hit_bar.create_line(
+                center, 4, center, HIT_BAR_HEIGHT - 4, fill=color, width=2, state="hidden"
+            ))
+
+        self.hit_mean_marker = self.hit_bar.create_polygon(
+            center - 5, 0, center + 5, 0, center, 6, fill="orange", state="hidden"
+        )
 
-        # Check for completed maps first
+    def _hit_bar_x(self, error):
+        offset = max(-1.0, min(1.0, error / HIT_BAR_RANGE_MS))
+        return HIT_BAR_WIDTH / 2 * (1 + offset)
+
+    def _update_hit_errors(self, hit_errors):
+        """Redraw the hit-error bar and text from the snapshot's hit error summary"""
+        if not hit_errors:
+            self._set_text(self.hit_error_label, "Hit Error: -")
+            for tick in self.hit_ticks:
+                self.hit_bar.itemconfigure(tick, state="hidden")
+            self.hit_bar.itemconfigure(self.hit_mean_marker, state="hidden")
+            return
+
+        mean = hit_errors["mean"]
+        self._set_text(
+            self.hit_error_label,
+            f"UR {hit_errors['unstable_rate']:.1f} | Avg {mean:+.1f}ms "
+            f"({'early' if mean < 0 else 'late'}) | Early {hit_errors['early']} / Late {hit_errors['late']}"
+        )
+
+        recent = hit_errors["recent"]
+        for age, tick in enumerate(self.hit_ticks):
+            if age < len(recent):
+                x = self._hit_bar_x(recent[-1 - age])
+                self.hit_bar.coords(tick, x, 4, x, HIT_BAR_HEIGHT - 4)
+                self.hit_bar.itemconfigure(tick, state="normal")
+            else:
+                self.hit_bar.itemconfigure(tick, state="hidden")
+
+        x = self._hit_bar_x(mean)
+        self.hit_bar.coords(self.hit_mean_marker, x - 5, 0, x + 5, 0, x, 6)
+        self.hit_bar.itemconfigure(self.hit_mean_marker, state="normal")
+
+    def _on_reader_update(self, dirty):
+        """Called on the websocket thread whenever published fields change.
+
+        Only records the fields: calling into Tk from this thread would block
+        ingestion until the mainloop serviced the call.
+        """
+        with self._dirty_lock:
+            self._dirty |= dirty
+
+    def _poll(self):
+        """Apply pending changes on the Tk thread.
+
+        Wakes every IDLE_POLL_MS while nothing changes and at REFRESH_RATE
+        while changes keep arriving, so an idle overlay barely runs.
+        """
+        interval = IDLE_POLL_MS
         try:
-            latest_stats = self.memory_reader.get_latest_map_stats()
-            if latest_stats:
-                self.last_map_stats = latest_stats
-                self.analysis_button.configure(state="normal")
-                print(f"New map stats available: {latest_stats.map_name}")
-                # Show analysis window automatically
-                if config._config.auto_show_analysis:
-                    self.show_analysis_window(latest_stats)
+            with self._dirty_lock:
+                pending = bool(self._dirty)
+            if pending:
+                self.update_display()
+                interval = max(1, int(1000 / config.REFRESH_RATE))
         except Exception as e:
-            print(f"Error checking for map stats: {e}")
+            print(f"Error updating display: {e}")
+        finally:
+            try:
+                self.root.after(interval, self._poll)
+            except Exception:
+                pass  # Window is being destroyed
+
+    def update_display(self):
+        """Apply pending changes on the Tk thread"""
+        with self._dirty_lock:
+            dirty = self._dirty
+            self._dirty = set()
 
-        # Update UI at reduced frequency when not playing
-        should_update = False
-        game_state = self.memory_reader.get_game_state()
+        self.last_update_time = time.time()
 
-        if game_state == "play":
-            # Update more frequently during play
-            if current_time - self.last_update_time >= 1.0 / config.REFRESH_RATE:
-                should_update = True
-        else:
-            # Update less frequently in menu/results
-            if current_time - self.last_update_time >= 0.5:  # 2 FPS
-                should_update = True
+        # Check for completed maps first
+        if "map_stats" in dirty:
+            try:
+                latest_stats = self.memory_reader.get_latest_map_stats()
+                if latest_stats:
+                    self.last_map_stats = latest_stats
+                    self.analysis_button.configure(state="normal")
+                    print(f"New map stats available: {latest_stats.map_name}")
+                    # Show analysis window automatically
+                    if config._config.auto_show_analysis:
+                        self.show_analysis_window(latest_stats)
+            except Exception as e:
+                print(f"Error checking for map stats: {e}")
 
-        if should_update:
-            self.last_update_time = current_time
+        # One lock-free read gives a consistent view of a single frame
+        snapshot = self.memory_reader.get_snapshot()
 
+        # Skip all work when no displayed field changed
+        if dirty - {"map_stats"}:
             try:
-                # Get current data
-                current_data = {
-                    'combo': self.memory_reader.get_combo(),
-                    'accuracy': self.memory_reader.get_accuracy(),
-                    'hp': self.memory_reader.get_hp(),
-                    'misses': self.memory_reader.get_misses(),
-                    'max_combo': self.memory_reader.get_max_combo(),
-                    'connected': self.memory_reader.is_connected(),
-                    'state': game_state,
-                    'map_info': self.memory_reader.get_map_info()
-                }
-
-                # Only update UI if data has actually changed
-                if current_data != self.last_update_data:
-                    self._update_labels(current_data)
-                    self.last_update_data = current_data
+                start = time.perf_counter_ns()
+                self._update_labels(snapshot, dirty)
+                self._labels_timer.observe_ns(time.perf_counter_ns() - start)
 
             except Exception as e:
                 print(f"Error updating display: {e}")
                 self.debug_label.configure(text=f"Debug: Error - {str(e)[:50]}")
 
-        # Schedule next update
-        update_interval = 50 if game_state == "play" else 200  # 20 FPS or 5 FPS
-        self.root.after(update_interval, self.update_display)
+    @property
+    def analysis_windows(self):
+        """The analysis window manager, importing the plotting stack on first use"""
+        with self._analysis_lock:
+            if self._analysis_windows is None:
+                from analysis_window import AnalysisWindowManager
+                self._analysis_windows = AnalysisWindowManager()
+            return self._analysis_windows
+
+    def prewarm_analysis(self):
+        """Load the plotting stack and a pooled figure in the background"""
+        def prewarm():
+            try:
+                start = time.perf_counter()
+                import analysis_window
+                analysis_window.prewarm()
+                print(f"Analysis pre-warm queued after {(time.perf_counter() - start) * 1000:.0f}ms")
+            except Exception as e:
+                print(f"Error pre-warming analysis: {e}")
+
+        threading.Thread(target=prewarm, name="AnalysisPrewarm", daemon=True).start()
 
     def show_analysis_window(self, map_stats):
         """Show the analysis window for completed map"""
         try:
             def create_analysis():
                 try:
-                    AnalysisWindow(map_stats)
+                    self.analysis_windows.open(map_stats)
                     print(f"Analysis window created for: {map_stats.map_name}")
                 except Exception as e:
                     print(f"Error creating analysis window: {e}")
@@ -202,12 +343,23 @@ class Overlay:
     def on_closing(self):
         print("Overlay closing...")
         self.memory_reader.shutdown()
+        if self._analysis_windows is not None:
+            self._analysis_windows.close_all()
+        # Only loaded once something was plotted, closing shouldn't import matplotlib
+        figure_renderer = sys.modules.get("figure_renderer")
+        if figure_renderer is not None:
+            figure_renderer.stop_renderer()
         self.root.quit()
         self.root.destroy()
 
     def run(self):
         print("Starting overlay...")
+        with self._dirty_lock:
+            self._dirty.update(SNAPSHOT_FIELDS)
         self.update_display()
+        self.root.after(IDLE_POLL_MS, self._poll)
+        if config._config.prewarm_analysis:
+            self.root.after(PREWARM_DELAY_MS, self.prewarm_analysis)
         self.root.mainloop()
 
     def _format_map_info(self, map_info):
@@ -224,31 +376,106 @@ class Overlay:
 
         return f"{title} - {artist} [{difficulty}]"
 
-    def _update_labels(self, current_data):
-        """Update UI labels with current data"""
-        try:
-            self.combo_label.configure(text=f"Combo: {current_data['combo']}")
-            self.max_combo_label.configure(text=f"Max Combo: {current_data['max_combo']}")
-            self.acc_label.configure(text=f"Accuracy: {current_data['accuracy']:.2f}%")
-            self.miss_label.configure(text=f"Misses: {current_data['misses']}")
-            self.hp_label.configure(text=f"HP: {current_data['hp']:.2f}")
-            self.state_label.configure(text=f"State: {current_data['state']}")
-
-            if current_data['connected']:
-                self.status_label.configure(text="Status: Connected", text_color="green")
-                map_text = self._format_map_info(current_data['map_info'])
-                self.map_label.configure(text=map_text)
+    def _format_live_stats(self, live_stats):
+        """Format the running play analysis for display"""
+        if not live_stats:
+            return "Live: -"
+
+        return (
+            f"Live: Consistency {live_stats['consistency_score']:.1f} | "
+            f"Trend {live_stats['accuracy_trend']:+.3f} | "
+            f"Spikes {live_stats['difficulty_spikes']} | "
+            f"HP Drops {live_stats['hp_drops']}"
+        )
+
+    def _format_key_counts(self, key_counts):
+        if not key_counts:
+            return "Keys: -"
+        return "Keys: " + " | ".join(f"{name.upper()} {count}" for name, count in key_counts.items())
+
+    def _set_text(self, label, text, **kwargs):
+        """Configure a label only when its text actually changes"""
+        if self._label_text.get(label) == text:
+            return
+        self._label_text[label] = text
+        label.configure(text=text, **kwargs)
+
+    def _memory_summary(self):
+        """Process memory and analysis window counts, re-read at most once per interval"""
+        now = time.time()
+        if now - self._memory_time >= MEMORY_REFRESH_INTERVAL:
+            elapsed = now - self._memory_time
+            self._memory_time = now
+            rss = current_rss_mb()
+            if rss is not None:
+                rss_text = f"RSS {rss:.0f}MB"
             else:
-                self.status_label.configure(text="Status: Disconnected", text_color="red")
-                self.map_label.configure(text="No map selected")
-                self.analysis_button.configure(state="disabled")
+                peak = peak_rss_mb()
+                rss_text = f"peak RSS {peak:.0f}MB" if peak is not None else "RSS n/a"
+            windows = self._analysis_windows
+            window_text = windows.memory_summary() if windows is not None else "analysis not loaded"
+            self._memory_text = f"Memory: {rss_text}, {window_text}\n{self._metrics_summary(elapsed)}"
+        return self._memory_text
+
+    def _metrics_summary(self, elapsed):
+        """Frame rate, dropped frames and per-stage latencies since the last reading"""
+        general = self.memory_reader.get_stream_stats().get("general")
+        if general is None:
+            return "Metrics: no stream"
+        frames = general.messages - self._frames_seen
+        self._frames_seen = general.messages
+        rate = frames / elapsed if 0 < elapsed < 60 else 0.0
+
+        stages = (
+            ("decode", self.memory_reader.decoder.timer),
+            ("update", self.memory_reader.update_timer),
+            ("labels", self._labels_timer),
+        )
+        timings = ", ".join(f"{name} {timer.avg:.2f}/{timer.quantile(0.99):g}ms"
+                            for name, timer in stages if timer.count)
+        text = f"Metrics: {rate:.0f} fps, {general.dropped} dropped, {general.disconnects} reconnects"
+        return f"{text}\n{timings} (avg/p99)" if timings else text
+
+    def _update_labels(self, snapshot, dirty):
+        """Update the labels of the dirty fields from a published frame snapshot"""
+        try:
+            if "combo" in dirty:
+                self._set_text(self.combo_label, f"Combo: {snapshot.combo}")
+            if "max_combo" in dirty:
+                self._set_text(self.max_combo_label, f"Max Combo: {snapshot.max_combo}")
+            if "accuracy" in dirty:
+                self._set_text(self.acc_label, f"Accuracy: {snapshot.accuracy:.2f}%")
+            if "misses" in dirty:
+                self._set_text(self.miss_label, f"Misses: {snapshot.misses}")
+            if "hp" in dirty:
+                self._set_text(self.hp_label, f"HP: {snapshot.hp:.2f}")
+            if "game_state" in dirty:
+                self._set_text(self.state_label, f"State: {snapshot.game_state}")
+            if "live_stats" in dirty:
+                self._set_text(self.live_label, self._format_live_stats(snapshot.live_stats))
+            if "hit_errors" in dirty:
+                self._update_hit_errors(snapshot.hit_errors)
+            if "key_counts" in dirty:
+                self._set_text(self.keys_label, self._format_key_counts(snapshot.key_counts))
+
+            if "connected" in dirty or "map_info" in dirty:
+                if snapshot.connected:
+                    self._set_text(self.status_label, "Status: Connected", text_color="green")
+                    self._set_text(self.map_label, self._format_map_info(snapshot.map_info))
+                else:
+                    self._set_text(self.status_label, "Status: Disconnected", text_color="red")
+                    self._set_text(self.map_label, "No map selected")
+                    self.analysis_button.configure(state="disabled")
 
             # Update debug info
-            self.debug_label.configure(
-                text=f"Debug: Updates #{self.update_counter}, State: {current_data['state']}"
-            )
             self.update_counter += 1
+            if config._config.debug_mode:
+                self._set_text(
+                    self.debug_label,
+                    f"Debug: Updates #{self.update_counter}, "
+                    f"State: {snapshot.game_state}\n{self._memory_summary()}"
+                )
 
         except Exception as e:
             print(f"Error updating labels: {e}")
-            self.debug_label.configure(text=f"Debug: Label update error - {str(e)[:30]}")
\ No newline at end of file
+            self.debug_label.configure(text=f"Debug: Label update error - {str(e)[:30]}")
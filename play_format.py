@@ -0,0 +1,244 @@
+# play_format.py
+"""
+Compact binary file format for per-play stats.
+
+Layout (little endian):
+    prefix   magic b"OSPS", format version (u16), flags (u16),
+             header length (u32), data offset (u32)
+    header   UTF-8 JSON: {"summary": {MapStats fields except data_points},
+                          "samples": {"count": n, "columns": [...]}}
+    data     one block per sample column, 64-byte aligned, raw or zlib-compressed
+
+Uncompressed columns are memory-mapped on load, and the summary can be read
+without touching the sample data at all.
+
+Usage:
+    python play_format.py convert [stats_directory] [--remove]
+    python play_format.py summary <file>
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from dataclasses import fields
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import config
+import stats_tracker
+from sample_buffer import SAMPLE_COLUMNS, SampleView
+
+MAGIC = b"OSPS"
+FORMAT_VERSION = 1
+PLAY_EXTENSION = ".osps"
+PREFIX = struct.Struct("<4sHHII")
+ALIGNMENT = 64
+
+FLAG_COMPRESSED = 1
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _json_default(value):
+    # NumPy scalars that end up in the summary
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def map_stats_summary(map_stats) -> Dict[str, Any]:
+    """All MapStats fields except the samples"""
+    return {f.name: getattr(map_stats, f.name) for f in fields(map_stats) if f.name != "data_points"}
+
+
+def write_play(path: str, map_stats, compress: bool = True):
+    """Write a MapStats to path in the binary play format.
+
+    The file is written next to path and renamed over it, so a crash
+    mid-write never leaves a truncated play behind.
+    """
+    samples = map_stats.data_points
+    blocks = []
+    columns = []
+    offset = 0
+
+    for name, dtype in SAMPLE_COLUMNS:
+        data = np.ascontiguousarray(getattr(samples, name), dtype=dtype).tobytes()
+        if compress:
+            data = zlib.compress(data, 6)
+        columns.append({
+            "name": name,
+            "dtype": np.dtype(dtype).str,
+            "offset": offset,
+            "nbytes": len(data),
+            "compression": "zlib" if compress else "none",
+        })
+        blocks.append((offset, data))
+        offset = _align(offset + len(data))
+
+    header = json.dumps({
+        "summary": map_stats_summary(map_stats),
+        "samples": {"count": len(samples), "columns": columns},
+    }, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+    data_start = _align(PREFIX.size + len(header))
+    flags = FLAG_COMPRESSED if compress else 0
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, flags, len(header), data_start))
+            f.write(header)
+            for block_offset, data in blocks:
+                f.seek(data_start + block_offset)
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _read_header(f) -> Tuple[Dict[str, Any], int]:
+    prefix = f.read(PREFIX.size)
+    if len(prefix) < PREFIX.size:
+        raise ValueError("File too short for a play stats file")
+    magic, version, _flags, header_len, data_start = PREFIX.unpack(prefix)
+    if magic != MAGIC:
+        raise ValueError("Not a play stats file")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported play stats format version {version}")
+    return json.loads(f.read(header_len).decode("utf-8")), data_start
+
+
+def read_summary(path: str) -> Dict[str, Any]:
+    """Read only the summary fields of a play file"""
+    with open(path, "rb") as f:
+        header, _ = _read_header(f)
+    return header["summary"]
+
+
+def read_samples(path: str, use_mmap: bool = True) -> SampleView:
+    """Read the sample columns; uncompressed columns are memory-mapped"""
+    with open(path, "rb") as f:
+        header, data_start = _read_header(f)
+        samples = header["samples"]
+        count = samples["count"]
+        if count == 0:
+            return SampleView.empty()
+
+        mapped: Optional[mmap.mmap] = None
+        columns = {}
+        for column in samples["columns"]:
+            dtype = np.dtype(column["dtype"])
+            start = data_start + column["offset"]
+
+            if column["compression"] == "zlib":
+                f.seek(start)
+                raw = zlib.decompress(f.read(column["nbytes"]))
+                columns[column["name"]] = np.frombuffer(raw, dtype=dtype, count=count)
+            elif use_mmap:
+                if mapped is None:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                columns[column["name"]] = np.frombuffer(mapped, dtype=dtype, count=count, offset=start)
+            else:
+                f.seek(start)
+                columns[column["name"]] = np.frombuffer(f.read(column["nbytes"]), dtype=dtype, count=count)
+
+    # Columns added after a file was written read back as zeros
+    for name, dtype in SAMPLE_COLUMNS:
+        if name not in columns:
+            columns[name] = np.zeros(count, dtype=dtype)
+    return SampleView(columns)
+
+
+def _map_stats_from(summary: Dict[str, Any], samples: SampleView):
+    known = {f.name for f in fields(stats_tracker.MapStats)}
+    values = {key: value for key, value in summary.items() if key in known and key != "data_points"}
+    return stats_tracker.MapStats(data_points=samples, **values)
+
+
+def read_play(path: str, use_mmap: bool = True):
+    """Load a full MapStats from a binary play file"""
+    return _map_stats_from(read_summary(path), read_samples(path, use_mmap))
+
+
+def load_json_play(path: str):
+    """Load a MapStats from a legacy JSON stats file"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    samples = SampleView.from_records(data.pop("data_points", None) or [])
+    return _map_stats_from(data, samples)
+
+
+def load_play(path: str, use_mmap: bool = True):
+    """Load a MapStats from either file format"""
+    if path.endswith(".json"):
+        return load_json_play(path)
+    return read_play(path, use_mmap)
+
+
+def convert_json_file(path: str, compress: bool = True, remove: bool = False) -> str:
+    """Convert a legacy JSON stats file, returning the new file's path"""
+    map_stats = load_json_play(path)
+    new_path = os.path.splitext(path)[0] + PLAY_EXTENSION
+    write_play(new_path, map_stats, compress)
+    if remove:
+        os.remove(path)
+    return new_path
+
+
+def convert_directory(stats_dir: str, compress: bool = True, remove: bool = False) -> int:
+    """Convert every stats_*.json file in stats_dir, returning how many were converted"""
+    converted = 0
+    for name in sorted(os.listdir(stats_dir)):
+        if not (name.startswith("stats_") and name.endswith(".json")):
+            continue
+        path = os.path.join(stats_dir, name)
+        try:
+            new_path = convert_json_file(path, compress, remove)
+            converted += 1
+            print(f"Converted {path} -> {new_path}")
+        except Exception as e:
+            print(f"Error converting {path}: {e}")
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play stats file tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="convert legacy JSON stats files")
+    convert_parser.add_argument("directory", nargs="?", default=None,
+                                help="stats directory (default: stats_directory from config)")
+    convert_parser.add_argument("--remove", action="store_true", help="delete JSON files after converting")
+    convert_parser.add_argument("--no-compress", action="store_true", help="store sample columns uncompressed")
+
+    summary_parser = subparsers.add_parser("summary", help="print the summary of a play file")
+    summary_parser.add_argument("file")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        stats_dir = args.directory or config._config.stats_directory
+        if not os.path.isdir(stats_dir):
+            print(f"No stats directory at {stats_dir}")
+            sys.exit(1)
+        count = convert_directory(stats_dir, not args.no_compress, args.remove)
+        print(f"Converted {count} file(s)")
+    elif args.command == "summary":
+        if args.file.endswith(".json"):
+            summary = map_stats_summary(load_json_play(args.file))
+        else:
+            summary = read_summary(args.file)
+        print(json.dumps(summary, indent=2, ensure_ascii=False, default=_json_default))
+
+
+if __name__ == "__main__":
+    main()
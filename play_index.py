@@ -0,0 +1,548 @@
+# play_index.py
+"""
+SQLite index of play summaries in stats_directory.
+
+StatsTracker adds every saved play, so cross-play queries ("all plays of
+this difficulty", "last 100 plays") never need to list or parse the stats
+files themselves.
+
+Per beatmap + difficulty + mods aggregates (play count, bests, rolling
+means) are kept up to date in the same transaction as the plays and cached
+in memory, so "is this a personal best" is a dict lookup.
+
+Usage:
+    python play_index.py backfill [stats_directory]
+    python play_index.py query [--beatmap "Artist - Title"] [--difficulty D] [--mods HD] [--days N] [--limit N]
+    python play_index.py bests [--beatmap "Artist - Title"]
+    python play_index.py rebuild
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, fields, replace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import config
+import play_format
+
+INDEX_FILENAME = "index.sqlite3"
+SCHEMA_VERSION = 1
+AGGREGATE_ALPHA = 0.3  # Weight of the newest play in the rolling means
+
+
+@dataclass(slots=True)
+class PlaySummary:
+    """Indexed summary of a saved play; has the MapStats summary attribute names"""
+    path: str
+    beatmap: str
+    map_name: str
+    artist: str
+    difficulty: str
+    mods: str
+    start_time: float
+    play_duration: float
+    final_accuracy: float
+    avg_accuracy: float
+    max_combo: int
+    total_misses: int
+    combo_breaks: int
+    hp_drops: int
+    consistency_score: float
+    accuracy_trend: float
+    stamina_score: float
+    difficulty_spikes: int
+
+
+SUMMARY_COLUMNS = tuple(f.name for f in fields(PlaySummary))
+
+
+@dataclass(slots=True)
+class BeatmapAggregate:
+    """Running totals of every indexed play of one beatmap difficulty with one mod combination"""
+    beatmap: str
+    difficulty: str
+    mods: str
+    play_count: int = 0
+    best_accuracy: float = 0.0
+    best_accuracy_time: float = 0.0  # start_time of the best play
+    previous_best_accuracy: float = 0.0  # The best before best_accuracy was set
+    best_combo: int = 0
+    fewest_misses: int = 0
+    accuracy_mean: float = 0.0  # Exponential moving average, AGGREGATE_ALPHA per play
+    consistency_mean: float = 0.0
+    consistency_trend: float = 0.0  # Moving average of the change in consistency per play
+    first_played: float = 0.0
+    last_played: float = 0.0
+
+    def add(self, final_accuracy: float, max_combo: int, total_misses: int,
+            consistency_score: float, start_time: float):
+        """Fold in a play newer than every play seen so far"""
+        if not self.play_count:
+            self.best_accuracy = final_accuracy
+            self.best_accuracy_time = start_time
+            self.best_combo = max_combo
+            self.fewest_misses = total_misses
+            self.accuracy_mean = final_accuracy
+            self.consistency_mean = consistency_score
+            self.first_played = start_time
+        else:
+            if final_accuracy > self.best_accuracy:
+                self.previous_best_accuracy = self.best_accuracy
+                self.best_accuracy = final_accuracy
+                self.best_accuracy_time = start_time
+            self.best_combo = max(self.best_combo, max_combo)
+            self.fewest_misses = min(self.fewest_misses, total_misses)
+            self.accuracy_mean += AGGREGATE_ALPHA * (final_accuracy - self.accuracy_mean)
+            change = consistency_score - self.consistency_mean
+            self.consistency_mean += AGGREGATE_ALPHA * change
+            self.consistency_trend += AGGREGATE_ALPHA * (change - self.consistency_trend)
+        self.play_count += 1
+        self.last_played = start_time
+
+
+AGGREGATE_COLUMNS = tuple(f.name for f in fields(BeatmapAggregate))
+_AGGREGATE_INPUTS = ("final_accuracy", "max_combo", "total_misses", "consistency_score", "start_time")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    beatmap TEXT NOT NULL,
+    map_name TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    mods TEXT NOT NULL DEFAULT '',
+    start_time REAL NOT NULL,
+    play_duration REAL NOT NULL DEFAULT 0,
+    final_accuracy REAL NOT NULL DEFAULT 0,
+    avg_accuracy REAL NOT NULL DEFAULT 0,
+    max_combo INTEGER NOT NULL DEFAULT 0,
+    total_misses INTEGER NOT NULL DEFAULT 0,
+    combo_breaks INTEGER NOT NULL DEFAULT 0,
+    hp_drops INTEGER NOT NULL DEFAULT 0,
+    consistency_score REAL NOT NULL DEFAULT 0,
+    accuracy_trend REAL NOT NULL DEFAULT 0,
+    stamina_score REAL NOT NULL DEFAULT 0,
+    difficulty_spikes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_plays_map ON plays (beatmap, difficulty, mods, start_time);
+CREATE INDEX IF NOT EXISTS idx_plays_time ON plays (start_time);
+CREATE TABLE IF NOT EXISTS beatmap_aggregates (
+    beatmap TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    mods TEXT NOT NULL,
+    play_count INTEGER NOT NULL,
+    best_accuracy REAL NOT NULL,
+    best_accuracy_time REAL NOT NULL,
+    previous_best_accuracy REAL NOT NULL,
+    best_combo INTEGER NOT NULL,
+    fewest_misses INTEGER NOT NULL,
+    accuracy_mean REAL NOT NULL,
+    consistency_mean REAL NOT NULL,
+    consistency_trend REAL NOT NULL,
+    first_played REAL NOT NULL,
+    last_played REAL NOT NULL,
+    PRIMARY KEY (beatmap, difficulty, mods)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+"""
+
+
+def beatmap_key(artist: str, map_name: str) -> str:
+    return f"{artist} - {map_name}"
+
+
+def aggregate_key(map_stats) -> Tuple[str, str, str]:
+    """(beatmap, difficulty, mods) of a MapStats or PlaySummary, normalized like index rows"""
+    return (beatmap_key(map_stats.artist or "Unknown", map_stats.map_name or "Unknown"),
+            map_stats.difficulty or "Unknown", getattr(map_stats, "mods", "") or "")
+
+
+def default_index_path() -> str:
+    return os.path.join(config._config.stats_directory, INDEX_FILENAME)
+
+
+def summary_row(path: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Index row for a play summary dict (see play_format.map_stats_summary)"""
+    row = {name: summary.get(name) for name in SUMMARY_COLUMNS}
+    row["path"] = os.path.abspath(path)
+    row["map_name"] = summary.get("map_name") or "Unknown"
+    row["artist"] = summary.get("artist") or "Unknown"
+    row["difficulty"] = summary.get("difficulty") or "Unknown"
+    row["mods"] = summary.get("mods") or ""
+    row["beatmap"] = beatmap_key(row["artist"], row["map_name"])
+    return {key: (0 if value is None else value) for key, value in row.items()}
+
+
+def is_play_file(name: str) -> bool:
+    return name.startswith("stats_") and (name.endswith(play_format.PLAY_EXTENSION) or name.endswith(".json"))
+
+
+def list_play_files(stats_dir: str) -> List[str]:
+    """Play files in stats_dir, preferring the binary file when a JSON twin exists"""
+    names = set(os.listdir(stats_dir))
+    paths = []
+    for name in sorted(names):
+        if not is_play_file(name):
+            continue
+        stem, ext = os.path.splitext(name)
+        if ext == ".json" and stem + play_format.PLAY_EXTENSION in names:
+            continue
+        paths.append(os.path.join(stats_dir, name))
+    return paths
+
+
+def read_play_summary(path: str) -> Dict[str, Any]:
+    """Summary dict of a play file of either format"""
+    if path.endswith(".json"):
+        return play_format.map_stats_summary(play_format.load_json_play(path))
+    return play_format.read_summary(path)
+
+
+def _chunks(items: List[str], size: int = 500):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _marks(chunk) -> str:
+    return ", ".join("?" for _ in chunk)
+
+
+class PlayIndex:
+    """Thread-safe handle on the play summary index"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or default_index_path()
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._aggregates: Optional[Dict[Tuple[str, str, str], BeatmapAggregate]] = None
+        self._aggregates_version = None
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                self._conn.executescript(_SCHEMA)
+                self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add_play(self, path: str, map_stats):
+        """Index a saved play (replaces any existing entry for the same file)"""
+        self.add_summaries([(path, play_format.map_stats_summary(map_stats))])
+
+    def add_summaries(self, items):
+        """Index (path, summary dict) pairs in one transaction"""
+        rows = [summary_row(path, summary) for path, summary in items]
+        if not rows:
+            return
+        columns = ", ".join(SUMMARY_COLUMNS)
+        placeholders = ", ".join(f":{name}" for name in SUMMARY_COLUMNS)
+        with self._lock:
+            try:
+                with self._conn:
+                    replaced = self._existing_paths([row["path"] for row in rows])
+                    self._conn.executemany(
+                        f"INSERT OR REPLACE INTO plays ({columns}) VALUES ({placeholders})", rows
+                    )
+                    self._update_aggregates(rows, replaced)
+                    self._bump_revision()
+            except Exception:
+                self._aggregates = None  # May be ahead of the rolled back transaction
+                raise
+
+    def remove_paths(self, paths):
+        paths = [os.path.abspath(p) for p in paths]
+        with self._lock:
+            try:
+                with self._conn:
+                    keys = set()
+                    for chunk in _chunks(paths):
+                        keys.update(tuple(row) for row in self._conn.execute(
+                            f"SELECT beatmap, difficulty, mods FROM plays WHERE path IN ({_marks(chunk)})", chunk
+                        ))
+                    self._conn.executemany("DELETE FROM plays WHERE path = ?", [(p,) for p in paths])
+                    self._recompute_aggregates(keys)
+                    self._bump_revision()
+            except Exception:
+                self._aggregates = None
+                raise
+
+    def aggregate(self, beatmap: str, difficulty: str, mods: str = "") -> Optional[BeatmapAggregate]:
+        """Aggregate of one beatmap difficulty and mod combination, from memory"""
+        with self._lock:
+            aggregate = self._cached_aggregates().get((beatmap, difficulty, mods))
+            return replace(aggregate) if aggregate is not None else None
+
+    def aggregate_for(self, map_stats) -> Optional[BeatmapAggregate]:
+        """Aggregate of the difficulty and mods a MapStats or PlaySummary was played with"""
+        return self.aggregate(*aggregate_key(map_stats))
+
+    def aggregates(self, beatmap: Optional[str] = None) -> List[BeatmapAggregate]:
+        """All aggregates (of one beatmap), most recently played first"""
+        with self._lock:
+            items = [replace(agg) for agg in self._cached_aggregates().values()
+                     if beatmap is None or agg.beatmap == beatmap]
+        return sorted(items, key=lambda agg: -agg.last_played)
+
+    def rebuild_aggregates(self):
+        """Recompute every aggregate from the indexed plays"""
+        with self._lock:
+            try:
+                with self._conn:
+                    self._rebuild_aggregates()
+                    self._bump_revision()
+            except Exception:
+                self._aggregates = None
+                raise
+
+    def _cached_aggregates(self) -> Dict[Tuple[str, str, str], BeatmapAggregate]:
+        # data_version changes when another connection (another process) commits
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._aggregates is None or version != self._aggregates_version:
+            rows = self._conn.execute(f"SELECT {', '.join(AGGREGATE_COLUMNS)} FROM beatmap_aggregates")
+            self._aggregates = {tuple(row[:3]): BeatmapAggregate(*row) for row in rows}
+            self._aggregates_version = version
+        return self._aggregates
+
+    def _bump_revision(self):
+        # Row ids are reused after deletes, so count changes instead; called inside the write transaction
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+    def _existing_paths(self, paths: List[str]) -> set:
+        existing = set()
+        for chunk in _chunks(paths):
+            existing.update(row[0] for row in self._conn.execute(
+                f"SELECT path FROM plays WHERE path IN ({_marks(chunk)})", chunk
+            ))
+        return existing
+
+    def _update_aggregates(self, rows: List[Dict[str, Any]], replaced: set):
+        """Fold new plays into their aggregates; called inside the insert transaction"""
+        aggregates = self._cached_aggregates()
+        changed = {}
+        recompute = set()
+        for row in sorted(rows, key=lambda r: r["start_time"]):
+            key = (row["beatmap"], row["difficulty"], row["mods"])
+            if key in recompute:
+                continue
+            aggregate = aggregates.get(key)
+            if row["path"] in replaced or (aggregate is not None and row["start_time"] < aggregate.last_played):
+                # Replaced or older than what was folded in, the rolling means need the whole history
+                recompute.add(key)
+                changed.pop(key, None)
+                continue
+            if aggregate is None:
+                aggregate = aggregates[key] = BeatmapAggregate(*key)
+            aggregate.add(*(row[name] for name in _AGGREGATE_INPUTS))
+            changed[key] = aggregate
+
+        self._write_aggregates(changed.values())
+        self._recompute_aggregates(recompute)
+
+    def _recompute_aggregates(self, keys: Iterable[Tuple[str, str, str]]):
+        aggregates = self._cached_aggregates()
+        updated = []
+        for key in keys:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_AGGREGATE_INPUTS)} FROM plays "
+                "WHERE beatmap = ? AND difficulty = ? AND mods = ? ORDER BY start_time", key
+            ).fetchall()
+            if not rows:
+                self._conn.execute(
+                    "DELETE FROM beatmap_aggregates WHERE beatmap = ? AND difficulty = ? AND mods = ?", key
+                )
+                aggregates.pop(key, None)
+                continue
+            aggregate = aggregates[key] = BeatmapAggregate(*key)
+            for row in rows:
+                aggregate.add(*row)
+            updated.append(aggregate)
+        self._write_aggregates(updated)
+
+    def _rebuild_aggregates(self):
+        rebuilt: Dict[Tuple[str, str, str], BeatmapAggregate] = {}
+        rows = self._conn.execute(
+            f"SELECT beatmap, difficulty, mods, {', '.join(_AGGREGATE_INPUTS)} FROM plays ORDER BY start_time"
+        )
+        for row in rows:
+            key = tuple(row[:3])
+            aggregate = rebuilt.get(key)
+            if aggregate is None:
+                aggregate = rebuilt[key] = BeatmapAggregate(*key)
+            aggregate.add(*row[3:])
+        self._conn.execute("DELETE FROM beatmap_aggregates")
+        self._write_aggregates(rebuilt.values())
+        self._aggregates = rebuilt
+        self._aggregates_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _write_aggregates(self, aggregates: Iterable[BeatmapAggregate]):
+        placeholders = ", ".join("?" for _ in AGGREGATE_COLUMNS)
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO beatmap_aggregates ({', '.join(AGGREGATE_COLUMNS)}) VALUES ({placeholders})",
+            [tuple(getattr(agg, name) for name in AGGREGATE_COLUMNS) for agg in aggregates]
+        )
+
+    def indexed_paths(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT path FROM plays")}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0]
+
+    def _where(self, beatmap=None, difficulty=None, mods=None, since=None, until=None):
+        clauses = []
+        params = []
+        for column, value in (("beatmap", beatmap), ("difficulty", difficulty), ("mods", mods)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("start_time >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("start_time < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, beatmap: Optional[str] = None, difficulty: Optional[str] = None,
+              mods: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              limit: Optional[int] = None, newest_first: bool = True) -> List[PlaySummary]:
+        """Plays matching all given filters; since/until are Unix timestamps"""
+        rows = self.rows(SUMMARY_COLUMNS, beatmap, difficulty, mods, since, until, limit, newest_first)
+        return [PlaySummary(*row) for row in rows]
+
+    def rows(self, columns: Sequence[str], beatmap: Optional[str] = None, difficulty: Optional[str] = None,
+             mods: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+             limit: Optional[int] = None, newest_first: bool = True) -> List[sqlite3.Row]:
+        """Only the given summary columns of the matching plays"""
+        unknown = set(columns) - set(SUMMARY_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        where, params = self._where(beatmap, difficulty, mods, since, until)
+        sql = f"SELECT {', '.join(columns)} FROM plays{where} ORDER BY start_time {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def revision(self) -> int:
+        """Increases whenever a play is added, replaced or removed, or the aggregates are rebuilt"""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def backfill(self, stats_dir: Optional[str] = None, prune: bool = True) -> int:
+        """Index play files that are not in the index yet, returning how many were added"""
+        stats_dir = stats_dir or config._config.stats_directory
+        if not os.path.isdir(stats_dir):
+            return 0
+
+        paths = list_play_files(stats_dir)
+        indexed = self.indexed_paths()
+        pending = [p for p in paths if os.path.abspath(p) not in indexed]
+
+        added = 0
+        batch = []
+        for path in pending:
+            try:
+                batch.append((path, read_play_summary(path)))
+            except Exception as e:
+                print(f"Error reading {path}: {e}")
+                continue
+            if len(batch) >= 500:
+                self.add_summaries(batch)
+                added += len(batch)
+                batch = []
+        self.add_summaries(batch)
+        added += len(batch)
+
+        if prune:
+            existing = {os.path.abspath(p) for p in paths}
+            stale = [p for p in indexed if p not in existing and p.startswith(os.path.abspath(stats_dir))]
+            if stale:
+                self.remove_paths(stale)
+                print(f"Removed {len(stale)} missing file(s) from the index")
+
+        return added
+
+
+_shared_index: Optional[PlayIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_play_index() -> PlayIndex:
+    """The index in stats_directory, shared by the tracker and the analysis windows"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = PlayIndex()
+        return _shared_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play history index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill_parser = subparsers.add_parser("backfill", help="index existing play files")
+    backfill_parser.add_argument("directory", nargs="?", default=None,
+                                 help="stats directory (default: stats_directory from config)")
+
+    query_parser = subparsers.add_parser("query", help="list indexed plays")
+    query_parser.add_argument("--beatmap", help='exact "Artist - Title"')
+    query_parser.add_argument("--difficulty")
+    query_parser.add_argument("--mods")
+    query_parser.add_argument("--days", type=float, help="only plays from the last N days")
+    query_parser.add_argument("--limit", type=int, default=100)
+
+    bests_parser = subparsers.add_parser("bests", help="personal bests per difficulty and mods")
+    bests_parser.add_argument("--beatmap", help='exact "Artist - Title"')
+
+    subparsers.add_parser("rebuild", help="recompute the aggregates from the indexed plays")
+
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        stats_dir = args.directory or config._config.stats_directory
+        index = PlayIndex(os.path.join(stats_dir, INDEX_FILENAME))
+        start = time.perf_counter()
+        added = index.backfill(stats_dir)
+        print(f"Indexed {added} new play(s) in {time.perf_counter() - start:.2f}s, {index.count()} total")
+    elif args.command == "query":
+        index = PlayIndex()
+        since = time.time() - args.days * 86400 if args.days else None
+        start = time.perf_counter()
+        plays = index.query(args.beatmap, args.difficulty, args.mods, since=since, limit=args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        for play in plays:
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(play.start_time))}  "
+                  f"{play.final_accuracy:6.2f}%  {play.max_combo:5d}x  "
+                  f"{play.beatmap} [{play.difficulty}] {play.mods}")
+        print(f"{len(plays)} play(s) in {elapsed:.1f}ms")
+    elif args.command == "bests":
+        index = PlayIndex()
+        for agg in index.aggregates(args.beatmap):
+            print(f"{agg.best_accuracy:6.2f}%  {agg.best_combo:5d}x  {agg.play_count:4d} plays  "
+                  f"avg {agg.accuracy_mean:6.2f}%  {agg.beatmap} [{agg.difficulty}] {agg.mods}")
+    elif args.command == "rebuild":
+        index = PlayIndex()
+        start = time.perf_counter()
+        index.rebuild_aggregates()
+        print(f"Rebuilt {len(index.aggregates())} aggregate(s) in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
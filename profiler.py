@@ -0,0 +1,256 @@
+# profiler.py
+"""
+Session profiler, enabled by debug_mode.
+
+A daemon thread samples the stacks of the other threads (the Tk main thread,
+the MemoryReader ingest loop, the figure renderer...) from
+sys._current_frames(). Allocations are sampled around the hot paths:
+MemoryReader.update_data, StatsTracker.add_data_point and AnalysisWindow
+construction run with tracemalloc on for one call every
+ALLOCATION_SAMPLE_INTERVAL, and the memory they retain is attributed to the
+lines that allocated it. Tracing the whole process instead makes every
+snapshot take seconds once matplotlib is loaded.
+
+Reports are written to <stats_directory>/profiles/session_<time>/ every
+REPORT_INTERVAL seconds and on stop:
+
+    stacks.collapsed  one "thread;outer;...;inner count" line per stack,
+                      for flamegraph.pl, speedscope or inferno
+    functions.txt     top functions by self and total samples per thread
+    allocations.txt   per-region retained/peak memory and top allocation sites
+"""
+
+import functools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+import config
+
+REPORT_INTERVAL = 60.0  # Seconds between report rewrites
+MAX_STACK_DEPTH = 64
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 20
+ALLOCATION_SAMPLE_INTERVAL = 1.0  # Seconds between traced calls of a hot path
+TRACEMALLOC_FRAMES = 4
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RegionAllocations:
+    """What the traced calls of one hot path allocated and kept"""
+    __slots__ = ("calls", "retained", "peak", "sites")
+
+    def __init__(self):
+        self.calls = 0
+        self.retained = 0  # Bytes still allocated when the calls returned
+        self.peak = 0  # Largest traced memory seen during one call
+        self.sites: Counter = Counter()  # (file, line) -> retained bytes
+
+    def add(self, snapshot: tracemalloc.Snapshot, peak: int):
+        self.calls += 1
+        self.peak = max(self.peak, peak)
+        for stat in snapshot.statistics("lineno"):
+            frame = stat.traceback[0]
+            self.sites[(frame.filename, frame.lineno)] += stat.size
+            self.retained += stat.size
+
+
+class SessionProfiler:
+    """Stack sampling and allocation tracking for one run of the tracker"""
+
+    def __init__(self, directory: str, interval_ms: float = 10, allocations: bool = True):
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self.allocations = allocations
+        self.stacks: Counter = Counter()  # (thread name, frames outermost first) -> samples
+        self.samples = 0
+        self.started = 0.0
+        self.regions: Dict[str, RegionAllocations] = {}
+        self._patched: List[Tuple[type, str, Callable]] = []
+        self._next_trace: Dict[str, float] = {}
+        self._trace_lock = threading.Lock()  # tracemalloc is global, one traced call at a time
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.started = time.time()
+        if self.allocations:
+            if tracemalloc.is_tracing():
+                # Someone traces the whole process (python -X tracemalloc), leave it alone
+                print("⚠️ tracemalloc already running, allocation sampling disabled")
+                self.allocations = False
+            else:
+                from memory_reader import MemoryReader
+                from stats_tracker import StatsTracker
+                self.trace_allocations(MemoryReader, "update_data", ALLOCATION_SAMPLE_INTERVAL)
+                self.trace_allocations(StatsTracker, "add_data_point", ALLOCATION_SAMPLE_INTERVAL)
+        self._thread = threading.Thread(target=self._run, name="Profiler", daemon=True)
+        self._thread.start()
+        print(f"Profiling to {self.directory}")
+
+    def stop(self):
+        """Stop sampling, restore the traced methods and write the final reports"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched.clear()
+        self.write_reports()
+        print(f"Profile written to {self.directory}")
+
+    def trace_allocations(self, cls: type, name: str, interval: float = 0.0):
+        """Trace the allocations of cls.name, at most once per interval seconds"""
+        original = getattr(cls, name)
+        region = f"{cls.__name__}.{name}"
+        self.regions[region] = RegionAllocations()
+        self._next_trace[region] = 0.0
+
+        @functools.wraps(original)
+        def traced(*args, **kwargs):
+            now = time.monotonic()
+            if now < self._next_trace[region] or not self._trace_lock.acquire(blocking=False):
+                return original(*args, **kwargs)
+            self._next_trace[region] = now + interval
+            try:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    # Only what was allocated during the call and is still alive
+                    snapshot = tracemalloc.take_snapshot()
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    with self._lock:
+                        self.regions[region].add(snapshot, peak)
+            finally:
+                self._trace_lock.release()
+
+        setattr(cls, name, traced)
+        self._patched.append((cls, name, original))
+
+    def _run(self):
+        next_report = time.monotonic() + REPORT_INTERVAL
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample()
+                # The analysis window module is only imported with the first analysis
+                if self.allocations and "AnalysisWindow.__init__" not in self.regions:
+                    module = sys.modules.get("analysis_window")
+                    if module is not None and hasattr(module, "AnalysisWindow"):
+                        self.trace_allocations(module.AnalysisWindow, "__init__")
+                if time.monotonic() >= next_report:
+                    next_report = time.monotonic() + REPORT_INTERVAL
+                    self.write_reports()
+            except Exception as e:
+                print(f"⚠️ Profiler error: {e}")
+
+    def sample(self):
+        """Record the current stack of every other thread"""
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        with self._lock:
+            self.samples += 1
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[(names.get(ident, str(ident)), tuple(stack))] += 1
+
+    def write_reports(self):
+        with self._lock:
+            stacks = dict(self.stacks)
+            samples = self.samples
+            regions = {name: (region.calls, region.retained, region.peak, region.sites.most_common(TOP_ALLOCATIONS))
+                       for name, region in self.regions.items()}
+        try:
+            self._write_collapsed(stacks)
+            self._write_functions(stacks, samples)
+            if self.allocations:
+                self._write_allocations(regions)
+        except OSError as e:
+            print(f"⚠️ Could not write profile: {e}")
+
+    def _write_collapsed(self, stacks: Dict[Tuple[str, tuple], int]):
+        lines = []
+        for (thread_name, stack), count in sorted(stacks.items(), key=lambda item: -item[1]):
+            # Semicolons separate frames in the collapsed format
+            frames = [thread_name] + [frame.replace(";", ":") for frame in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+        self._write("stacks.collapsed", "\n".join(lines) + "\n")
+
+    def _write_functions(self, stacks: Dict[Tuple[str, tuple], int], samples: int):
+        self_counts: Dict[str, Counter] = {}
+        total_counts: Dict[str, Counter] = {}
+        for (thread_name, stack), count in stacks.items():
+            if not stack:
+                continue
+            self_counts.setdefault(thread_name, Counter())[stack[-1]] += count
+            totals = total_counts.setdefault(thread_name, Counter())
+            for frame in set(stack):  # Recursion counts once per sample
+                totals[frame] += count
+
+        duration = time.time() - self.started
+        lines = [f"Session profile: {samples} samples over {duration:.0f}s "
+                 f"({self.interval * 1000:g}ms interval)", ""]
+        for thread_name in sorted(total_counts):
+            lines.append(f"== {thread_name} ==")
+            lines.append(f"{'self%':>7} {'total%':>7}  function")
+            for frame, total in total_counts[thread_name].most_common(TOP_FUNCTIONS):
+                own = self_counts[thread_name][frame]
+                lines.append(f"{own / samples * 100:7.1f} {total / samples * 100:7.1f}  {frame}")
+            lines.append("")
+        self._write("functions.txt", "\n".join(lines))
+
+    def _write_allocations(self, regions):
+        lines = ["Allocations retained by sampled calls; other threads allocating during",
+                 "a traced call are counted too.", ""]
+        for name, (calls, retained, peak, sites) in regions.items():
+            lines.append(f"== {name} ==")
+            if not calls:
+                lines.append("not called yet")
+                lines.append("")
+                continue
+            lines.append(f"{calls} traced calls, {retained / calls / 1024:.1f}KB retained per call, "
+                         f"peak {peak / 1024:.1f}KB")
+            for (filename, lineno), size in sites:
+                lines.append(f"{size / calls / 1024:10.2f}KB/call  {filename}:{lineno}")
+            lines.append("")
+        self._write("allocations.txt", "\n".join(lines))
+
+    def _write(self, name: str, text: str):
+        # Write then rename, so a report is never seen half-written
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+
+def start_session_profiler() -> Optional[SessionProfiler]:
+    """Start profiling this session when debug_mode is on"""
+    cfg = config._config
+    if not cfg.debug_mode:
+        return None
+    directory = os.path.join(cfg.stats_directory, "profiles", time.strftime("session_%Y%m%d_%H%M%S"))
+    try:
+        profiler = SessionProfiler(directory, cfg.profile_interval, cfg.profile_allocations)
+        profiler.start()
+    except Exception as e:
+        print(f"⚠️ Could not start profiler: {e}")
+        return None
+    return profiler
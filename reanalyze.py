@@ -0,0 +1,163 @@
+# reanalyze.py
+"""
+Parallel re-analysis of saved plays.
+
+Recomputes the derived stats of every play in stats_directory whose
+analysis_version is older than analysis_engine.ANALYSIS_VERSION, using a
+process pool so an archive takes about 1/N of the time on N cores. Plays
+are handed to workers in chunks; each rewritten file is written to a
+temporary file and moved into place, and the index is updated once per
+chunk. An interrupted run is resumed by running it again: plays already
+stamped with the current version are skipped.
+
+Only the stored samples are available here, which may have been decimated
+during long plays, so re-analysed plays are stamped with
+analysis_source "samples" instead of the "live" values seen during play.
+
+Legacy JSON plays are written out as binary play files next to the original.
+
+Usage:
+    python reanalyze.py [stats_directory] [--workers N] [--chunk-size N] [--force]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Optional, Tuple
+import config
+import analysis_engine
+import play_format
+from play_index import INDEX_FILENAME, PlayIndex, list_play_files, read_play_summary
+from stats_tracker import calculate_advanced_stats
+
+CHUNK_SIZE = 16  # Plays per worker task
+
+# Worker results
+STATUS_UPDATED = "updated"
+STATUS_CURRENT = "current"
+STATUS_EMPTY = "empty"
+STATUS_ERROR = "error"
+
+
+def reanalyze_file(path: str, compress: bool = True,
+                   force: bool = False) -> Tuple[str, str, str, Optional[dict]]:
+    """Re-analyse one play file, returning (path, path written, status, summary or error)"""
+    try:
+        if not force and read_play_summary(path).get("analysis_version", 0) >= analysis_engine.ANALYSIS_VERSION:
+            return path, path, STATUS_CURRENT, None
+
+        # Read into memory rather than mmap, the file is replaced below (Windows can't replace a mapped file)
+        map_stats = play_format.load_play(path, use_mmap=False)
+        if not map_stats.data_points:
+            return path, path, STATUS_EMPTY, None
+
+        calculate_advanced_stats(map_stats)
+        new_path = path
+        if path.endswith(".json"):
+            new_path = os.path.splitext(path)[0] + play_format.PLAY_EXTENSION
+        play_format.write_play(new_path, map_stats, compress)  # Replaces the file atomically
+        return path, new_path, STATUS_UPDATED, play_format.map_stats_summary(map_stats)
+    except Exception as e:
+        return path, path, STATUS_ERROR, {"error": str(e)}
+
+
+def reanalyze_chunk(paths: List[str], compress: bool = True, force: bool = False):
+    """Worker task: a chunk of plays"""
+    return [reanalyze_file(path, compress, force) for path in paths]
+
+
+def _format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def reanalyze_directory(stats_dir: str, workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE,
+                        force: bool = False, update_index: bool = True) -> dict:
+    """Re-analyse every stale play in stats_dir, returning counts per status"""
+    paths = list_play_files(stats_dir)
+    counts = {STATUS_UPDATED: 0, STATUS_CURRENT: 0, STATUS_EMPTY: 0, STATUS_ERROR: 0}
+    if not paths:
+        return counts
+
+    workers = workers or os.cpu_count() or 1
+    compress = config._config.compress_stats
+    index = PlayIndex(os.path.join(stats_dir, INDEX_FILENAME)) if update_index else None
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    print(f"Checking {len(paths)} play(s) with {workers} worker(s) in {len(chunks)} chunk(s)...")
+
+    start = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Bounded submission keeps results flowing back while the rest are queued
+        pending_chunks = iter(chunks)
+        in_flight = set()
+        for chunk in pending_chunks:
+            in_flight.add(executor.submit(reanalyze_chunk, chunk, compress, force))
+            if len(in_flight) >= workers * 2:
+                break
+
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                next_chunk = next(pending_chunks, None)
+                if next_chunk is not None:
+                    in_flight.add(executor.submit(reanalyze_chunk, next_chunk, compress, force))
+
+                results = future.result()
+                updated = []
+                converted = []
+                for path, new_path, status, data in results:
+                    counts[status] += 1
+                    if status == STATUS_UPDATED:
+                        updated.append((new_path, data))
+                        if new_path != path:
+                            converted.append(path)
+                    elif status == STATUS_ERROR:
+                        print(f"\nError re-analysing {path}: {data['error']}")
+                if index is not None:
+                    # JSON plays are indexed under their new binary file from now on
+                    if converted:
+                        index.remove_paths(converted)
+                    if updated:
+                        index.add_summaries(updated)
+
+                done += len(results)
+                elapsed = time.perf_counter() - start
+                rate = done / elapsed if elapsed > 0 else 0.0
+                eta = (len(paths) - done) / rate if rate else 0.0
+                print(f"\r[{done}/{len(paths)}] {counts[STATUS_UPDATED]} updated, {rate:.0f} plays/s, "
+                      f"ETA {_format_eta(eta)}", end="", flush=True)
+
+    print()
+    if index is not None:
+        index.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run the analysis over saved plays")
+    parser.add_argument("directory", nargs="?", default=None,
+                        help="stats directory (default: stats_directory from config)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="plays per worker task")
+    parser.add_argument("--force", action="store_true", help="also re-analyse plays that are up to date")
+    parser.add_argument("--no-index", action="store_true", help="don't update the play index")
+    args = parser.parse_args()
+
+    stats_dir = args.directory or config._config.stats_directory
+    if not os.path.isdir(stats_dir):
+        print(f"No stats directory at {stats_dir}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    counts = reanalyze_directory(stats_dir, args.workers, max(1, args.chunk_size), args.force, not args.no_index)
+    print(f"Re-analysed {counts[STATUS_UPDATED]} play(s) in {time.perf_counter() - start:.1f}s: "
+          f"{counts[STATUS_CURRENT]} already current, {counts[STATUS_EMPTY]} without samples, "
+          f"{counts[STATUS_ERROR]} error(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# replay.py
+"""
+Record Tosu websocket sessions to a compact file and replay them
+through a local websocket server that stands in for Tosu.
+"""
+
+import asyncio
+import gzip
+import struct
+import time
+from typing import Iterator, Tuple, Union
+from urllib.parse import urlparse
+import websockets
+
+MAGIC = b"OSUREC1\n"
+# Per frame: monotonic offset from recording start (ns), payload length, text flag
+FRAME_HEADER = struct.Struct("<QIB")
+
+Message = Union[str, bytes]
+
+
+class FrameRecorder:
+    """Writes raw websocket frames with monotonic timestamps to a gzip file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frame_count = 0
+        self._file = gzip.open(path, "wb", compresslevel=6)
+        self._file.write(MAGIC)
+        self._start_ns = time.monotonic_ns()
+
+    def write(self, message: Message):
+        is_text = isinstance(message, str)
+        payload = message.encode("utf-8") if is_text else message
+        offset = time.monotonic_ns() - self._start_ns
+        self._file.write(FRAME_HEADER.pack(offset, len(payload), is_text))
+        self._file.write(payload)
+        self.frame_count += 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_recording(path: str) -> Iterator[Tuple[int, Message]]:
+    """Yield (offset_ns, message) pairs from a recording"""
+    with gzip.open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a Tosu recording")
+
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            offset, length, is_text = FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                print(f"⚠️ Truncated frame at end of {path}")
+                return
+            yield offset, payload.decode("utf-8") if is_text else payload
+
+
+async def record(uri: str, path: str, duration: float = 0.0) -> int:
+    """Record frames from a live Tosu socket until stopped or duration (s) elapses"""
+    deadline = time.monotonic() + duration if duration > 0 else None
+
+    async with websockets.connect(uri, max_size=None) as websocket:
+        with FrameRecorder(path) as recorder:
+            while deadline is None or time.monotonic() < deadline:
+                timeout = max(0.0, deadline - time.monotonic()) if deadline else None
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                except websockets.exceptions.ConnectionClosed:
+                    print("Connection closed by server")
+                    break
+                recorder.write(message)
+                if recorder.frame_count % 600 == 0:
+                    print(f"📼 Recorded {recorder.frame_count} frames")
+            return recorder.frame_count
+
+
+async def _send_recording(websocket, path: str, speed: float, loop: bool):
+    while True:
+        start = time.monotonic()
+        for offset, message in iter_recording(path):
+            if speed > 0:
+                delay = start + offset / 1e9 / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                # Max speed, still let other clients and the loop run
+                await asyncio.sleep(0)
+            await websocket.send(message)
+        if not loop:
+            return
+
+
+async def serve_recording(path: str, uri: str, speed: float = 1.0, loop: bool = False):
+    """Serve a recording on the host/port of uri; speed <= 0 replays as fast as possible"""
+    parsed = urlparse(uri)
+    host = parsed.hostname or "localhost"
+    port = parsed.port or 80
+
+    async def handler(websocket):
+        print(f"🔌 Client connected, replaying {path}")
+        try:
+            await _send_recording(websocket, path, speed, loop)
+            print("✅ Replay finished")
+            # Stay connected like Tosu would, so the client doesn't reconnect and replay again
+            await websocket.wait_closed()
+        except websockets.exceptions.ConnectionClosed:
+            print("Client disconnected")
+
+    async with websockets.serve(handler, host, port, max_size=None):
+        print(f"📡 Replay server listening on ws://{host}:{port} (speed: {'max' if speed <= 0 else f'{speed}x'})")
+        await asyncio.Future()
@@ -0,0 +1,185 @@
+# sample_buffer.py
+from dataclasses import dataclass
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+import numpy as np
+
+# Column layout of a play sample (40 bytes per sample vs ~300 for a DataPoint object)
+SAMPLE_COLUMNS: Tuple[Tuple[str, Any], ...] = (
+    ("timestamp", np.float64),
+    ("combo", np.int32),
+    ("accuracy", np.float64),
+    ("hp", np.float64),
+    ("misses", np.int32),
+    ("unstable_rate", np.float64),
+)
+SAMPLE_FIELDS = tuple(name for name, _ in SAMPLE_COLUMNS)
+
+
+@dataclass
+class DataPoint:
+    timestamp: float
+    combo: int
+    accuracy: float
+    hp: float
+    misses: int
+    unstable_rate: float = 0.0
+
+
+class SampleView:
+    """Read-only columnar view over play samples (no copies are made)"""
+
+    __slots__ = SAMPLE_FIELDS
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        for name in SAMPLE_FIELDS:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def empty(cls) -> "SampleView":
+        return cls({name: np.empty(0, dtype) for name, dtype in SAMPLE_COLUMNS})
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "SampleView":
+        """Build a view from a list of DataPoint-like dicts (e.g. loaded JSON)"""
+        return cls({
+            name: np.fromiter((r.get(name, 0) or 0 for r in records), dtype=dtype, count=len(records))
+            for name, dtype in SAMPLE_COLUMNS
+        })
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in SAMPLE_FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __bool__(self) -> bool:
+        return len(self.timestamp) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SampleView({name: getattr(self, name)[index] for name in SAMPLE_FIELDS})
+        return DataPoint(*(getattr(self, name)[index].item() for name in SAMPLE_FIELDS))
+
+    def __iter__(self) -> Iterator[DataPoint]:
+        for row in zip(*(getattr(self, name).tolist() for name in SAMPLE_FIELDS)):
+            yield DataPoint(*row)
+
+
+class SampleBuffer:
+    """Fixed-capacity columnar store for play samples.
+
+    Samples are appended in O(1) into preallocated NumPy columns. When the
+    buffer fills up it is decimated in place: every group of four stored
+    samples is reduced to the two holding the minimum and maximum accuracy,
+    so short accuracy spikes survive. Later samples are then bucketed with
+    the same resolution before they are stored.
+    """
+
+    def __init__(self, capacity: int = 5000):
+        # Decimation works on groups of four samples
+        self.capacity = max(8, int(capacity) - int(capacity) % 4)
+        self._columns = {name: np.empty(self.capacity, dtype) for name, dtype in SAMPLE_COLUMNS}
+        self._size = 0
+
+        # Raw samples represented by each stored min/max pair (1 = no decimation yet)
+        self.bucket_size = 1
+        self._pending_count = 0
+        self._pending_min: Optional[tuple] = None
+        self._pending_max: Optional[tuple] = None
+        self._pending_first: Optional[tuple] = None
+        self._pending_last: Optional[tuple] = None
+        self.raw_count = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, combo: int, accuracy: float, hp: float,
+               misses: int, unstable_rate: float = 0.0):
+        """Append one raw sample"""
+        row = (timestamp, combo, accuracy, hp, misses, unstable_rate)
+        self.raw_count += 1
+
+        if self.bucket_size == 1 and self._size < self.capacity:
+            self._store(row)
+            return
+
+        # Bucket samples at the current resolution, keeping the extremes
+        if self._pending_count == 0:
+            if self._size >= self.capacity:
+                # Decimate before a bucket starts, never while one is collected, so every
+                # stored pair covers bucket_size samples and pairs stay aligned to the
+                # next decimation's groups of four (also for the sample that triggers the first)
+                self._decimate()
+            self._pending_min = self._pending_max = self._pending_first = row
+        else:
+            if accuracy < self._pending_min[2]:
+                self._pending_min = row
+            if accuracy > self._pending_max[2]:
+                self._pending_max = row
+        self._pending_last = row
+        self._pending_count += 1
+
+        if self._pending_count >= self.bucket_size:
+            self._emit_pending()
+
+    def flush(self):
+        """Store the partially filled bucket, if any"""
+        if self._pending_count:
+            self._emit_pending()
+
+    def view(self) -> SampleView:
+        """Zero-copy view of the stored samples"""
+        return SampleView({name: column[:self._size] for name, column in self._columns.items()})
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self._columns.values())
+
+    def _store(self, row: tuple):
+        if self._size >= self.capacity:
+            self._decimate()
+        i = self._size
+        for column, value in zip(self._columns.values(), row):
+            column[i] = value
+        self._size = i + 1
+
+    def _emit_pending(self):
+        if self._pending_count == 1:
+            self._store(self._pending_first)
+        else:
+            low, high = self._pending_min, self._pending_max
+            if low is high:
+                # Flat bucket, keep its boundaries instead
+                low, high = self._pending_first, self._pending_last
+            if low[0] > high[0]:
+                low, high = high, low
+            self._store(low)
+            self._store(high)
+        self._reset_pending()
+
+    def _reset_pending(self):
+        self._pending_count = 0
+        self._pending_min = self._pending_max = None
+        self._pending_first = self._pending_last = None
+
+    def _decimate(self):
+        """Halve the stored samples, keeping the min/max accuracy of each group of four"""
+        groups = self._size // 4
+        accuracy = self._columns["accuracy"][:groups * 4].reshape(groups, 4)
+        low = accuracy.argmin(axis=1)
+        high = accuracy.argmax(axis=1)
+
+        # Flat groups keep their first and last sample
+        flat = low == high
+        low[flat] = 0
+        high[flat] = 3
+
+        base = np.arange(groups) * 4
+        keep = np.stack((base + np.minimum(low, high), base + np.maximum(low, high)), axis=1).ravel()
+
+        for column in self._columns.values():
+            column[:len(keep)] = column[keep]
+
+        self._size = len(keep)
+        self.bucket_size *= 2 if self.bucket_size > 1 else 4
@@ -0,0 +1,93 @@
+# sampler.py
+from dataclasses import dataclass
+from typing import Optional
+import config
+
+# Why a frame was recorded
+REASON_MISS = "miss"
+REASON_COMBO_BREAK = "combo_break"
+REASON_HP_DROP = "hp_drop"
+REASON_CHANGE = "change"
+REASON_HEARTBEAT = "heartbeat"
+
+
+@dataclass(slots=True)
+class SamplerStats:
+    frames: int = 0
+    recorded: int = 0
+    events: int = 0
+    changes: int = 0
+    heartbeats: int = 0
+
+    def summary(self) -> str:
+        kept = self.recorded / self.frames * 100 if self.frames else 0.0
+        return (f"sampler: {self.recorded}/{self.frames} frames kept ({kept:.1f}%), "
+                f"{self.events} events, {self.changes} changes, {self.heartbeats} heartbeats")
+
+
+class AdaptiveSampler:
+    """Decides which gameplay frames become samples.
+
+    Misses, combo resets and HP drops are recorded on the frame they happen.
+    Otherwise a frame is recorded at most once per min_interval_ms, and only
+    when accuracy moved past the dead-band or max_interval_ms has passed
+    since the last sample.
+    """
+
+    def __init__(self, min_interval_ms: Optional[float] = None, max_interval_ms: Optional[float] = None,
+                 accuracy_deadband: Optional[float] = None, hp_drop: Optional[float] = None):
+        cfg = config._config
+        self.min_interval_ms = cfg.sample_interval if min_interval_ms is None else min_interval_ms
+        self.max_interval_ms = cfg.sample_max_interval if max_interval_ms is None else max_interval_ms
+        self.accuracy_deadband = cfg.accuracy_deadband if accuracy_deadband is None else accuracy_deadband
+        self.hp_drop = cfg.sample_hp_drop if hp_drop is None else hp_drop
+        self.stats = SamplerStats()
+        self.reset()
+
+    def reset(self):
+        """Forget the previous play; the next frame is always recorded"""
+        self._last_combo = 0
+        self._last_misses = 0
+        self._recorded_time = None
+        self._recorded_accuracy = 0.0
+        self._recorded_hp = 0.0
+
+    def check(self, now_ms: float, combo: int, accuracy: float, hp: float, misses: int) -> Optional[str]:
+        """The reason to record this frame, or None to skip it"""
+        self.stats.frames += 1
+        reason = None
+
+        if misses > self._last_misses:
+            reason = REASON_MISS
+        elif combo < self._last_combo:
+            reason = REASON_COMBO_BREAK
+        elif self._recorded_time is not None and self._recorded_hp - hp >= self.hp_drop:
+            reason = REASON_HP_DROP
+        elif self._recorded_time is None:
+            reason = REASON_HEARTBEAT
+        else:
+            elapsed = now_ms - self._recorded_time
+            if elapsed >= self.max_interval_ms:
+                reason = REASON_HEARTBEAT
+            elif elapsed >= self.min_interval_ms and abs(accuracy - self._recorded_accuracy) > self.accuracy_deadband:
+                reason = REASON_CHANGE
+
+        self._last_combo = combo
+        self._last_misses = misses
+
+        if reason is None:
+            return None
+
+        self._recorded_time = now_ms
+        self._recorded_accuracy = accuracy
+        self._recorded_hp = hp
+
+        stats = self.stats
+        stats.recorded += 1
+        if reason == REASON_CHANGE:
+            stats.changes += 1
+        elif reason == REASON_HEARTBEAT:
+            stats.heartbeats += 1
+        else:
+            stats.events += 1
+        return reason
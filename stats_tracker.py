@@ -1,22 +1,14 @@
 import time
-import json
 import os
 from datetime import datetime
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Any
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
 import config
-
-MAX_DATA_POINTS = 10000  # Limit to prevent memory issues
-
-
-@dataclass
-class DataPoint:
-    timestamp: float
-    combo: int
-    accuracy: float
-    hp: float
-    misses: int
-    unstable_rate: float = 0.0
+from hit_errors import HitErrorTracker
+from sample_buffer import SampleBuffer, SampleView
+import analysis_engine
+import play_format
+import play_index
 
 
 @dataclass
@@ -31,7 +23,7 @@ class MapStats:
     total_misses: int
     final_hp: float
     play_duration: float
-    data_points: List[DataPoint]
+    data_points: SampleView
 
     # Calculated stats
     avg_accuracy: float = 0.0
@@ -44,22 +36,68 @@ class MapStats:
     stamina_score: float = 0.0
     reaction_time_avg: float = 0.0
     difficulty_spikes: int = 0
+    mods: str = ""
+
+    # Hit errors (ms, negative is early), kept as a histogram rather than raw hits
+    hit_error_count: int = 0
+    hit_error_mean: float = 0.0
+    unstable_rate: float = 0.0
+    early_hits: int = 0
+    late_hits: int = 0
+    hit_error_bin_ms: int = 0
+    hit_error_histogram: List[int] = field(default_factory=list)  # From -range to +range
+
+    analysis_version: int = 0  # analysis_engine.ANALYSIS_VERSION the derived stats came from
+    analysis_source: str = ""  # analysis_engine.SOURCE_LIVE or SOURCE_SAMPLES, empty before both
+
+
+def calculate_advanced_stats(map_stats: MapStats):
+    """Recalculate the derived stats of a play from its stored samples (see reanalyze.py)"""
+    if not map_stats.data_points:
+        return
+
+    # Vectorized over the sample columns, see analysis_engine
+    for name, value in analysis_engine.analyze(map_stats.data_points).items():
+        setattr(map_stats, name, value)
+    map_stats.analysis_version = analysis_engine.ANALYSIS_VERSION
+    map_stats.analysis_source = analysis_engine.SOURCE_SAMPLES
+
+
+@dataclass
+class PendingPlay:
+    """A play that ended but has not been analysed yet"""
+    start_time: float
+    end_time: float
+    map_info: Dict[str, Any]
+    samples: SampleBuffer
+    live_stats: analysis_engine.OnlineStats
+    hit_errors: HitErrorTracker
+    final_combo: int
+    final_accuracy: float
+    final_hp: float
+    total_misses: int
 
 
 class StatsTracker:
     def __init__(self):
         self.is_playing = False
-        self.current_session: List[DataPoint] = []
+        self.current_session = SampleBuffer(config._config.max_data_points)
+        self.live_stats = analysis_engine.OnlineStats()
+        self.hit_errors = HitErrorTracker()
         self.last_combo = 0
         self.last_miss_count = 0
         self.session_start_time = None
         self.map_info = {}
         self.completed_maps: List[MapStats] = []
+        self.play_index = None  # Opened on first save
 
     def start_tracking(self, map_info: Dict[str, Any]):
         """Start tracking a new map"""
         self.is_playing = True
-        self.current_session = []
+        # Fresh buffer per play so finished MapStats can keep a zero-copy view
+        self.current_session = SampleBuffer(config._config.max_data_points)
+        self.live_stats = analysis_engine.OnlineStats()
+        self.hit_errors = HitErrorTracker()
         self.session_start_time = time.time()
         self.last_combo = 0
         self.last_miss_count = 0
@@ -71,12 +109,6 @@ class StatsTracker:
         if not self.is_playing:
             return
 
-        # Limit data points to prevent memory issues
-        if len(self.current_session) > MAX_DATA_POINTS:
-            # Keep every nth point to maintain timeline
-            step = len(self.current_session) // (MAX_DATA_POINTS // 2)
-            self.current_session = self.current_session[::step]
-
         # Validate inputs
         combo = max(0, int(combo)) if combo is not None else 0
         accuracy = max(0.0, min(100.0, float(accuracy))) if accuracy is not None else 0.0
@@ -84,48 +116,101 @@ class StatsTracker:
         misses = max(0, int(misses)) if misses is not None else 0
         unstable_rate = max(0.0, float(unstable_rate)) if unstable_rate is not None else 0.0
 
-        data_point = DataPoint(
-            timestamp=time.time() - self.session_start_time,
-            combo=combo,
-            accuracy=accuracy,
-            hp=hp,
-            misses=misses,
-            unstable_rate=unstable_rate
+        # The buffer decimates itself once full, keeping accuracy extremes
+        self.current_session.append(
+            time.time() - self.session_start_time, combo, accuracy, hp, misses, unstable_rate
         )
-        self.current_session.append(data_point)
+        self.live_stats.add(combo, accuracy, hp, unstable_rate)
+
+    def add_hit_errors(self, errors):
+        """Consume the new tail of the play's hit error array"""
+        if self.is_playing and errors:
+            self.hit_errors.consume(errors)
+
+    def get_hit_error_summary(self) -> Dict[str, Any]:
+        """Live hit error values of the current play (empty before the first hit)"""
+        if not self.is_playing:
+            return {}
+        return self.hit_errors.summary()
+
+    def get_live_stats(self) -> Dict[str, Any]:
+        """Running analysis of the current play"""
+        if not self.is_playing or not self.live_stats.count:
+            return {}
+
+        return {
+            "consistency_score": analysis_engine.consistency_score(self.live_stats.variance),
+            "accuracy_trend": self.live_stats.trend,
+            "difficulty_spikes": self.live_stats.difficulty_spikes,
+            "combo_breaks": self.live_stats.combo_breaks,
+            "hp_drops": self.live_stats.hp_drops,
+        }
 
     def finish_map(self, final_combo: int, final_accuracy: float, final_hp: float, total_misses: int):
         """Finish tracking and calculate statistics"""
-        if not self.is_playing or not self.current_session:
+        pending = self.end_play(final_combo, final_accuracy, final_hp, total_misses)
+        if pending is None:
+            return None
+        return self.finalize(pending)
+
+    def end_play(self, final_combo: int, final_accuracy: float, final_hp: float,
+                 total_misses: int) -> Optional["PendingPlay"]:
+        """Stop tracking and hand over the play's data without analysing it (cheap)"""
+        if not self.is_playing or not len(self.current_session):
             return None
 
+        self.is_playing = False
         end_time = time.time()
-        play_duration = end_time - self.session_start_time
 
         # Only process if play was long enough
-        if play_duration < config.MIN_PLAY_DURATION:
-            self.is_playing = False
+        if end_time - self.session_start_time < config.MIN_PLAY_DURATION:
             return None
 
-        map_stats = MapStats(
+        # The buffer and accumulators belong to the pending play now, start_tracking makes new ones
+        return PendingPlay(
             start_time=self.session_start_time,
             end_time=end_time,
-            map_name=self.map_info.get('title', 'Unknown'),
-            artist=self.map_info.get('artist', 'Unknown'),
-            difficulty=self.map_info.get('difficulty', 'Unknown'),
-            max_combo=max(dp.combo for dp in self.current_session) if self.current_session else 0,
+            map_info=self.map_info,
+            samples=self.current_session,
+            live_stats=self.live_stats,
+            hit_errors=self.hit_errors,
+            final_combo=final_combo,
             final_accuracy=final_accuracy,
-            total_misses=total_misses,
             final_hp=final_hp,
-            play_duration=play_duration,
-            data_points=self.current_session.copy()
+            total_misses=total_misses
+        )
+
+    def finalize(self, pending: "PendingPlay") -> MapStats:
+        """Calculate statistics for an ended play and save them; safe to run on a worker thread"""
+        pending.samples.flush()
+        samples = pending.samples.view()
+        live_stats = pending.live_stats
+
+        map_stats = MapStats(
+            start_time=pending.start_time,
+            end_time=pending.end_time,
+            map_name=pending.map_info.get('title', 'Unknown'),
+            artist=pending.map_info.get('artist', 'Unknown'),
+            difficulty=pending.map_info.get('difficulty', 'Unknown'),
+            max_combo=live_stats.peak_combo,
+            final_accuracy=pending.final_accuracy,
+            total_misses=pending.total_misses,
+            final_hp=pending.final_hp,
+            play_duration=pending.end_time - pending.start_time,
+            data_points=samples,
+            mods=pending.map_info.get('mods', '')
         )
 
-        # Calculate advanced statistics
-        self._calculate_advanced_stats(map_stats)
+        # Advanced statistics were accumulated during play, only stamina needs the samples
+        for name, value in live_stats.results().items():
+            setattr(map_stats, name, value)
+        map_stats.stamina_score = analysis_engine.stamina_score(samples.accuracy)
+        for name, value in pending.hit_errors.results().items():
+            setattr(map_stats, name, value)
+        map_stats.analysis_version = analysis_engine.ANALYSIS_VERSION
+        map_stats.analysis_source = analysis_engine.SOURCE_LIVE
 
         self.completed_maps.append(map_stats)
-        self.is_playing = False
 
         # Save to file if enabled
         if config._config.save_stats:
@@ -133,119 +218,8 @@ class StatsTracker:
 
         return map_stats
 
-    def _calculate_advanced_stats(self, map_stats: MapStats):
-        """Calculate comprehensive statistics"""
-        if not map_stats.data_points:
-            return
-
-        # Average accuracy
-        accuracies = [dp.accuracy for dp in map_stats.data_points]
-        map_stats.avg_accuracy = sum(accuracies) / len(accuracies)
-
-        # Accuracy variance (consistency)
-        variance = sum((acc - map_stats.avg_accuracy) ** 2 for acc in accuracies) / len(accuracies)
-        map_stats.accuracy_variance = variance
-
-        # Count combo breaks and HP drops
-        last_combo = 0
-        last_hp = 1.0
-
-        for dp in map_stats.data_points:
-            if dp.combo < last_combo and last_combo > 20:  # Combo break (ignore small combos)
-                map_stats.combo_breaks += 1
-            if dp.hp < last_hp - 0.1:  # Significant HP drop
-                map_stats.hp_drops += 1
-
-            last_combo = dp.combo
-            last_hp = dp.hp
-
-        # Peak combo
-        map_stats.peak_combo = max(dp.combo for dp in map_stats.data_points)
-
-        # Consistency score (lower variance = higher consistency)
-        map_stats.consistency_score = max(0, 100 - (variance * 10))
-
-        # Additional metrics
-        map_stats.accuracy_trend = self._calculate_accuracy_trend(map_stats.data_points)
-        map_stats.stamina_score = self._calculate_stamina_score(map_stats.data_points)
-        map_stats.reaction_time_avg = self._calculate_avg_reaction_time(map_stats.data_points)
-        map_stats.difficulty_spikes = self._detect_difficulty_spikes(map_stats.data_points)
-
-    def _calculate_accuracy_trend(self, data_points: List[DataPoint]) -> float:
-        """Calculate if accuracy is improving or declining over time"""
-        if len(data_points) < 2:
-            return 0.0
-
-        # Simple linear regression to find trend
-        n = len(data_points)
-        x_values = list(range(n))
-        y_values = [dp.accuracy for dp in data_points]
-
-        x_mean = sum(x_values) / n
-        y_mean = sum(y_values) / n
-
-        numerator = sum((x - x_mean) * (y - y_mean) for x, y in zip(x_values, y_values))
-        denominator = sum((x - x_mean) ** 2 for x in x_values)
-
-        if denominator == 0:
-            return 0.0
-
-        slope = numerator / denominator
-        return slope
-
-    def _calculate_stamina_score(self, data_points: List[DataPoint]) -> float:
-        """Calculate stamina based on accuracy decline over time"""
-        if len(data_points) < 10:
-            return 100.0
-
-        # Compare first and last 25% of the play
-        first_quarter = data_points[:len(data_points) // 4]
-        last_quarter = data_points[len(data_points) * 3 // 4:]
-
-        if not first_quarter or not last_quarter:
-            return 100.0
-
-        first_avg = sum(dp.accuracy for dp in first_quarter) / len(first_quarter)
-        last_avg = sum(dp.accuracy for dp in last_quarter) / len(last_quarter)
-
-        # Calculate stamina as percentage of accuracy maintained
-        stamina = (last_avg / first_avg) * 100 if first_avg > 0 else 100.0
-        return min(100.0, max(0.0, stamina))
-
-    def _calculate_avg_reaction_time(self, data_points: List[DataPoint]) -> float:
-        """Calculate average reaction time based on unstable rate"""
-        if not data_points:
-            return 0.0
-
-        unstable_rates = [dp.unstable_rate for dp in data_points if dp.unstable_rate > 0]
-        if not unstable_rates:
-            return 0.0
-
-        return sum(unstable_rates) / len(unstable_rates)
-
-    def _detect_difficulty_spikes(self, data_points: List[DataPoint]) -> int:
-        """Detect sections where accuracy drops significantly"""
-        if len(data_points) < 5:
-            return 0
-
-        spikes = 0
-        window_size = 5
-        threshold = 5.0  # 5% accuracy drop
-
-        for i in range(window_size, len(data_points) - window_size):
-            before = data_points[i - window_size:i]
-            after = data_points[i:i + window_size]
-
-            before_avg = sum(dp.accuracy for dp in before) / len(before)
-            after_avg = sum(dp.accuracy for dp in after) / len(after)
-
-            if before_avg - after_avg > threshold:
-                spikes += 1
-
-        return spikes
-
     def _save_map_stats(self, map_stats: MapStats):
-        """Save map statistics to JSON file"""
+        """Save map statistics in the binary play format (see play_format)"""
         try:
             # Create stats directory if it doesn't exist
             stats_dir = config._config.stats_directory
@@ -254,12 +228,15 @@ class StatsTracker:
 
             timestamp = datetime.fromtimestamp(map_stats.start_time).strftime("%Y%m%d_%H%M%S")
             safe_map_name = "".join(c for c in map_stats.map_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            filename = f"{stats_dir}/stats_{timestamp}_{safe_map_name.replace(' ', '_')}.json"
+            filename = f"{stats_dir}/stats_{timestamp}_{safe_map_name.replace(' ', '_')}{play_format.PLAY_EXTENSION}"
 
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(asdict(map_stats), f, indent=2, ensure_ascii=False)
+            play_format.write_play(filename, map_stats, compress=config._config.compress_stats)
             print(f"Map stats saved to {filename}")
 
+            if self.play_index is None:
+                self.play_index = play_index.get_play_index()
+            self.play_index.add_play(filename, map_stats)
+
         except Exception as e:
             print(f"Error saving map stats: {e}")
 
@@ -0,0 +1,226 @@
+# streams.py
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+import websockets
+from collections import deque
+from frame_decoder import EventPeek, FrameDecoder
+from metrics import get_metrics
+
+RECV_TIMEOUT = 5.0  # Seconds without a message before the connection is pinged
+MAX_BACKLOG = 1024  # Received frames waiting for the processor before the oldest are dropped
+
+
+@dataclass(slots=True)
+class ReconnectPolicy:
+    """Exponential backoff between connection attempts, reset by a successful connect"""
+    initial_delay: float = 5.0
+    max_delay: float = 5.0
+    factor: float = 2.0
+
+    def delay(self, attempt: int) -> float:
+        return min(self.max_delay, self.initial_delay * self.factor ** attempt)
+
+
+@dataclass(slots=True)
+class StreamStats:
+    connects: int = 0
+    disconnects: int = 0
+    messages: int = 0
+    errors: int = 0
+    connected: bool = False
+    last_message: float = 0.0  # time.monotonic() of the last message
+
+    # Conflation (general stream)
+    coalesced: int = 0  # Batches of several waiting frames handled as one
+    dropped: int = 0  # Frames skipped without decoding
+    event_frames: int = 0  # Skipped frames decoded anyway because they carried an event
+    overflowed: int = 0  # Frames lost because the backlog was full
+    max_backlog: int = 0
+
+    def summary(self, name: str) -> str:
+        state = "connected" if self.connected else "disconnected"
+        text = (f"stream[{name}]: {state}, {self.messages} messages, {self.errors} errors, "
+                f"{self.connects} connects, {self.disconnects} disconnects")
+        if self.coalesced:
+            text += (f", {self.coalesced} coalesced, {self.dropped} dropped, {self.event_frames} event frames, "
+                     f"max backlog {self.max_backlog}")
+        if self.overflowed:
+            text += f", {self.overflowed} overflowed"
+        return text
+
+
+class StreamConnection:
+    """One Tosu websocket with its own parser, reconnect policy and stats.
+
+    Runs on the reader's asyncio loop next to the other streams; decoded
+    frames are passed to handle() on the loop thread.
+    """
+
+    def __init__(self, name: str, uri: str, decoder: FrameDecoder, handle: Callable[[Any], None],
+                 policy: ReconnectPolicy, shutdown_event: threading.Event,
+                 on_state: Optional[Callable[[bool], None]] = None):
+        self.name = name
+        self.uri = uri
+        self.decoder = decoder
+        self.handle = handle
+        self.policy = policy
+        self.shutdown_event = shutdown_event
+        self.on_state = on_state
+        self.stats = StreamStats()
+        self.recv_timer = get_metrics().histogram(
+            "osutracker_recv_wait_ms", "Time spent waiting for the next message", stream=name)
+
+    async def run(self):
+        """Connect and reconnect until shutdown"""
+        attempt = 0
+        while not self.shutdown_event.is_set():
+            try:
+                await self.connect()
+                attempt = 0  # Was connected, start the backoff over
+            except Exception as e:
+                print(f"[{self.name}] Connection failed: {e}. "
+                      f"Retrying in {self.policy.delay(attempt):.1f} seconds...")
+            self._set_connected(False)
+
+            # Sleep in short steps so shutdown is noticed quickly
+            deadline = time.monotonic() + self.policy.delay(attempt)
+            attempt += 1
+            while not self.shutdown_event.is_set() and time.monotonic() < deadline:
+                await asyncio.sleep(min(0.5, deadline - time.monotonic()))
+
+    async def connect(self):
+        async with websockets.connect(self.uri, ping_interval=20, ping_timeout=10, max_size=None) as websocket:
+            print(f"Connected to Tosu ({self.name})!")
+            self._set_connected(True)
+            await self.receive(websocket)
+
+    async def receive(self, websocket):
+        """Decode and handle messages until the connection drops"""
+        while not self.shutdown_event.is_set():
+            start = time.perf_counter_ns()
+            try:
+                message = await asyncio.wait_for(websocket.recv(), timeout=RECV_TIMEOUT)
+            except asyncio.TimeoutError:
+                # Send ping to check connection
+                try:
+                    await websocket.ping()
+                except Exception:
+                    # Connection likely lost
+                    return
+                continue
+            except websockets.exceptions.ConnectionClosed:
+                print(f"[{self.name}] Connection closed by server")
+                return
+
+            self.recv_timer.observe_ns(time.perf_counter_ns() - start)
+            self.stats.messages += 1
+            self.stats.last_message = time.monotonic()
+            try:
+                self.handle(self.decoder.decode(message))
+            except ValueError as e:
+                self.stats.errors += 1
+                print(f"[{self.name}] Invalid frame received: {e}")
+
+    def _set_connected(self, connected: bool):
+        if self.stats.connected == connected:
+            return
+        self.stats.connected = connected
+        if connected:
+            self.stats.connects += 1
+        else:
+            self.stats.disconnects += 1
+        if self.on_state:
+            self.on_state(connected)
+
+
+class ConflatingStream(StreamConnection):
+    """A stream that never falls behind: frames that pile up are conflated.
+
+    A reader task drains the socket into a backlog; the processor takes the
+    whole backlog at once and fully decodes only the newest frame. Older
+    frames are only peeked at, and decoded in order only when they carry an
+    event (state change, combo reset, miss), so no transition is lost.
+    """
+
+    def __init__(self, *args, peek: Optional[EventPeek] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.peek = peek or EventPeek()
+
+    async def receive(self, websocket):
+        backlog = deque()
+        ready = asyncio.Event()
+        reader = asyncio.create_task(self._read(websocket, backlog, ready))
+        try:
+            while not self.shutdown_event.is_set():
+                if not backlog:
+                    if reader.done():
+                        # Re-raises whatever ended the reader, run() reports it and reconnects
+                        await reader
+                        return
+                    try:
+                        await asyncio.wait_for(ready.wait(), timeout=RECV_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        pass
+                    ready.clear()
+                    continue
+
+                # Everything received so far, newest last
+                messages = list(backlog)
+                backlog.clear()
+                self._process(messages)
+        finally:
+            reader.cancel()
+            if reader.done() and not reader.cancelled():
+                reader.exception()  # Retrieved, when shutdown beat us to it
+
+    async def _read(self, websocket, backlog, ready):
+        try:
+            while not self.shutdown_event.is_set():
+                # A bare recv returns already-buffered messages without yielding, so
+                # the whole backlog is drained before the processor runs again.
+                # Dead connections are caught by the websocket's own keepalive pings.
+                start = time.perf_counter_ns()
+                try:
+                    message = await websocket.recv()
+                except websockets.exceptions.ConnectionClosed:
+                    print(f"[{self.name}] Connection closed by server")
+                    return
+
+                self.recv_timer.observe_ns(time.perf_counter_ns() - start)
+                self.stats.messages += 1
+                self.stats.last_message = time.monotonic()
+                if len(backlog) >= MAX_BACKLOG:
+                    backlog.popleft()
+                    self.stats.overflowed += 1
+                backlog.append(message)
+                ready.set()
+        finally:
+            # Wake the processor so it can finish the backlog and return
+            ready.set()
+
+    def _process(self, messages):
+        stats = self.stats
+        if len(messages) > 1:
+            stats.coalesced += 1
+            stats.max_backlog = max(stats.max_backlog, len(messages))
+
+        for message in messages[:-1]:
+            if self.peek.is_event(message):
+                stats.event_frames += 1
+                self._handle(message)
+            else:
+                stats.dropped += 1
+        self._handle(messages[-1])
+
+    def _handle(self, message):
+        try:
+            frame = self.decoder.decode(message)
+        except ValueError as e:
+            self.stats.errors += 1
+            print(f"[{self.name}] Invalid frame received: {e}")
+            return
+        self.peek.observe(frame)
+        self.handle(frame)
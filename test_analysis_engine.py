@@ -0,0 +1,178 @@
+# test_analysis_engine.py
+"""
+analyze() and OnlineStats against the per-DataPoint formulas that
+StatsTracker._calculate_advanced_stats used before the NumPy rewrite.
+"""
+
+import numpy as np
+import pytest
+from analysis_engine import SPIKE_WINDOW, OnlineStats, analyze
+from sample_buffer import SAMPLE_COLUMNS, SampleView
+
+SIZES = [0, 1, 10, 11, 2 * SPIKE_WINDOW + 1, 50, 500]
+SEEDS = range(5)
+
+
+# Reference: the original StatsTracker formulas, kept as they were
+
+def reference_stats(data_points):
+    if not data_points:
+        return {}
+    stats = {"combo_breaks": 0, "hp_drops": 0}
+
+    accuracies = [dp.accuracy for dp in data_points]
+    stats["avg_accuracy"] = sum(accuracies) / len(accuracies)
+
+    variance = sum((acc - stats["avg_accuracy"]) ** 2 for acc in accuracies) / len(accuracies)
+    stats["accuracy_variance"] = variance
+
+    last_combo = 0
+    last_hp = 1.0
+    for dp in data_points:
+        if dp.combo < last_combo and last_combo > 20:
+            stats["combo_breaks"] += 1
+        if dp.hp < last_hp - 0.1:
+            stats["hp_drops"] += 1
+        last_combo = dp.combo
+        last_hp = dp.hp
+
+    stats["peak_combo"] = max(dp.combo for dp in data_points)
+    stats["consistency_score"] = max(0, 100 - (variance * 10))
+    stats["accuracy_trend"] = reference_trend(data_points)
+    stats["stamina_score"] = reference_stamina(data_points)
+    stats["reaction_time_avg"] = reference_reaction_time(data_points)
+    stats["difficulty_spikes"] = reference_spikes(data_points)
+    return stats
+
+
+def reference_trend(data_points):
+    if len(data_points) < 2:
+        return 0.0
+    n = len(data_points)
+    x_values = list(range(n))
+    y_values = [dp.accuracy for dp in data_points]
+    x_mean = sum(x_values) / n
+    y_mean = sum(y_values) / n
+    numerator = sum((x - x_mean) * (y - y_mean) for x, y in zip(x_values, y_values))
+    denominator = sum((x - x_mean) ** 2 for x in x_values)
+    if denominator == 0:
+        return 0.0
+    return numerator / denominator
+
+
+def reference_stamina(data_points):
+    if len(data_points) < 10:
+        return 100.0
+    first_quarter = data_points[:len(data_points) // 4]
+    last_quarter = data_points[len(data_points) * 3 // 4:]
+    if not first_quarter or not last_quarter:
+        return 100.0
+    first_avg = sum(dp.accuracy for dp in first_quarter) / len(first_quarter)
+    last_avg = sum(dp.accuracy for dp in last_quarter) / len(last_quarter)
+    stamina = (last_avg / first_avg) * 100 if first_avg > 0 else 100.0
+    return min(100.0, max(0.0, stamina))
+
+
+def reference_reaction_time(data_points):
+    unstable_rates = [dp.unstable_rate for dp in data_points if dp.unstable_rate > 0]
+    if not unstable_rates:
+        return 0.0
+    return sum(unstable_rates) / len(unstable_rates)
+
+
+def reference_spikes(data_points):
+    if len(data_points) < 5:
+        return 0
+    spikes = 0
+    window_size = 5
+    threshold = 5.0
+    for i in range(window_size, len(data_points) - window_size):
+        before = data_points[i - window_size:i]
+        after = data_points[i:i + window_size]
+        before_avg = sum(dp.accuracy for dp in before) / len(before)
+        after_avg = sum(dp.accuracy for dp in after) / len(after)
+        if before_avg - after_avg > threshold:
+            spikes += 1
+    return spikes
+
+
+# Random plays
+
+def random_play(n, seed, unstable_rate=True):
+    """A play with combo breaks, HP drops and sudden accuracy dips"""
+    rng = np.random.default_rng(seed)
+    combo = np.cumsum(rng.integers(0, 4, n))
+    breaks = rng.random(n) < 0.05
+    for i in np.flatnonzero(breaks):
+        combo[i:] -= combo[i]
+    accuracy = np.clip(97 - np.cumsum(rng.normal(0, 0.3, n)) - np.where(rng.random(n) < 0.1, 15, 0), 0, 100)
+    hp = np.clip(1 - np.where(rng.random(n) < 0.1, rng.random(n) * 0.5, 0), 0, 1)
+    columns = {
+        "timestamp": np.arange(n) * 50.0,
+        "combo": combo,
+        "accuracy": accuracy,
+        "hp": hp,
+        "misses": np.cumsum(breaks),
+        "unstable_rate": rng.uniform(60, 160, n) if unstable_rate else np.zeros(n),
+    }
+    return SampleView({name: np.asarray(columns[name], dtype=dtype) for name, dtype in SAMPLE_COLUMNS})
+
+
+def to_data_points(samples):
+    # Plain Python floats and ints, as the old code saw them
+    return list(samples)
+
+
+def online_results(samples):
+    stats = OnlineStats()
+    for dp in samples:
+        stats.add(dp.combo, dp.accuracy, dp.hp, dp.unstable_rate)
+    return stats.results()
+
+
+def assert_matches(actual, expected):
+    assert actual.keys() <= expected.keys()
+    for name, value in actual.items():
+        assert value == pytest.approx(expected[name], rel=1e-9, abs=1e-9), name
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("n", SIZES)
+@pytest.mark.parametrize("unstable_rate", [True, False])
+def test_analyze_matches_reference(n, seed, unstable_rate):
+    samples = random_play(n, seed, unstable_rate)
+    expected = reference_stats(to_data_points(samples))
+    actual = analyze(samples)
+    assert actual.keys() == expected.keys()
+    assert_matches(actual, expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("n", SIZES)
+@pytest.mark.parametrize("unstable_rate", [True, False])
+def test_online_stats_match_reference(n, seed, unstable_rate):
+    samples = random_play(n, seed, unstable_rate)
+    expected = reference_stats(to_data_points(samples))
+    actual = online_results(samples)
+    # Stamina needs the first and last quarter, it is computed from the stored samples
+    assert set(expected) - set(actual) <= {"stamina_score"}
+    assert_matches(actual, expected)
+
+
+def test_empty_play():
+    assert analyze(SampleView.empty()) == {}
+    assert OnlineStats().results() == {}
+
+
+def test_zero_unstable_rate():
+    samples = random_play(2 * SPIKE_WINDOW + 1, 0, unstable_rate=False)
+    assert analyze(samples)["reaction_time_avg"] == 0.0
+    assert online_results(samples)["reaction_time_avg"] == 0.0
+
+
+def test_random_plays_have_spikes_and_breaks():
+    # Otherwise the comparisons above would not cover those branches
+    expected = reference_stats(to_data_points(random_play(500, 0)))
+    assert expected["difficulty_spikes"] > 0
+    assert expected["combo_breaks"] > 0
+    assert expected["hp_drops"] > 0
@@ -0,0 +1,79 @@
+# test_hit_errors.py
+"""HitErrorTracker: consuming Tosu's growing hit error array."""
+
+import numpy as np
+import pytest
+from hit_errors import HitErrorTracker
+
+
+def test_consumes_only_the_new_tail():
+    tracker = HitErrorTracker()
+    assert tracker.consume([1, -2, 3]) == 3
+    assert tracker.consume([1, -2, 3]) == 0
+    assert tracker.consume([1, -2, 3, 4, -5]) == 2
+    assert tracker.count == 5
+    assert list(tracker.recent) == [1, -2, 3, 4, -5]
+
+
+def test_retry_starts_over():
+    tracker = HitErrorTracker()
+    tracker.consume([10.0] * 50)
+    # The array restarts shorter than what was consumed: a new attempt
+    assert tracker.consume([-3.0, 5.0]) == 2
+    assert tracker.count == 2
+    assert tracker.mean == pytest.approx(1.0)
+    assert (tracker.early, tracker.late) == (1, 1)
+    assert sum(tracker.histogram) == 2
+    assert list(tracker.recent) == [-3.0, 5.0]
+
+
+def test_retry_to_an_empty_array():
+    tracker = HitErrorTracker()
+    tracker.consume([1.0, 2.0])
+    assert tracker.consume([]) == 0
+    assert tracker.count == 0
+    assert tracker.summary() == {}
+
+
+def test_matches_batch_statistics():
+    errors = np.random.default_rng(0).normal(-3, 15, 1000).tolist()
+    tracker = HitErrorTracker()
+    for end in range(0, len(errors) + 1, 37):
+        tracker.consume(errors[:end])
+    tracker.consume(errors)
+
+    assert tracker.count == len(errors)
+    assert tracker.mean == pytest.approx(np.mean(errors))
+    assert tracker.unstable_rate == pytest.approx(10 * np.std(errors))
+    assert tracker.early == sum(e < 0 for e in errors)
+    assert tracker.late == sum(e > 0 for e in errors)
+
+
+def test_histogram_bins_and_outliers():
+    tracker = HitErrorTracker(bin_ms=2, range_ms=10)
+    tracker.consume([-10.0, -0.5, 0.0, 9.9, -500.0, 500.0])
+    assert len(tracker.histogram) == 10
+    assert tracker.histogram[0] == 2  # -10 and the early outlier
+    assert tracker.histogram[4] == 1  # -0.5
+    assert tracker.histogram[5] == 1  # 0
+    assert tracker.histogram[-1] == 2  # 9.9 and the late outlier
+
+
+def test_summary_is_reused_until_a_new_hit():
+    tracker = HitErrorTracker()
+    tracker.consume([1.0])
+    summary = tracker.summary()
+    tracker.consume([1.0])
+    assert tracker.summary() is summary
+    tracker.consume([1.0, 2.0])
+    assert tracker.summary() is not summary
+
+
+def test_results():
+    tracker = HitErrorTracker()
+    assert tracker.results()["hit_error_histogram"] == []
+    tracker.consume([-1.0, 1.0])
+    results = tracker.results()
+    assert results["hit_error_count"] == 2
+    assert (results["early_hits"], results["late_hits"]) == (1, 1)
+    assert sum(results["hit_error_histogram"]) == 2
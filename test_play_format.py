@@ -0,0 +1,115 @@
+# test_play_format.py
+"""Binary play files: write/read round trip, legacy JSON conversion, atomic writes."""
+
+import json
+import os
+import numpy as np
+import pytest
+import play_format
+from sample_buffer import SAMPLE_COLUMNS, SAMPLE_FIELDS, SampleView
+from stats_tracker import MapStats
+
+
+def make_play(count=500, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = SampleView({
+        "timestamp": np.cumsum(rng.uniform(10, 100, count)),
+        "combo": np.arange(count, dtype=np.int32),
+        "accuracy": rng.uniform(80, 100, count),
+        "hp": rng.uniform(0, 1, count),
+        "misses": np.sort(rng.integers(0, 10, count)).astype(np.int32),
+        "unstable_rate": rng.uniform(60, 160, count),
+    })
+    return MapStats(
+        start_time=1_700_000_000.5, end_time=1_700_000_180.0, map_name="Sóng", artist="Artist",
+        difficulty="Insane", max_combo=count - 1, final_accuracy=97.25, total_misses=3, final_hp=0.5,
+        play_duration=179.5, data_points=samples, mods="HDHR", consistency_score=88.0,
+        hit_error_histogram=[0, 1, 2, 3], analysis_version=2, analysis_source="live",
+    )
+
+
+def assert_same_play(loaded, original):
+    assert play_format.map_stats_summary(loaded) == play_format.map_stats_summary(original)
+    assert len(loaded.data_points) == len(original.data_points)
+    for name, dtype in SAMPLE_COLUMNS:
+        column = getattr(loaded.data_points, name)
+        assert column.dtype == np.dtype(dtype), name
+        assert np.array_equal(column, getattr(original.data_points, name)), name
+
+
+@pytest.mark.parametrize("compress", [True, False])
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_round_trip(tmp_path, compress, use_mmap):
+    original = make_play()
+    path = str(tmp_path / f"stats_play{play_format.PLAY_EXTENSION}")
+    play_format.write_play(path, original, compress)
+    loaded = play_format.read_play(path, use_mmap)
+    assert_same_play(loaded, original)
+    del loaded  # Release the mapping before tmp_path is cleaned up
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_empty_play(tmp_path, compress):
+    original = make_play(count=0)
+    path = str(tmp_path / "stats_empty.osps")
+    play_format.write_play(path, original, compress)
+    loaded = play_format.read_play(path)
+    assert len(loaded.data_points) == 0
+    assert play_format.read_summary(path)["map_name"] == "Sóng"
+
+
+def test_columns_are_aligned(tmp_path):
+    path = str(tmp_path / "stats_play.osps")
+    play_format.write_play(path, make_play(count=7), compress=False)
+    with open(path, "rb") as f:
+        header, data_start = play_format._read_header(f)
+    assert data_start % play_format.ALIGNMENT == 0
+    assert all(column["offset"] % play_format.ALIGNMENT == 0 for column in header["samples"]["columns"])
+
+
+def test_summary_without_samples(tmp_path):
+    path = str(tmp_path / "stats_play.osps")
+    original = make_play()
+    play_format.write_play(path, original)
+    summary = play_format.read_summary(path)
+    assert summary == json.loads(json.dumps(play_format.map_stats_summary(original)))
+    assert "data_points" not in summary
+
+
+def test_rejects_other_files(tmp_path):
+    short = tmp_path / "short.osps"
+    short.write_bytes(b"OSPS")
+    other = tmp_path / "other.osps"
+    other.write_bytes(b"NOPE" + bytes(play_format.PREFIX.size))
+    for path in (short, other):
+        with pytest.raises(ValueError):
+            play_format.read_summary(str(path))
+
+
+def test_json_conversion(tmp_path):
+    original = make_play(count=50)
+    summary = play_format.map_stats_summary(original)
+    records = [dict(zip(SAMPLE_FIELDS, row)) for row in zip(
+        *(getattr(original.data_points, name).tolist() for name in SAMPLE_FIELDS))]
+    json_path = tmp_path / "stats_legacy.json"
+    json_path.write_text(json.dumps(dict(summary, data_points=records)), encoding="utf-8")
+
+    new_path = play_format.convert_json_file(str(json_path), remove=True)
+    assert new_path.endswith(play_format.PLAY_EXTENSION)
+    assert not json_path.exists()
+    assert_same_play(play_format.load_play(new_path), original)
+
+
+def test_failed_write_keeps_the_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "stats_play.osps")
+    original = make_play(seed=1)
+    play_format.write_play(path, original)
+
+    def crash(fd):
+        raise OSError("disk gone")
+    monkeypatch.setattr(os, "fsync", crash)
+    with pytest.raises(OSError):
+        play_format.write_play(path, make_play(seed=2))
+
+    assert os.listdir(tmp_path) == ["stats_play.osps"]  # No temp file left behind
+    assert_same_play(play_format.read_play(path, use_mmap=False), original)
@@ -0,0 +1,171 @@
+# test_play_index.py
+"""PlayIndex aggregates and revision()."""
+
+import os
+import numpy as np
+import pytest
+from play_index import BeatmapAggregate, PlayIndex
+
+KEY = ("Artist - Song", "Insane", "")
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = PlayIndex(str(tmp_path / "index.sqlite3"))
+    yield index
+    index.close()
+
+
+def summary(start_time, accuracy, combo=100, misses=0, consistency=90.0, difficulty="Insane", mods=""):
+    return {"map_name": "Song", "artist": "Artist", "difficulty": difficulty, "mods": mods,
+            "start_time": start_time, "final_accuracy": accuracy, "max_combo": combo,
+            "total_misses": misses, "consistency_score": consistency}
+
+
+def expected_aggregate(plays, key=KEY):
+    """Fold plays in start_time order, what the index must arrive at however they were added"""
+    aggregate = BeatmapAggregate(*key)
+    for play in sorted(plays, key=lambda p: p["start_time"]):
+        aggregate.add(play["final_accuracy"], play["max_combo"], play["total_misses"],
+                      play["consistency_score"], play["start_time"])
+    return aggregate
+
+
+def random_plays(count, seed):
+    rng = np.random.default_rng(seed)
+    return [summary(float(t), float(rng.uniform(80, 100)), int(rng.integers(0, 500)),
+                    int(rng.integers(0, 20)), float(rng.uniform(50, 100)))
+            for t in rng.permutation(count) * 60 + 1_700_000_000]
+
+
+def path(tmp_path, i):
+    return os.path.join(str(tmp_path), f"stats_{i}.osps")
+
+
+def assert_aggregate(actual, expected):
+    assert actual is not None
+    for name in ("play_count", "best_accuracy", "best_accuracy_time", "previous_best_accuracy",
+                 "best_combo", "fewest_misses", "first_played", "last_played"):
+        assert getattr(actual, name) == getattr(expected, name), name
+    for name in ("accuracy_mean", "consistency_mean", "consistency_trend"):
+        assert getattr(actual, name) == pytest.approx(getattr(expected, name)), name
+
+
+def test_aggregate_folds_plays_in_order(index, tmp_path):
+    plays = sorted(random_plays(20, 0), key=lambda p: p["start_time"])
+    for i, play in enumerate(plays):
+        index.add_summaries([(path(tmp_path, i), play)])
+    assert_aggregate(index.aggregate(*KEY), expected_aggregate(plays))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_out_of_order_and_batched_plays(index, tmp_path, seed):
+    # Older plays arriving later need the whole history recomputed
+    plays = random_plays(30, seed)
+    index.add_summaries([(path(tmp_path, i), play) for i, play in enumerate(plays[:10])])
+    for i, play in enumerate(plays[10:], 10):
+        index.add_summaries([(path(tmp_path, i), play)])
+    assert_aggregate(index.aggregate(*KEY), expected_aggregate(plays))
+
+
+def test_replaced_and_removed_plays(index, tmp_path):
+    plays = sorted(random_plays(10, 1), key=lambda p: p["start_time"])
+    index.add_summaries([(path(tmp_path, i), play) for i, play in enumerate(plays)])
+
+    # Re-analysed play replaces its row
+    plays[3] = dict(plays[3], final_accuracy=100.0)
+    index.add_summaries([(path(tmp_path, 3), plays[3])])
+    assert_aggregate(index.aggregate(*KEY), expected_aggregate(plays))
+
+    index.remove_paths([path(tmp_path, 3), path(tmp_path, 9)])
+    assert_aggregate(index.aggregate(*KEY), expected_aggregate(plays[:3] + plays[4:9]))
+
+    index.remove_paths([path(tmp_path, i) for i in range(10)])
+    assert index.aggregate(*KEY) is None
+    assert index.aggregates() == []
+
+
+def test_aggregates_are_per_difficulty_and_mods(index, tmp_path):
+    index.add_summaries([
+        (path(tmp_path, 0), summary(1.0, 90.0)),
+        (path(tmp_path, 1), summary(2.0, 95.0, mods="HD")),
+        (path(tmp_path, 2), summary(3.0, 85.0, difficulty="Hard")),
+    ])
+    keys = {(agg.beatmap, agg.difficulty, agg.mods): agg.best_accuracy for agg in index.aggregates()}
+    assert keys == {KEY: 90.0, ("Artist - Song", "Insane", "HD"): 95.0, ("Artist - Song", "Hard", ""): 85.0}
+    # Most recently played first
+    assert [agg.last_played for agg in index.aggregates()] == [3.0, 2.0, 1.0]
+
+
+def test_rebuild_matches_incremental(index, tmp_path):
+    plays = random_plays(25, 2)
+    for i, play in enumerate(plays):
+        index.add_summaries([(path(tmp_path, i), play)])
+    incremental = index.aggregate(*KEY)
+    index.rebuild_aggregates()
+    assert_aggregate(index.aggregate(*KEY), incremental)
+
+
+def test_aggregates_persist_and_follow_other_connections(index, tmp_path):
+    index.add_summaries([(path(tmp_path, 0), summary(1.0, 90.0))])
+    assert index.aggregate(*KEY).play_count == 1  # Now cached in memory
+
+    other = PlayIndex(index.db_path)
+    try:
+        assert other.aggregate(*KEY).play_count == 1
+        other.add_summaries([(path(tmp_path, 1), summary(2.0, 97.0))])
+    finally:
+        other.close()
+
+    aggregate = index.aggregate(*KEY)
+    assert aggregate.play_count == 2
+    assert aggregate.best_accuracy == 97.0
+    assert aggregate.previous_best_accuracy == 90.0
+
+
+def test_aggregate_copies_are_detached(index, tmp_path):
+    index.add_summaries([(path(tmp_path, 0), summary(1.0, 90.0))])
+    index.aggregate(*KEY).best_accuracy = 0.0
+    assert index.aggregate(*KEY).best_accuracy == 90.0
+
+
+def test_revision_increases_on_every_write(index, tmp_path):
+    revisions = [index.revision()]
+    index.add_summaries([(path(tmp_path, 0), summary(1.0, 90.0)), (path(tmp_path, 1), summary(2.0, 91.0))])
+    revisions.append(index.revision())
+    index.add_summaries([(path(tmp_path, 1), summary(2.0, 92.0))])  # Replaced
+    revisions.append(index.revision())
+    index.remove_paths([path(tmp_path, 0)])
+    revisions.append(index.revision())
+    index.rebuild_aggregates()
+    revisions.append(index.revision())
+    assert revisions == sorted(set(revisions))
+
+
+def test_revision_unchanged_by_reads_and_empty_writes(index, tmp_path):
+    index.add_summaries([(path(tmp_path, 0), summary(1.0, 90.0))])
+    revision = index.revision()
+    index.query()
+    index.aggregates()
+    index.add_summaries([])
+    assert index.revision() == revision
+
+
+def test_revision_differs_when_row_ids_are_reused(index, tmp_path):
+    # Removing the newest row and adding another reuses its id: same COUNT(*) and MAX(id)
+    index.add_summaries([(path(tmp_path, 0), summary(1.0, 90.0)), (path(tmp_path, 1), summary(2.0, 91.0))])
+    before = index.revision()
+    index.remove_paths([path(tmp_path, 1)])
+    index.add_summaries([(path(tmp_path, 2), summary(3.0, 99.0))])
+    assert index.revision() != before
+
+
+def test_revision_persists_and_is_shared(index, tmp_path):
+    index.add_summaries([(path(tmp_path, 0), summary(1.0, 90.0))])
+    other = PlayIndex(index.db_path)
+    try:
+        assert other.revision() == index.revision()
+        other.remove_paths([path(tmp_path, 0)])
+        assert index.revision() == other.revision()
+    finally:
+        other.close()
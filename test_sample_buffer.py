@@ -0,0 +1,96 @@
+# test_sample_buffer.py
+"""SampleBuffer's min/max decimation."""
+
+import numpy as np
+import pytest
+from sample_buffer import SampleBuffer
+
+CAPACITY = 16
+
+
+def fill(buffer, accuracy):
+    """Append one sample per accuracy value, the raw index as timestamp"""
+    for i, value in enumerate(accuracy):
+        buffer.append(float(i), i, float(value), 1.0, 0)
+
+
+def test_no_decimation_until_full():
+    buffer = SampleBuffer(CAPACITY)
+    fill(buffer, range(CAPACITY))
+    assert len(buffer) == CAPACITY
+    assert buffer.bucket_size == 1
+    assert buffer.view().timestamp.tolist() == list(range(CAPACITY))
+
+
+def test_first_decimation_starts_a_bucket():
+    buffer = SampleBuffer(CAPACITY)
+    fill(buffer, range(CAPACITY + 1))
+    # Halved, and the sample that triggered it waits in a bucket of 4
+    assert buffer.bucket_size == 4
+    assert len(buffer) == CAPACITY // 2
+    assert buffer.view().timestamp[-1] < CAPACITY
+    for i in range(CAPACITY + 1, CAPACITY + 4):
+        buffer.append(float(i), i, float(i), 1.0, 0)
+    # A full bucket is stored as its min/max pair
+    assert len(buffer) == CAPACITY // 2 + 2
+    assert buffer.view().timestamp[-2:].tolist() == [CAPACITY, CAPACITY + 3]
+
+
+@pytest.mark.parametrize("raw", [CAPACITY * 2, CAPACITY * 8, CAPACITY * 64])
+def test_bucket_size_progression(raw):
+    buffer = SampleBuffer(CAPACITY)
+    fill(buffer, np.random.default_rng(raw).uniform(80, 100, raw))
+    buffer.flush()
+    assert len(buffer) <= CAPACITY
+    assert buffer.raw_count == raw
+    # 1, then 4, doubling with every later decimation; each stored pair is one bucket
+    assert buffer.bucket_size in (4, 8, 16, 32, 64, 128)
+    assert len(buffer) * buffer.bucket_size // 2 == raw
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pairs_stay_aligned_to_buckets(seed):
+    buffer = SampleBuffer(CAPACITY)
+    raw = CAPACITY * 32
+    fill(buffer, np.random.default_rng(seed).uniform(80, 100, raw))
+    buffer.flush()
+
+    # Pair j covers raw samples [j * bucket_size, (j + 1) * bucket_size)
+    timestamps = buffer.view().timestamp
+    buckets = timestamps.astype(np.int64) // buffer.bucket_size
+    assert buckets.tolist() == [j // 2 for j in range(len(timestamps))]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_timestamps_stay_ordered(seed):
+    buffer = SampleBuffer(CAPACITY)
+    fill(buffer, np.random.default_rng(seed).uniform(80, 100, CAPACITY * 50 + 3))
+    buffer.flush()
+    assert np.all(np.diff(buffer.view().timestamp) > 0)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_extremes_survive_repeated_decimation(seed):
+    rng = np.random.default_rng(seed)
+    raw = CAPACITY * 40
+    accuracy = rng.uniform(90, 99, raw)
+    dip, peak = rng.choice(raw, 2, replace=False)
+    accuracy[dip] = 50.0
+    accuracy[peak] = 100.0
+
+    buffer = SampleBuffer(CAPACITY)
+    fill(buffer, accuracy)
+    buffer.flush()
+    view = buffer.view()
+
+    assert buffer.bucket_size > 4  # Decimated more than once
+    assert view.accuracy.min() == 50.0
+    assert view.accuracy.max() == 100.0
+    # Still at the time they happened
+    assert view.timestamp[view.accuracy.argmin()] == dip
+    assert view.timestamp[view.accuracy.argmax()] == peak
+
+    # Every stored pair holds the min and max of its bucket
+    for j in range(len(view) // 2):
+        bucket = accuracy[j * buffer.bucket_size:(j + 1) * buffer.bucket_size]
+        assert sorted(view.accuracy[2 * j:2 * j + 2]) == [bucket.min(), bucket.max()]
@@ -0,0 +1,100 @@
+# test_sampler.py
+"""AdaptiveSampler: events at once, changes rate-limited, heartbeats when steady."""
+
+import pytest
+from sampler import (REASON_CHANGE, REASON_COMBO_BREAK, REASON_HEARTBEAT, REASON_HP_DROP, REASON_MISS,
+                     AdaptiveSampler)
+
+FRAME_MS = 10  # Tosu sends a general frame about every 10ms
+
+
+@pytest.fixture
+def sampler():
+    return AdaptiveSampler(min_interval_ms=100, max_interval_ms=1000, accuracy_deadband=0.05, hp_drop=0.1)
+
+
+def run(sampler, start_ms, frames, combo=100, accuracy=98.0, hp=1.0, misses=0, step=None):
+    """Feed frames FRAME_MS apart, returning {time: reason} of the recorded ones"""
+    recorded = {}
+    for i in range(frames):
+        now = start_ms + i * FRAME_MS
+        value = accuracy + step * i if step else accuracy
+        reason = sampler.check(now, combo + i, value, hp, misses)
+        if reason:
+            recorded[now] = reason
+    return recorded
+
+
+def test_first_frame_is_recorded(sampler):
+    assert sampler.check(0, 0, 100.0, 1.0, 0) == REASON_HEARTBEAT
+
+
+def test_steady_play_only_heartbeats(sampler):
+    sampler.check(0, 0, 98.0, 1.0, 0)
+    recorded = run(sampler, FRAME_MS, 500)
+    assert set(recorded.values()) == {REASON_HEARTBEAT}
+    assert list(recorded) == [1000, 2000, 3000, 4000, 5000]
+
+
+def test_changes_are_rate_limited(sampler):
+    sampler.check(0, 0, 98.0, 1.0, 0)
+    # Accuracy moving 0.1 per frame: past the dead-band every frame, recorded every min_interval
+    recorded = run(sampler, FRAME_MS, 100, step=-0.1)
+    assert set(recorded.values()) == {REASON_CHANGE}
+    assert list(recorded) == list(range(100, 1001, 100))
+
+
+def test_changes_within_deadband_are_skipped(sampler):
+    sampler.check(0, 0, 98.0, 1.0, 0)
+    recorded = run(sampler, FRAME_MS, 99, step=0.0004)  # 0.04 points over the whole run
+    assert recorded == {}
+
+
+@pytest.mark.parametrize("event, reason", [
+    ({"misses": 1}, REASON_MISS),
+    ({"combo": 0}, REASON_COMBO_BREAK),
+    ({"hp": 0.85}, REASON_HP_DROP),
+])
+def test_events_are_recorded_at_once(sampler, event, reason):
+    sampler.check(0, 50, 98.0, 1.0, 0)
+    sampler.check(10, 51, 98.0, 1.0, 0)
+    frame = {"combo": 52, "accuracy": 98.0, "hp": 1.0, "misses": 0}
+    frame.update(event)
+    # 20ms after the last sample, well inside min_interval
+    assert sampler.check(20, frame["combo"], frame["accuracy"], frame["hp"], frame["misses"]) == reason
+
+
+def test_small_hp_drops_accumulate(sampler):
+    sampler.check(0, 0, 98.0, 1.0, 0)
+    reasons = [sampler.check(10 * i, i, 98.0, 1.0 - 0.03 * i, 0) for i in range(1, 5)]
+    # Measured from the last recorded sample, not the previous frame
+    assert reasons == [None, None, None, REASON_HP_DROP]
+
+
+def test_rate_returns_to_heartbeats_after_a_burst(sampler):
+    sampler.check(0, 0, 98.0, 1.0, 0)
+    burst = run(sampler, FRAME_MS, 50, step=-0.2)  # Fast changes for 500ms
+    steady = run(sampler, 510, 300, combo=200, accuracy=90.0)
+    assert set(burst.values()) == {REASON_CHANGE}
+    # At most one change catching up with the new value, then heartbeats only
+    assert list(steady.values())[0] == REASON_CHANGE
+    assert set(list(steady.values())[1:]) == {REASON_HEARTBEAT}
+    heartbeats = [t for t, reason in steady.items() if reason == REASON_HEARTBEAT]
+    assert all(b - a == 1000 for a, b in zip(heartbeats, heartbeats[1:]))
+
+
+def test_reset_starts_a_new_play(sampler):
+    sampler.check(0, 300, 98.0, 1.0, 5)
+    sampler.reset()
+    # Lower combo and misses than the last play are not events, just the first frame
+    assert sampler.check(10, 0, 100.0, 1.0, 0) == REASON_HEARTBEAT
+    assert sampler.check(20, 1, 100.0, 1.0, 0) is None
+
+
+def test_stats(sampler):
+    sampler.check(0, 0, 98.0, 1.0, 0)
+    sampler.check(10, 1, 98.0, 1.0, 1)
+    sampler.check(20, 2, 98.0, 1.0, 1)
+    sampler.check(200, 3, 97.0, 1.0, 1)
+    stats = sampler.stats
+    assert (stats.frames, stats.recorded, stats.events, stats.changes, stats.heartbeats) == (4, 3, 1, 1, 1)
@@ -0,0 +1,133 @@
+# test_streams.py
+"""EventPeek and ConflatingStream: which waiting general frames get decoded."""
+
+import asyncio
+import json
+import threading
+import numpy as np
+import pytest
+import websockets.exceptions
+from frame_decoder import EventPeek, FrameDecoder, extract_frame
+from streams import ConflatingStream, ReconnectPolicy
+
+
+def payload(state="play", combo=0, misses=0, accuracy=100.0, **dumps_kwargs):
+    return json.dumps({
+        "menu": {"state": {"number": 2, "name": state},
+                 "bm": {"metadata": {"artist": "A", "title": "T", "difficulty": "D"}}},
+        "gameplay": {"combo": {"current": combo, "max": combo}, "accuracy": accuracy,
+                     "hp": {"normal": 200, "smooth": 200},
+                     "hits": {"300": combo, "100": 0, "50": 0, "0": misses, "hitErrorArray": [1, -2]}},
+    }, **dumps_kwargs)
+
+
+# EventPeek
+
+def test_peek_first_frame_is_an_event():
+    assert EventPeek().is_event(payload())
+
+
+@pytest.mark.parametrize("previous, current, event", [
+    ({"combo": 10}, {"combo": 11}, False),
+    ({"combo": 10}, {"combo": 10}, False),
+    ({"combo": 10}, {"combo": 0}, True),
+    ({"misses": 1}, {"misses": 1}, False),
+    ({"misses": 1}, {"misses": 2}, True),
+    ({"state": "play"}, {"state": "resultScreen"}, True),
+    ({"accuracy": 99.0}, {"accuracy": 90.0}, False),
+])
+def test_peek_events(previous, current, event):
+    peek = EventPeek()
+    peek.is_event(payload(**previous))
+    assert peek.is_event(payload(**current)) is event
+
+
+@pytest.mark.parametrize("dumps_kwargs", [{}, {"indent": 2}, {"separators": (",", ":")}])
+def test_peek_matches_the_decoder(dumps_kwargs):
+    message = payload("play", combo=123, misses=4, **dumps_kwargs)
+    peek = EventPeek()
+    peek.is_event(message.encode("utf-8"))
+    frame = extract_frame(json.loads(message))
+    assert (peek.state, peek.combo, peek.misses) == (frame.state, frame.combo, frame.misses)
+
+
+def test_peek_keeps_values_missing_from_a_frame():
+    peek = EventPeek()
+    peek.is_event(payload(combo=50, misses=2))
+    assert not peek.is_event(json.dumps({"menu": {"state": {"name": "play"}}}))
+    assert (peek.combo, peek.misses) == (50, 2)
+    assert peek.is_event(payload(combo=3, misses=2))
+
+
+# ConflatingStream
+
+class BufferedSocket:
+    """Every message is already received: recv() returns without yielding, then the server closes"""
+
+    def __init__(self, messages, error=None):
+        self.messages = list(messages)
+        self.error = error or websockets.exceptions.ConnectionClosed(None, None)
+
+    async def recv(self):
+        if self.messages:
+            return self.messages.pop(0)
+        raise self.error
+
+
+def run_stream(messages, error=None):
+    handled = []
+    stream = ConflatingStream("general", "ws://test", FrameDecoder(), handled.append,
+                              ReconnectPolicy(), threading.Event())
+    asyncio.run(asyncio.wait_for(stream.receive(BufferedSocket(messages, error)), 5))
+    return handled, stream.stats
+
+
+def test_conflation_decodes_events_and_the_newest_frame():
+    messages = [payload(combo=c) for c in range(1, 50)]
+    messages[20] = payload(combo=0)  # Combo break
+    messages[30] = payload(combo=30, misses=1)  # Miss
+    messages.append(payload("resultScreen", combo=49, misses=1))
+
+    handled, stats = run_stream(messages)
+
+    # The reader drained everything before the processor ran: one batch
+    assert stats.coalesced == 1
+    assert [(f.state, f.combo, f.misses) for f in handled] == [
+        ("play", 1, 0),  # First frame, the state is new
+        ("play", 0, 0),
+        ("play", 30, 1),
+        ("resultScreen", 49, 1),
+    ]
+    assert stats.event_frames == 3
+    assert stats.dropped == len(messages) - len(handled)
+
+
+def test_no_conflation_without_a_backlog():
+    handled, stats = run_stream([payload(combo=1)])
+    assert len(handled) == 1
+    assert stats.coalesced == 0
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_conflation_never_loses_an_event(seed):
+    rng = np.random.default_rng(seed)
+    combo = misses = 0
+    messages = []
+    for _ in range(300):
+        if rng.random() < 0.05:
+            combo = 0
+            misses += 1
+        else:
+            combo += 1
+        messages.append(payload(combo=combo, misses=misses))
+
+    handled, _ = run_stream(messages)
+    handled_misses = [f.misses for f in handled]
+    # Every miss count that occurred was decoded
+    assert sorted(set(handled_misses)) == list(range(misses + 1))
+    assert handled[-1].combo == combo
+
+
+def test_reader_error_is_raised():
+    with pytest.raises(RuntimeError, match="boom"):
+        run_stream([payload()], error=RuntimeError("boom"))
@@ -0,0 +1,76 @@
+# timeline.py
+from typing import List, Tuple
+import numpy as np
+
+MIN_LEVEL_POINTS = 512  # Stop building coarser levels below this many points
+
+
+def _reduce(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Halve a level: each group of four points keeps its min and max y, in time order"""
+    groups = len(y) // 4
+    body = y[:groups * 4].reshape(groups, 4)
+    low = body.argmin(axis=1)
+    high = body.argmax(axis=1)
+
+    base = np.arange(groups) * 4
+    keep = np.stack((base + np.minimum(low, high), base + np.maximum(low, high)), axis=1).ravel()
+
+    # Leftover points at the end are carried over unchanged
+    tail = np.arange(groups * 4, len(y))
+    keep = np.concatenate((keep, tail))
+    return x[keep], y[keep]
+
+
+class MinMaxPyramid:
+    """Min/max downsampled levels of a time series, built once per play.
+
+    Level 0 is the raw data and each further level halves the point count
+    while keeping the extremes of every bucket, so spikes stay visible at
+    any zoom level.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray):
+        x = np.asarray(x)
+        y = np.asarray(y)
+        self.levels: List[Tuple[np.ndarray, np.ndarray]] = [(x, y)]
+        while len(self.levels[-1][1]) > MIN_LEVEL_POINTS:
+            self.levels.append(_reduce(*self.levels[-1]))
+
+    def select(self, x_min: float, x_max: float, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The finest level's points in [x_min, x_max] that fit in max_points"""
+        for level, (x, y) in enumerate(self.levels):
+            # One extra point on each side so lines reach the plot edges
+            start = max(0, int(np.searchsorted(x, x_min, side="left")) - 1)
+            stop = min(len(x), int(np.searchsorted(x, x_max, side="right")) + 1)
+            if stop - start <= max_points or level == len(self.levels) - 1:
+                return x[start:stop], y[start:stop]
+
+
+class PyramidLine:
+    """Keeps a plotted line at ~2 points per horizontal pixel as the axes zoom or pan.
+
+    The data can be replaced with set_data, so a figure can be reused for
+    another play without reconnecting callbacks.
+    """
+
+    def __init__(self, ax, line):
+        self.ax = ax
+        self.line = line
+        self.pyramid = MinMaxPyramid(np.empty(0), np.empty(0))
+        ax.callbacks.connect("xlim_changed", self._update)
+
+    def set_data(self, x: np.ndarray, y: np.ndarray):
+        self.pyramid = MinMaxPyramid(x, y)
+        if len(x):
+            self.ax.set_xlim(float(x[0]), float(x[-1]) if x[-1] > x[0] else float(x[0]) + 1.0)
+        self._update(self.ax)
+
+        # Every level keeps the global extremes, so the y range fits the whole play
+        self.ax.relim()
+        self.ax.autoscale_view(scalex=False)
+
+    def _update(self, axes):
+        x_min, x_max = axes.get_xlim()
+        max_points = max(MIN_LEVEL_POINTS, 2 * int(axes.bbox.width))
+        self.line.set_data(*self.pyramid.select(x_min, x_max, max_points))
+
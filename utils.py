@@ -1,10 +1,12 @@
 # utils.py
 import json
 import os
+import sys
 from datetime import datetime
-import matplotlib.pyplot as plt
 import numpy as np
 
+_process = None  # psutil.Process, created on first use
+
 
 def save_session_stats(combo, max_combo, accuracy, misses, hp):
     """Save current session stats to a JSON file"""
@@ -45,47 +47,43 @@ def format_time(seconds):
     return f"{minutes:02d}:{seconds:02d}"
 
 
-def create_comparison_chart(map_stats_list):
-    """Create a comparison chart for multiple map performances"""
+def load_play_history(beatmap=None, difficulty=None, mods=None, days=None, limit=None):
+    """Query saved plays from the play index (see play_index.PlayIndex.query).
+
+    The returned summaries can be passed to create_comparison_chart and
+    export_stats_csv in place of MapStats objects.
+    """
+    from play_index import get_play_index
+
+    since = datetime.now().timestamp() - days * 86400 if days else None
+    return get_play_index().query(beatmap, difficulty, mods, since=since, limit=limit)
+
+
+def create_comparison_chart(map_stats_list, group_by="play", page=0, filename=None):
+    """Comparison chart of map performances (MapStats or PlaySummary).
+
+    Plays are aggregated by comparison.aggregate_plays, past one page of bars
+    they are binned or paged. Returns the Figure without blocking; it is
+    also saved to filename when given. For index queries use
+    comparison.get_engine() directly, its results are cached.
+    """
     if not map_stats_list:
-        return
+        return None
 
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-    fig.patch.set_facecolor('#212121')
-
-    map_names = [f"{stats.map_name[:20]}..." if len(stats.map_name) > 20 else stats.map_name
-                 for stats in map_stats_list]
-    accuracies = [stats.final_accuracy for stats in map_stats_list]
-    max_combos = [stats.max_combo for stats in map_stats_list]
-
-    # Accuracy comparison
-    bars1 = ax1.bar(range(len(map_names)), accuracies, color='#1f77b4', alpha=0.7)
-    ax1.set_title('Accuracy Comparison', color='white', fontsize=14)
-    ax1.set_xlabel('Maps', color='white')
-    ax1.set_ylabel('Accuracy (%)', color='white')
-    ax1.set_xticks(range(len(map_names)))
-    ax1.set_xticklabels(map_names, rotation=45, ha='right', color='white')
-    ax1.set_facecolor('#2b2b2b')
-    ax1.tick_params(colors='white')
-    ax1.grid(True, alpha=0.3)
-
-    # Max combo comparison
-    bars2 = ax2.bar(range(len(map_names)), max_combos, color='#ff7f0e', alpha=0.7)
-    ax2.set_title('Max Combo Comparison', color='white', fontsize=14)
-    ax2.set_xlabel('Maps', color='white')
-    ax2.set_ylabel('Max Combo', color='white')
-    ax2.set_xticks(range(len(map_names)))
-    ax2.set_xticklabels(map_names, rotation=45, ha='right', color='white')
-    ax2.set_facecolor('#2b2b2b')
-    ax2.tick_params(colors='white')
-    ax2.grid(True, alpha=0.3)
-
-    plt.tight_layout()
-    plt.show()
+    from comparison import aggregate_plays, build_comparison_figure
+
+    fig = build_comparison_figure(aggregate_plays(map_stats_list, group_by), page)
+    if filename:
+        try:
+            fig.savefig(filename, facecolor=fig.get_facecolor())
+            print(f"Comparison chart saved to {filename}")
+        except Exception as e:
+            print(f"Failed to save comparison chart: {e}")
+    return fig
 
 
 def export_stats_csv(map_stats_list, filename="performance_export.csv"):
-    """Export map statistics to CSV for external analysis"""
+    """Export map statistics (MapStats or PlaySummary) to CSV for external analysis"""
     import csv
 
     if not map_stats_list:
@@ -121,4 +119,68 @@ def export_stats_csv(map_stats_list, filename="performance_export.csv"):
 
         print(f"Stats exported to {filename}")
     except Exception as e:
-        print(f"Failed to export stats: {e}")
\ No newline at end of file
+        print(f"Failed to export stats: {e}")
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB, None where unsupported"""
+    global _process
+    try:
+        import psutil
+        if _process is None:
+            _process = psutil.Process()
+        return _process.memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+
+    if sys.platform == "win32":
+        return _windows_working_set_mb()
+
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux reports KiB, macOS bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _windows_working_set_mb():
+    """Working set of this process via GetProcessMemoryInfo, for when psutil is missing"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+            )
+        ]
+
+    try:
+        kernel32 = ctypes.WinDLL("kernel32")
+        psapi = ctypes.WinDLL("psapi")
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [
+            wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD
+        ]
+        psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize / (1024 * 1024)
+    except (OSError, AttributeError):
+        return None